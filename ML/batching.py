@@ -0,0 +1,175 @@
+"""
+Micro-batching for the ML server.
+Concurrent /predict calls are collected for a short window (or until a batch
+is full) and scored together with one vectorized predict call on the
+inference pool, so the event loop never runs the model itself.
+
+Records wait in one queue per priority class and every batch is formed
+from a single class, highest first. A record whose deadline passes before
+its batch gets an inference thread is dropped from the batch.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from inference_pool import INTERACTIVE, PRIORITIES, DeadlineExceededError, InferencePool, deadline_passed
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# Upper bounds (in milliseconds) of the queue-wait histogram buckets
+QUEUE_WAIT_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250]
+
+
+class MicroBatcher:
+    """Coalesce single-record predictions into vectorized batches.
+
+    predict_fn receives a list of records and must return one result per
+    record, in order. It runs on the inference pool, never on the event loop.
+    Every submitted record must already hold a reservation from
+    pool.admit() for its priority class.
+    """
+
+    def __init__(self, predict_fn, max_wait_ms=2.0, max_batch_size=64, pool=None):
+        self.predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.pool = pool or InferencePool()
+        self._pending = {priority: deque() for priority in PRIORITIES}
+        self._pending_count = 0
+        self.expired = 0
+        self._wakeup = None
+        self._batch_full = None
+        self._worker = None
+        self._batches = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+
+    def start(self):
+        """Start the background task that forms and dispatches batches"""
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            logger.info(
+                f"Micro-batching enabled (max_wait_ms={self.max_wait * 1000:g}, "
+                f"max_batch_size={self.max_batch_size})"
+            )
+
+    async def stop(self):
+        """Stop batching and fail any requests still waiting"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        for priority, pending in self._pending.items():
+            while pending:
+                _, future, _, _ = pending.popleft()
+                self.pool.release(1, priority)
+                if not future.done():
+                    future.set_exception(RuntimeError("Prediction batcher stopped"))
+        self._pending_count = 0
+
+    async def submit(self, record, priority=INTERACTIVE, deadline=None):
+        """Queue one record and wait for its result.
+
+        Raises DeadlineExceededError if deadline (a time.monotonic() value)
+        passes before the record is scored.
+        """
+        if self._worker is None:
+            self.pool.release(1, priority)
+            raise RuntimeError("Prediction batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[priority].append((record, future, time.perf_counter(), deadline))
+        self._pending_count += 1
+        if self._pending_count >= self.max_batch_size:
+            self._batch_full.set()
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if self._pending_count < self.max_batch_size and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            # One class per batch, so the batch waits for a thread at that class's priority
+            priority = next((p for p in PRIORITIES if self._pending[p]), None)
+            batch = []
+            if priority is not None:
+                pending = self._pending[priority]
+                while pending and len(batch) < self.max_batch_size:
+                    batch.append(pending.popleft())
+                self._pending_count -= len(batch)
+            if self._pending_count < self.max_batch_size:
+                self._batch_full.clear()
+            if not self._pending_count:
+                self._wakeup.clear()
+
+            if batch:
+                task = asyncio.get_running_loop().create_task(self._dispatch(batch, priority))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    def _score(self, batch):
+        """Runs on the pool thread; also reports when scoring actually started.
+
+        Records past their deadline by now are skipped and get None.
+        """
+        started_at = time.perf_counter()
+        now = time.monotonic()
+        live = [i for i, (_, _, _, deadline) in enumerate(batch) if not deadline_passed(deadline, now)]
+        results = [None] * len(batch)
+        if live:
+            for i, result in zip(live, self.predict_fn([batch[i][0] for i in live])):
+                results[i] = result
+        return started_at, results
+
+    async def _dispatch(self, batch, priority=INTERACTIVE):
+        try:
+            started_at, results = await self.pool.run(
+                self._score, batch, admitted=len(batch), priority=priority
+            )
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} failed: {str(e)}")
+            for _, future, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        scored = sum(result is not None for result in results)
+        if scored:
+            self.batch_sizes.observe(scored)
+        for (_, future, queued_at, _), result in zip(batch, results):
+            self.queue_wait_ms.observe((started_at - queued_at) * 1000)
+            if future.done():
+                continue
+            if result is None:
+                self.expired += 1
+                future.set_exception(DeadlineExceededError("Deadline passed while waiting in the micro-batcher"))
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        """Batch-size and queue-wait distributions for monitoring"""
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch_size": self.max_batch_size,
+            "pending": {priority: len(pending) for priority, pending in self._pending.items()},
+            "expired": self.expired,
+            "batch_size": self.batch_sizes.to_dict(),
+            "queue_wait_ms": self.queue_wait_ms.to_dict()
+        }
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+ML Server Benchmark
+Starts ml_server:app locally, drives it with synthetic payloads built from
+realistic_eco_dataset_1000.csv and reports throughput, latency percentiles
+and server CPU/RSS. Results are written as JSON so runs can be compared
+across model and server versions.
+
+Load generators:
+  closed  a fixed number of connections, each sending its next request as
+          soon as the previous response arrives
+  open    requests scheduled at a fixed arrival rate regardless of how fast
+          the server answers; latency is measured from the scheduled send
+          time, so queueing delay is not hidden
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from features import MATERIAL_PREFIX, parse_material_composition
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DATASET_PATH = os.path.join(ML_DIR, "realistic_eco_dataset_1000.csv")
+
+# Version of the JSON report layout
+REPORT_FORMAT_VERSION = 1
+
+
+def generate_payloads(count, seed=0, dataset_path=DATASET_PATH, composition_strings=False, jitter=0.2):
+    """Synthetic /predict payloads sampled from the training dataset.
+
+    Rows are drawn with replacement and their weight, distance and lifespan
+    are scaled by up to +/- jitter, so count can exceed the dataset size
+    while keeping realistic category and material combinations. Materials
+    are sent as Material_* fields, or as the raw composition string when
+    composition_strings is set.
+    """
+    rng = random.Random(seed)
+    rows = pd.read_csv(dataset_path).to_dict("records")
+    payloads = []
+    for _ in range(count):
+        row = rng.choice(rows)
+        payload = {
+            "Weight (kg)": round(row["Weight (kg)"] * rng.uniform(1 - jitter, 1 + jitter), 3),
+            "Distance (km)": round(row["Distance (km)"] * rng.uniform(1 - jitter, 1 + jitter)),
+            "Recyclable": 1 if row["Recyclable"] == "Yes" else 0,
+            "Repairable": 1 if row["Repairable"] == "Yes" else 0,
+            "Lifespan (yrs)": max(1, round(row["Lifespan (yrs)"] * rng.uniform(1 - jitter, 1 + jitter))),
+            "Packaging Used": row["Packaging Used"],
+            "Category": row["Category"],
+            "Subcategory": row["Subcategory"]
+        }
+        # Missing categories are sent as null; NaN is not valid JSON
+        for column in ("Packaging Used", "Category", "Subcategory"):
+            if not isinstance(payload[column], str):
+                payload[column] = None
+        if composition_strings:
+            payload["Material Composition"] = row["Material Composition"]
+        else:
+            for material, percent in parse_material_composition(row["Material Composition"]).items():
+                payload[f"{MATERIAL_PREFIX}{material}"] = percent
+        payloads.append(payload)
+    return payloads
+
+
+def request_bodies(payloads, batch_size=None):
+    """Serialize payloads once, grouping them for /predict/batch when batch_size is set"""
+    if not batch_size:
+        return [json.dumps(payload) for payload in payloads]
+    return [json.dumps(payloads[i:i + batch_size]) for i in range(0, len(payloads), batch_size)]
+
+
+def get_json(port, path, timeout=2):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+def wait_for_health(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, body = get_json(port, "/health")
+            if status == 200 and body.get("model_loaded"):
+                return body
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    return None
+
+
+def start_server(port, workers=None, env=None, log_level="warning"):
+    """Start ml_server:app (or serve.py with workers) and wait until it is healthy"""
+    if workers:
+        command = [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+                   "--log-level", log_level]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "ml_server:app", "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", log_level]
+    server = subprocess.Popen(command, cwd=ML_DIR, env=dict(os.environ, **(env or {})),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    health = wait_for_health(port)
+    if health is None:
+        stop_server(server)
+        raise RuntimeError(f"Server on port {port} did not become healthy")
+    return server, health
+
+
+def stop_server(server, timeout=40):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of a process and its children from /proc (Linux only)"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.rss_mb = []
+        self._cpu_start = None
+        self._cpu_end = None
+        self._started = None
+        self._elapsed = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _pids(self):
+        pids = [self.pid]
+        try:
+            with open(f"/proc/{self.pid}/task/{self.pid}/children") as f:
+                pids += [int(pid) for pid in f.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    @staticmethod
+    def _cpu_seconds(pid):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    @staticmethod
+    def _rss_mb(pid):
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    def _total(self, read):
+        total = 0.0
+        for pid in self._pids():
+            try:
+                total += read(pid)
+            except (OSError, ValueError, IndexError):
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.rss_mb.append(self._total(self._rss_mb))
+
+    def start(self):
+        if not os.path.exists(f"/proc/{self.pid}"):
+            return self
+        self._cpu_start = self._total(self._cpu_seconds)
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._started is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._cpu_end = self._total(self._cpu_seconds)
+        self._elapsed = time.perf_counter() - self._started
+        self.rss_mb.append(self._total(self._rss_mb))
+
+    def summary(self):
+        if self._elapsed is None:
+            return {"cpu_percent": None, "rss_mb_mean": None, "rss_mb_max": None}
+        return {
+            "cpu_percent": round((self._cpu_end - self._cpu_start) / self._elapsed * 100, 1),
+            "rss_mb_mean": round(float(np.mean(self.rss_mb)), 1),
+            "rss_mb_max": round(max(self.rss_mb), 1)
+        }
+
+
+def _send(conn, port, path, body):
+    """Send one request; returns (status, connection to reuse)"""
+    try:
+        conn.request("POST", path, body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        return response.status, conn
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        return None, http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+
+def closed_loop_process(args):
+    """Run closed-loop connections in one process; returns (latencies, statuses)"""
+    port, path, bodies, connections, duration, seed = args
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def connection_loop(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        local_statuses = {}
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            status, conn = _send(conn, port, path, rng.choice(bodies))
+            if status == 200:
+                local.append(time.perf_counter() - start)
+            local_statuses[str(status)] = local_statuses.get(str(status), 0) + 1
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=connection_loop, args=(i,)) for i in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+
+def open_loop_process(args):
+    """Send requests at a fixed rate from one process; returns (latencies, statuses)"""
+    port, path, bodies, rate, duration, max_connections, seed = args
+    rng = random.Random(seed)
+    interval = 1.0 / rate
+    total = int(rate * duration)
+    next_index = [0]
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def sender():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while True:
+            with lock:
+                index = next_index[0]
+                next_index[0] += 1
+                body = rng.choice(bodies)
+            if index >= total:
+                break
+            scheduled = started + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            status, conn = _send(conn, port, path, body)
+            latency = time.perf_counter() - scheduled
+            with lock:
+                if status == 200:
+                    latencies.append(latency)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=sender) for _ in range(max_connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses
+
+
+def _split(total, parts):
+    shares = [total // parts] * parts
+    for i in range(total % parts):
+        shares[i] += 1
+    return shares
+
+
+def summarize(latencies, statuses, elapsed, records_per_request=1):
+    """Throughput and latency percentiles for one run"""
+    latencies = np.asarray(latencies)
+    ok = int(len(latencies))
+    errors = sum(count for status, count in statuses.items() if status != "200")
+
+    def percentile(q):
+        return round(float(np.percentile(latencies, q)) * 1000, 3) if ok else None
+
+    return {
+        "requests": ok + errors,
+        "succeeded": ok,
+        "errors": errors,
+        "status_counts": dict(sorted(statuses.items())),
+        "duration_s": round(elapsed, 3),
+        "requests_per_sec": round(ok / elapsed, 1),
+        "records_per_sec": round(ok * records_per_request / elapsed, 1),
+        "mean_ms": round(float(latencies.mean()) * 1000, 3) if ok else None,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(float(latencies.max()) * 1000, 3) if ok else None
+    }
+
+
+def run_closed_loop(port, bodies, connections, duration, client_processes=1, path="/predict"):
+    jobs = [(port, path, bodies, n, duration, seed)
+            for seed, n in enumerate(_split(connections, client_processes)) if n > 0]
+    started = time.perf_counter()
+    with Pool(len(jobs)) as pool:
+        results = pool.map(closed_loop_process, jobs)
+    return _merge(results), time.perf_counter() - started
+
+
+def run_open_loop(port, bodies, rate, duration, max_connections=64, client_processes=1, path="/predict"):
+    jobs = [(port, path, bodies, rate / client_processes, duration,
+             max(1, max_connections // client_processes), seed)
+            for seed in range(client_processes)]
+    started = time.perf_counter()
+    with Pool(len(jobs)) as pool:
+        results = pool.map(open_loop_process, jobs)
+    return _merge(results), time.perf_counter() - started
+
+
+def _merge(results):
+    latencies = [latency for result in results for latency in result[0]]
+    statuses = {}
+    for _, process_statuses in results:
+        for status, count in process_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return latencies, statuses
+
+
+def measure(server_pid, load, records_per_request=1):
+    """Run load() while sampling the server's CPU and memory"""
+    sampler = ResourceSampler(server_pid).start()
+    try:
+        (latencies, statuses), elapsed = load()
+    finally:
+        sampler.stop()
+    return dict(summarize(latencies, statuses, elapsed, records_per_request), **sampler.summary())
+
+
+def compare(results, baseline, max_regression):
+    """Print changes against a previous report; returns False on a regression"""
+    changed = [key for key in ("path", "batch_size", "workers", "cache")
+               if baseline.get("config", {}).get(key) != results["config"][key]]
+    if changed:
+        print(f"\n⚠️  Baseline was run with a different {', '.join(changed)}; comparison may be meaningless")
+    previous = {(run["mode"], run["load"]): run for run in baseline.get("runs", [])}
+    ok = True
+    print(f"\n{'run':<18} {'req/s':>16} {'p99 ms':>18}")
+    for run in results["runs"]:
+        before = previous.get((run["mode"], run["load"]))
+        if before is None or not before.get("requests_per_sec") or not before.get("p99_ms"):
+            continue
+        throughput = run["requests_per_sec"] / before["requests_per_sec"] - 1
+        p99 = run["p99_ms"] / before["p99_ms"] - 1 if run["p99_ms"] is not None else float("inf")
+        regressed = throughput < -max_regression or p99 > max_regression
+        ok = ok and not regressed
+        print(f"{run['mode'] + ' ' + format(run['load'], 'g'):<18} {run['requests_per_sec']:>8} ({throughput:+.0%}) "
+              f"{run['p99_ms']!s:>9} ({p99:+.0%}){'  ❌ regression' if regressed else ''}")
+    return ok
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description="Benchmark a locally started Eco ML Server")
+    parser.add_argument("--mode", choices=["closed", "open", "both"], default="both")
+    parser.add_argument("--connections", type=int, nargs="+", default=[1, 16, 64],
+                        help="closed loop: concurrent connections per run")
+    parser.add_argument("--rate", type=float, nargs="+", default=[100, 400],
+                        help="open loop: target requests/sec per run")
+    parser.add_argument("--max-connections", type=int, default=128,
+                        help="open loop: connections available to keep up with the rate")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of warm-up load before measuring")
+    parser.add_argument("--payloads", type=int, default=1000, help="number of distinct synthetic payloads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--composition-strings", action="store_true",
+                        help="send raw 'Material Composition' strings instead of Material_* fields")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="send records to /predict/batch in groups of this size")
+    parser.add_argument("--cache", action="store_true", help="keep the server's prediction cache enabled")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="start serve.py with this many workers instead of a single uvicorn process")
+    parser.add_argument("--client-processes", type=int, default=max(1, cpus // 2))
+    parser.add_argument("--port", type=int, default=8031)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed throughput drop / p99 increase against the baseline")
+    args = parser.parse_args()
+
+    print("🔧 ML Server Benchmark")
+    print("=" * 40)
+    payloads = generate_payloads(args.payloads, seed=args.seed, composition_strings=args.composition_strings)
+    bodies = request_bodies(payloads, args.batch_size)
+    path = "/predict/batch" if args.batch_size else "/predict"
+    records_per_request = args.batch_size or 1
+    print(f"{len(payloads)} payloads, {path}, {args.duration}s per run, {cpus} CPUs")
+
+    env = {} if args.cache else {"ML_CACHE_SIZE": "0"}
+    server, health = start_server(args.port, workers=args.workers or None, env=env)
+    runs = []
+    try:
+        if args.warmup > 0:
+            run_closed_loop(args.port, bodies, max(args.connections), args.warmup, args.client_processes, path)
+        if args.mode in ("closed", "both"):
+            for connections in args.connections:
+                print(f"⏳ closed loop, {connections} connection(s)...")
+                result = measure(server.pid, lambda: run_closed_loop(
+                    args.port, bodies, connections, args.duration, args.client_processes, path
+                ), records_per_request)
+                runs.append(dict(mode="closed", load=connections, **result))
+        if args.mode in ("open", "both"):
+            for rate in args.rate:
+                print(f"⏳ open loop, {rate:g} req/s...")
+                result = measure(server.pid, lambda: run_open_loop(
+                    args.port, bodies, rate, args.duration, args.max_connections, args.client_processes, path
+                ), records_per_request)
+                runs.append(dict(mode="open", load=rate, **result))
+        _, health = get_json(args.port, "/health")
+    finally:
+        stop_server(server)
+
+    print(f"\n{'run':<18} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'cpu %':>7} {'rss MB':>7}")
+    for run in runs:
+        print(f"{run['mode'] + ' ' + format(run['load'], 'g'):<18} {run['requests_per_sec']:>9} "
+              f"{run['p50_ms']!s:>9} {run['p95_ms']!s:>9} {run['p99_ms']!s:>9} {run['errors']:>7} "
+              f"{run['cpu_percent']!s:>7} {run['rss_mb_max']!s:>7}")
+
+    results = {
+        "format_version": REPORT_FORMAT_VERSION,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "model_version": health.get("model_version"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": cpus
+        },
+        "config": {
+            "path": path,
+            "payloads": args.payloads,
+            "seed": args.seed,
+            "batch_size": args.batch_size,
+            "composition_strings": args.composition_strings,
+            "cache": args.cache,
+            "workers": args.workers,
+            "duration": args.duration,
+            "client_processes": args.client_processes
+        },
+        "runs": runs
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.max_regression):
+            print("\n❌ Performance regressed against the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
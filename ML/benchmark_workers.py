@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Worker Scaling Benchmark
+Starts serve.py with an increasing number of workers and measures /predict
+requests/sec and latency with the closed-loop load generator from benchmark.py.
+"""
+
+import argparse
+import json
+import os
+
+from benchmark import generate_payloads, request_bodies, run_closed_loop, start_server, stop_server, summarize
+
+
+def worker_counts(max_workers):
+    """1, 2, 4, ... up to and including max_workers"""
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def benchmark(workers, bodies, args):
+    env = {"ML_CACHE_SIZE": "0"}
+    if args.pin_cpus:
+        env["ML_PIN_CPUS"] = "1"
+    server, _ = start_server(args.port, workers=workers, env=env)
+    try:
+        run_closed_loop(args.port, bodies, args.connections, min(2.0, args.duration),
+                        args.client_processes)  # warm-up
+        (latencies, statuses), elapsed = run_closed_loop(
+            args.port, bodies, args.connections, args.duration, args.client_processes
+        )
+        return summarize(latencies, statuses, elapsed)
+    finally:
+        stop_server(server)
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description="Measure /predict throughput as workers scale")
+    parser.add_argument("--max-workers", type=int, default=cpus)
+    parser.add_argument("--connections", type=int, default=64, help="concurrent client connections")
+    parser.add_argument("--client-processes", type=int, default=max(1, cpus // 2))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--payloads", type=int, default=1000, help="number of distinct synthetic payloads")
+    parser.add_argument("--port", type=int, default=8021)
+    parser.add_argument("--pin-cpus", action="store_true")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    print("🔧 Worker Scaling Benchmark")
+    print("=" * 40)
+    print(f"CPUs: {cpus}, connections: {args.connections}, duration: {args.duration}s per step")
+    if args.client_processes >= cpus:
+        print("⚠️  Load generator shares the CPUs with the server; results understate scaling")
+
+    bodies = request_bodies(generate_payloads(args.payloads))
+    results = []
+    for workers in worker_counts(args.max_workers):
+        print(f"⏳ {workers} worker(s)...")
+        result = benchmark(workers, bodies, args)
+        result["workers"] = workers
+        results.append(result)
+
+    baseline = results[0]["requests_per_sec"] or 1
+    print(f"\n{'workers':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'speedup':>8} {'errors':>7}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['requests_per_sec']:>10} {result['p50_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['requests_per_sec'] / baseline:>7.2f}x {result['errors']:>7}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cpus": cpus, "connections": args.connections, "duration": args.duration,
+                       "results": results}, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Catalogue Index
+Scores a product catalogue once and saves its feature vectors and
+predictions as memory-mappable NumPy arrays, so the ML server can answer
+"score for product X", "greener alternatives to X in its subcategory" and
+"most similar greener products" with array operations instead of running
+the forest per request.
+
+Products are grouped by subcategory and sorted greenest first (highest eco
+score, then lowest carbon footprint), so the greener alternatives to a
+product are a prefix of its group found with binary searches. Product ids
+are looked up by binary search in a sorted copy of the id array.
+
+Feature vectors follow the model's preprocessing (numerics and Material_*
+percentages standardized with the model's scaler, categoricals one-hot) and
+are stored in the same greenest-first order. A nearest-neighbour query is a
+blocked matrix-vector product over one contiguous slice of them.
+
+The catalogue is a CSV in the training dataset format or a JSON / NDJSON
+export of the products collection (mongoexport), mapped to model fields the
+same way server/src/routes/router.js builds its /predict payload.
+
+Usage:
+    python catalogue_index.py products.json
+    python catalogue_index.py realistic_eco_dataset_1000.csv --output catalogue_index
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from fast_model import compile_preprocessor
+from feature_schema import SCHEMA_PATH, FeatureSchema
+from features import CATEGORY_ALIASES, normalize_category, prepare_dataset
+from model_store import ARRAYS_PATH, MODEL_PATH, load_serving_model
+
+# Version of the on-disk format written by CatalogueIndex.save
+# (3: subcategory groups keyed by normalize_subcategory's normalized form)
+INDEX_FORMAT_VERSION = 3
+
+INDEX_PATH = "catalogue_index"
+
+# Schema the catalogue was encoded with, saved inside the index directory
+INDEX_SCHEMA_FILE = "schema.json"
+
+# Arrays written by CatalogueIndex.save, one .npy file each
+ARRAY_NAMES = [
+    "ids", "name_bytes", "name_offsets", "subcategory_codes", "predictions",
+    "order", "ranks", "group_offsets", "sorted_neg_eco", "sorted_carbon", "sorted_ids", "id_positions",
+    "vectors", "vector_norms", "vector_mean", "vector_scale"
+]
+
+# Columns of the prediction rows
+CARBON, ECO = 0, 1
+
+# What "greener" means for a similarity search
+ECO_SCORE = "eco_score"
+CARBON_FOOTPRINT = "carbon_footprint"
+CRITERIA = [ECO_SCORE, CARBON_FOOTPRINT]
+
+# Rows scored per model call while building
+BUILD_BATCH_SIZE = 10000
+
+# Vectors compared per matrix-vector product in a similarity search
+SEARCH_BLOCK_SIZE = 65536
+
+# Candidates kept per result from the float32 pass and re-ranked with exact distances
+RERANK_FACTOR = 4
+
+
+# Subcategory aliases, keyed by normalized spelling
+SUBCATEGORY_ALIASES = {
+    normalize_category(alias): normalize_category(canonical)
+    for alias, canonical in CATEGORY_ALIASES.get("Subcategory", {}).items()
+}
+
+
+def normalize_subcategory(value):
+    """Group key for a subcategory, compared as the model's feature schema
+    compares categories: "Laptops", "laptop" and "LAPTOP" share a group"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    key = normalize_category(str(value))
+    return SUBCATEGORY_ALIASES.get(key, key)
+
+
+class CatalogueIndex:
+    """Scored catalogue products with id and subcategory lookups"""
+
+    def __init__(self, ids, name_bytes, name_offsets, subcategory_codes, predictions,
+                 order, ranks, group_offsets, sorted_neg_eco, sorted_carbon, sorted_ids, id_positions,
+                 vectors, vector_norms, vector_mean, vector_scale,
+                 subcategories, schema, model_version=None, created_at=None):
+        self.ids = ids
+        self.name_bytes = name_bytes
+        self.name_offsets = name_offsets
+        self.subcategory_codes = subcategory_codes
+        self.predictions = predictions
+        self.order = order
+        self.ranks = ranks
+        self.group_offsets = group_offsets
+        self.sorted_neg_eco = sorted_neg_eco
+        self.sorted_carbon = sorted_carbon
+        self.sorted_ids = sorted_ids
+        self.id_positions = id_positions
+        self.vectors = vectors
+        self.vector_norms = vector_norms
+        self.vector_mean = vector_mean
+        self.vector_scale = vector_scale
+        self.subcategories = list(subcategories)
+        self.subcategory_lookup = {value: code for code, value in enumerate(self.subcategories)}
+        self.schema = schema
+        self.model_version = model_version
+        self.created_at = created_at
+
+        # One-hot block of each categorical column, after the standardized numerics
+        self.onehot_offsets = []
+        offset = len(schema.numeric_positions)
+        for i in schema.categorical_positions:
+            self.onehot_offsets.append(offset)
+            offset += len(schema.categories[schema.columns[i]])
+        self.vector_width = offset
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, names, subcategories, rows, predictions, schema, mean, scale, model_version=None):
+        """Index rows encoded with schema and their raw predictions.
+
+        ids, names and subcategories are sequences of strings, one per row;
+        mean and scale standardize the schema's numeric columns.
+        """
+        n = len(ids)
+        vocabulary = sorted({normalize_subcategory(value) for value in subcategories})
+        lookup = {value: code for code, value in enumerate(vocabulary)}
+        subcategory_codes = np.fromiter(
+            (lookup[normalize_subcategory(value)] for value in subcategories), dtype=np.int32, count=n
+        )
+        predictions = np.asarray(predictions, dtype=np.float64)
+
+        # Greenest first within each subcategory
+        order = np.lexsort((predictions[:, CARBON], -predictions[:, ECO], subcategory_codes)).astype(np.int64)
+        ranks = np.empty(n, dtype=np.int64)
+        ranks[order] = np.arange(n)
+        group_offsets = np.searchsorted(subcategory_codes[order], np.arange(len(vocabulary) + 1)).astype(np.int64)
+
+        encoded_ids = np.array([str(value).encode("utf-8") for value in ids], dtype=bytes)
+        if len(np.unique(encoded_ids)) != n:
+            raise ValueError("Product ids must be unique")
+        id_positions = np.argsort(encoded_ids, kind="stable").astype(np.int64)
+
+        encoded_names = [str(value).encode("utf-8") for value in names]
+        name_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded_names], out=name_offsets[1:])
+
+        index = cls(
+            ids=encoded_ids,
+            name_bytes=np.frombuffer(b"".join(encoded_names), dtype=np.uint8),
+            name_offsets=name_offsets,
+            subcategory_codes=subcategory_codes,
+            predictions=predictions,
+            order=order,
+            ranks=ranks,
+            group_offsets=group_offsets,
+            sorted_neg_eco=-predictions[order, ECO],
+            sorted_carbon=predictions[order, CARBON],
+            sorted_ids=encoded_ids[id_positions],
+            id_positions=id_positions,
+            vectors=None,
+            vector_norms=None,
+            vector_mean=np.asarray(mean, dtype=np.float64),
+            vector_scale=np.asarray(scale, dtype=np.float64),
+            subcategories=vocabulary,
+            schema=schema,
+            model_version=model_version,
+            created_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        )
+        index.vectors = index.vectorize(np.asarray(rows)[order])
+        index.vector_norms = np.einsum("ij,ij->i", index.vectors, index.vectors)
+        return index
+
+    def save(self, directory=INDEX_PATH):
+        """Write the arrays and an index.json, swapping the directory in atomically"""
+        staging = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        metadata = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "model_version": self.model_version,
+            "created_at": self.created_at,
+            "count": len(self),
+            "vector_width": self.vector_width,
+            "subcategories": self.subcategories
+        }
+        with open(os.path.join(staging, "index.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        self.schema.save(os.path.join(staging, INDEX_SCHEMA_FILE))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+    @classmethod
+    def load(cls, directory=INDEX_PATH, mmap_mode="r"):
+        """Load an index written by save, memory-mapped by default"""
+        with open(os.path.join(directory, "index.json")) as f:
+            metadata = json.load(f)
+        if metadata.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalogue index format version: {metadata.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        return cls(
+            subcategories=metadata["subcategories"],
+            schema=FeatureSchema.load(os.path.join(directory, INDEX_SCHEMA_FILE)),
+            model_version=metadata.get("model_version"),
+            created_at=metadata.get("created_at"),
+            **arrays
+        )
+
+    def position(self, product_id):
+        """Row of a product id, or None if it is not in the catalogue"""
+        key = str(product_id).encode("utf-8")
+        i = int(np.searchsorted(self.sorted_ids, key))
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == key:
+            return int(self.id_positions[i])
+        return None
+
+    def name(self, position):
+        start, end = self.name_offsets[position], self.name_offsets[position + 1]
+        return bytes(self.name_bytes[start:end]).decode("utf-8")
+
+    def subcategory(self, position):
+        return self.subcategories[self.subcategory_codes[position]]
+
+    def product(self, position):
+        """Id, name, subcategory and raw prediction row of an indexed product"""
+        return {
+            "id": self.ids[position].decode("utf-8"),
+            "name": self.name(position),
+            "subcategory": self.subcategory(position),
+            "prediction": self.predictions[position]
+        }
+
+    def subcategory_code(self, subcategory):
+        """Group of a subcategory name, or None if the catalogue has no such products"""
+        return self.subcategory_lookup.get(normalize_subcategory(subcategory))
+
+    def _greener_end(self, start, end, prediction):
+        """End of the prefix of sorted entries [start, end) of one group that
+        are strictly greener than prediction"""
+        # Entries before `higher` have a higher eco score; ties up to `tied` are ordered by carbon footprint
+        neg_eco = self.sorted_neg_eco[start:end]
+        higher = start + int(np.searchsorted(neg_eco, -prediction[ECO], side="left"))
+        tied = start + int(np.searchsorted(neg_eco, -prediction[ECO], side="right"))
+        return higher + int(np.searchsorted(self.sorted_carbon[higher:tied], prediction[CARBON], side="left"))
+
+    def greener_alternatives(self, position, k=5):
+        """Rows of up to k products in the same subcategory that are strictly
+        greener (higher eco score, or equal eco score and lower carbon
+        footprint), greenest first."""
+        start = int(self.group_offsets[self.subcategory_codes[position]])
+        greener = self._greener_end(start, int(self.ranks[position]), self.predictions[position])
+        return self.order[start:min(greener, start + k)]
+
+    def vectorize(self, rows):
+        """Similarity vectors for rows encoded with the index schema.
+
+        Missing numbers sit at the mean; unknown categories have no one-hot bit.
+        """
+        rows = np.atleast_2d(rows)
+        vectors = np.zeros((len(rows), self.vector_width), dtype=np.float32)
+        numeric = (rows[:, self.schema.numeric_positions] - self.vector_mean) / self.vector_scale
+        vectors[:, :len(self.schema.numeric_positions)] = np.nan_to_num(numeric)
+        for i, offset in zip(self.schema.categorical_positions, self.onehot_offsets):
+            codes = rows[:, i].astype(np.int64)
+            known = np.nonzero(codes >= 0)[0]
+            vectors[known, offset + codes[known]] = 1.0
+        return vectors
+
+    def vector(self, position):
+        """Stored similarity vector of an indexed product"""
+        return self.vectors[self.ranks[position]]
+
+    def similar_greener(self, vector, prediction, k=5, subcategory_code=None, criterion=ECO_SCORE):
+        """(rows, distances) of the k products nearest to vector that are greener than prediction.
+
+        Greener means a strictly higher eco score (ties broken by carbon
+        footprint) for ECO_SCORE, or a strictly lower carbon footprint for
+        CARBON_FOOTPRINT. The search covers the given subcategory group, or
+        the whole catalogue when subcategory_code is None. Distances are
+        Euclidean, nearest first.
+        """
+        if subcategory_code is None:
+            groups = range(len(self.subcategories))
+        else:
+            groups = [subcategory_code]
+        bounds = [(int(self.group_offsets[code]), int(self.group_offsets[code + 1])) for code in groups]
+        masked = criterion != ECO_SCORE
+        if not masked:
+            # Within a group the products with a higher eco score are a prefix
+            bounds = [(start, self._greener_end(start, end, prediction)) for start, end in bounds]
+
+        # The float32 |x|² - 2x·q + |q|² expansion loses precision on very close
+        # products, so over-fetch with it and re-rank the candidates exactly
+        fetch = k * RERANK_FACTOR
+        vector = np.asarray(vector, dtype=np.float32)
+        query_norm = float(vector @ vector)
+        best_distances = np.empty(0, dtype=np.float32)
+        best_positions = np.empty(0, dtype=np.int64)
+        for start, end in bounds:
+            for block in range(start, end, SEARCH_BLOCK_SIZE):
+                stop = min(block + SEARCH_BLOCK_SIZE, end)
+                distances = self.vector_norms[block:stop] - 2 * (self.vectors[block:stop] @ vector) + query_norm
+                if masked:
+                    distances = np.where(self.sorted_carbon[block:stop] < prediction[CARBON], distances, np.inf)
+                if len(distances) > fetch:
+                    nearest = np.argpartition(distances, fetch)[:fetch]
+                else:
+                    nearest = np.arange(len(distances))
+                best_distances = np.concatenate([best_distances, distances[nearest]])
+                best_positions = np.concatenate([best_positions, nearest + block])
+                if len(best_distances) > fetch:
+                    keep = np.argpartition(best_distances, fetch)[:fetch]
+                    best_distances, best_positions = best_distances[keep], best_positions[keep]
+
+        best_positions = np.sort(best_positions[np.isfinite(best_distances)])
+        offsets = self.vectors[best_positions].astype(np.float64) - vector
+        distances = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+        ranking = np.argsort(distances, kind="stable")[:k]
+        return self.order[best_positions[ranking]], distances[ranking]
+
+
+def mongo_product_record(doc):
+    """Model fields for a products-collection document, as router.js builds them"""
+    record = {
+        "Weight (kg)": doc.get("weight"),
+        "Distance (km)": doc.get("distance"),
+        "Recyclable": 1 if doc.get("recyclability") else 0,
+        "Repairable": 1 if doc.get("repairability") else 0,
+        "Lifespan (yrs)": doc.get("lifespan") or 5,
+        "Packaging Used": doc.get("packaging") or "Cardboard box",
+        "Category": doc.get("category") or "General",
+        "Subcategory": doc.get("subCategory") or ""
+    }
+    for material, percent in (doc.get("materialComposition") or {}).items():
+        record[f"Material_{material}"] = percent
+    return record
+
+
+def _document_id(doc):
+    value = doc.get("_id")
+    # mongoexport writes ObjectIds as {"$oid": "..."}
+    return value.get("$oid") if isinstance(value, dict) else value
+
+
+def read_catalogue(path, schema, id_column=None):
+    """(ids, names, subcategories, records) for a CSV or JSON/NDJSON catalogue"""
+    if path.endswith(".csv"):
+        materials = [material for _, material in schema.material_positions]
+        df, _ = prepare_dataset(pd.read_csv(path), materials)
+        id_column = id_column or ("_id" if "_id" in df else "Product Name")
+        columns = [column for column in schema.columns if column in df]
+        records = df[columns].astype(object).where(df[columns].notna(), None).to_dict("records")
+        return (df[id_column].astype(str).tolist(), df["Product Name"].astype(str).tolist(),
+                df["Subcategory"].tolist(), records)
+
+    with open(path) as f:
+        text = f.read()
+    stripped = text.lstrip()
+    docs = json.loads(text) if stripped.startswith("[") else [
+        json.loads(line) for line in text.splitlines() if line.strip()
+    ]
+    id_column = id_column or "_id"
+    ids = [str(_document_id(doc) if id_column == "_id" else doc.get(id_column)) for doc in docs]
+    return ids, [doc.get("name", "") for doc in docs], [doc.get("subCategory") for doc in docs], [
+        mongo_product_record(doc) for doc in docs
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the catalogue index served by the ML server")
+    parser.add_argument("catalogue", help="CSV in the dataset format, or JSON/NDJSON export of products")
+    parser.add_argument("--output", default=INDEX_PATH)
+    parser.add_argument("--id-column", help="field holding the product id (default: _id, or Product Name)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--arrays", default=ARRAYS_PATH)
+    parser.add_argument("--schema", default=SCHEMA_PATH)
+    args = parser.parse_args()
+
+    print("🔧 Catalogue Index")
+    print("=" * 40)
+    # Large batches score faster through scikit-learn than the NumPy engine
+    served = load_serving_model(args.model, args.arrays, args.schema, fast_inference=False)
+    schema = served.schema
+    # Similarity vectors use the model's own scaling of the numeric columns
+    preprocessing = compile_preprocessor(served.pipeline.steps[0][1])
+
+    started = time.perf_counter()
+    ids, names, subcategories, records = read_catalogue(args.catalogue, schema, args.id_column)
+    rows = schema.empty(len(records))
+    keep = []
+    for i, record in enumerate(records):
+        try:
+            schema.encode(record, out=rows[i])
+            keep.append(i)
+        except ValueError as e:
+            print(f"⚠️ Skipping product {ids[i]}: {str(e)}")
+    rows = rows[keep]
+    print(f"   {len(rows):,} products encoded in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    predictions = np.vstack([
+        served.predict(rows[i:i + BUILD_BATCH_SIZE]) for i in range(0, len(rows), BUILD_BATCH_SIZE)
+    ]) if len(rows) else np.empty((0, 2))
+    print(f"   Scored with model {served.version} in {time.perf_counter() - started:.1f}s")
+
+    try:
+        index = CatalogueIndex.build(
+            [ids[i] for i in keep], [names[i] for i in keep], [subcategories[i] for i in keep],
+            rows, predictions, schema, preprocessing["mean"], preprocessing["scale"],
+            model_version=served.version
+        )
+    except ValueError as e:
+        print(f"❌ {str(e)}")
+        sys.exit(1)
+    index.save(args.output)
+    print(f"\n✅ Indexed {len(index):,} products in {len(index.subcategories)} subcategories -> {args.output}/")
+
+
+if __name__ == "__main__":
+    main()
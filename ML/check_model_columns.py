@@ -4,9 +4,15 @@ Check ML Model Columns
 This script checks what columns the ML model expects.
 """
 
+import os
+
 import joblib
 import pandas as pd
 
+import features
+from fast_model import CompiledForest
+from feature_schema import SCHEMA_PATH, FeatureSchema, SchemaError
+
 def check_model_columns():
     """Check what columns the ML model expects"""
     print("🔍 Checking ML Model Columns...")
@@ -43,33 +49,41 @@ def check_model_columns():
         print("\n📊 Checking dataset materials...")
         df = pd.read_csv("realistic_eco_dataset_1000.csv")
         
-        # Extract materials from the dataset
-        all_materials = []
-        for row in df["Material Composition"]:
-            for part in str(row).split(","):
-                if "%" in part:
-                    material = part.split("%")[0].strip().split()[-1]  # Get last word before %
-                    all_materials.append(material)
-        
-        # Get top materials
-        from collections import Counter
-        material_counts = Counter(all_materials)
-        top_materials = [mat for mat, count in material_counts.most_common(10)]
+        # Same material parsing as retrain_model.py
+        top_materials = features.top_materials(df["Material Composition"])
         
         print(f"📋 Top materials from dataset:")
         for i, material in enumerate(top_materials):
             print(f"   {i+1:2d}. {material}")
         
-        # Create the expected feature names
-        expected_features = [
-            "Weight (kg)", "Distance (km)", "Recyclable", "Repairable", "Lifespan (yrs)",
-            "Packaging Used", "Category", "Subcategory"
-        ] + [f"Material_{m}" for m in top_materials]
+        # Create the expected feature names in training order
+        expected_features = (
+            features.NUMERIC_FEATURES
+            + [f"{features.MATERIAL_PREFIX}{m}" for m in top_materials]
+            + features.CATEGORICAL_FEATURES
+        )
         
         print(f"\n📋 Expected features ({len(expected_features)}):")
         for i, feature in enumerate(expected_features):
             print(f"   {i+1:2d}. {feature}")
         
+        model_features = list(getattr(model, 'feature_names_in_', []))
+        if model_features == expected_features:
+            print("✅ Model columns match the dataset")
+        else:
+            print("⚠️ Model columns differ from the dataset; retrain with retrain_model.py")
+        
+        # Compare the saved feature schema with the model
+        if os.path.exists(SCHEMA_PATH):
+            try:
+                schema = FeatureSchema.load(SCHEMA_PATH)
+                schema.check_matches(FeatureSchema.from_compiled(CompiledForest.from_pipeline(model)))
+                print(f"✅ Feature schema '{SCHEMA_PATH}' matches the model ({schema.width} columns)")
+            except SchemaError as e:
+                print(f"❌ {e}")
+        else:
+            print(f"⚠️ No feature schema '{SCHEMA_PATH}'; retrain_model.py writes one")
+        
         return expected_features
         
     except Exception as e:
@@ -0,0 +1,77 @@
+"""
+Shared pytest fixtures for the ML package.
+A small forest is trained once per session on the bundled dataset and saved
+as a retrain_model.py artifact in a temporary directory, so the tests never
+read or replace the published eco_model.pkl.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from features import MATERIAL_PREFIX, NUMERIC_FEATURES
+from model_store import artifact_paths, load_serving_model
+from retrain_model import build_model, feature_frames, save_artifact
+from surrogate import Surrogate
+
+# Manual check against a running server, not a pytest module
+collect_ignore = ["test_ml_api.py"]
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "realistic_eco_dataset_1000.csv")
+
+
+@pytest.fixture(scope="session")
+def raw_dataset():
+    return pd.read_csv(DATASET)
+
+
+@pytest.fixture(scope="session")
+def dataset(raw_dataset):
+    """(X, y, materials) of the bundled dataset"""
+    return feature_frames(raw_dataset)
+
+
+@pytest.fixture(scope="session")
+def model(dataset):
+    X, y, materials = dataset
+    numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in materials]
+    regressor = RandomForestRegressor(n_estimators=10, random_state=0)
+    return build_model(numeric_features, regressor).fit(X, y)
+
+
+@pytest.fixture(scope="session")
+def artifact(model, dataset, tmp_path_factory):
+    """Artifact directory holding model, arrays, schema and surrogate"""
+    X = dataset[0]
+    directory, _ = save_artifact(model, {}, artifacts_dir=str(tmp_path_factory.mktemp("artifacts")),
+                                 surrogate=Surrogate.fit(model, X))
+    return directory
+
+
+@pytest.fixture(scope="session")
+def served(artifact):
+    return load_serving_model(*artifact_paths(artifact))
+
+
+@pytest.fixture(scope="session")
+def client(artifact, tmp_path_factory):
+    """TestClient for the ML server serving the session artifact.
+
+    The server's inference pool is shut down with the app, so one client
+    is shared by the whole session; tests clear the prediction cache
+    themselves when they depend on it being cold.
+    """
+    from fastapi.testclient import TestClient
+
+    import ml_server
+
+    with pytest.MonkeyPatch.context() as patch:
+        for name, path in zip(("MODEL_PATH", "ARRAYS_PATH", "SCHEMA_PATH", "SURROGATE_PATH"),
+                              artifact_paths(artifact)):
+            patch.setattr(ml_server, name, path)
+        patch.setattr(ml_server, "CATALOGUE_INDEX_PATH", str(tmp_path_factory.mktemp("catalogue") / "index"))
+        patch.setattr(ml_server, "serving", None)
+        with TestClient(ml_server.app) as test_client:
+            yield test_client
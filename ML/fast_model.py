@@ -0,0 +1,384 @@
+"""
+Fast inference engine for the eco model.
+Compiles the fitted scikit-learn Pipeline built by retrain_model.py
+(ColumnTransformer with StandardScaler/OneHotEncoder + RandomForestRegressor)
+into flat NumPy arrays, so records can be scored without pandas or the
+scikit-learn transformer objects. Predictions are bit-identical to
+model.predict.
+
+The arrays can be saved as .npy files and loaded memory-mapped, so every
+server worker shares one copy of the forest through the OS page cache.
+Run this script to export the arrays for an existing eco_model.pkl.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+import joblib
+import numpy as np
+
+
+# Version of the on-disk array format written by CompiledForest.save
+ARRAY_FORMAT_VERSION = 1
+
+# Arrays written by CompiledForest.save, one .npy file each
+ARRAY_NAMES = [
+    "numeric_columns", "mean", "scale", "children", "feature", "threshold",
+    "missing_go_to_left", "value", "roots"
+]
+
+
+def file_fingerprint(path):
+    """Short content hash identifying a model file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _is_nan(value):
+    return isinstance(value, float) and value != value
+
+
+def _unwrap(transformer):
+    """Return the single estimator inside a one-step Pipeline"""
+    from sklearn.pipeline import Pipeline
+
+    if isinstance(transformer, Pipeline):
+        if len(transformer.steps) != 1:
+            raise ValueError(f"Unsupported transformer pipeline with {len(transformer.steps)} steps")
+        return transformer.steps[0][1]
+    return transformer
+
+
+def compile_preprocessor(preprocessor):
+    """Scaler statistics and one-hot vocabularies of a fitted ColumnTransformer.
+
+    Returns the preprocessing keyword arguments of CompiledForest. Raises
+    ValueError for transformers this engine cannot reproduce exactly.
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    if not isinstance(preprocessor, ColumnTransformer):
+        raise ValueError(f"Unsupported preprocessor: {type(preprocessor).__name__}")
+
+    numeric_features, numeric_columns, means, scales = [], [], [], []
+    categorical_features, categories, categorical_offsets = [], [], []
+    handle_unknown = "ignore"
+    n_features_out = 0
+    for name, transformer, columns in preprocessor.transformers_:
+        output = preprocessor.output_indices_[name]
+        if transformer == "drop" or output.stop == output.start:
+            continue
+        columns = list(columns)
+        n_features_out = max(n_features_out, output.stop)
+        transformer = _unwrap(transformer)
+        if transformer == "passthrough":
+            numeric_features += columns
+            numeric_columns += range(output.start, output.stop)
+            means.append(np.zeros(len(columns)))
+            scales.append(np.ones(len(columns)))
+        elif isinstance(transformer, StandardScaler):
+            numeric_features += columns
+            numeric_columns += range(output.start, output.stop)
+            means.append(transformer.mean_ if transformer.with_mean else np.zeros(len(columns)))
+            scales.append(transformer.scale_ if transformer.with_std else np.ones(len(columns)))
+        elif isinstance(transformer, OneHotEncoder):
+            if transformer.drop is not None or getattr(transformer, "_infrequent_enabled", False):
+                raise ValueError("OneHotEncoder with drop or infrequent categories is not supported")
+            handle_unknown = transformer.handle_unknown
+            offset = output.start
+            for column, values in zip(columns, transformer.categories_):
+                categorical_features.append(column)
+                categories.append([None if _is_nan(value) else value for value in values.tolist()])
+                categorical_offsets.append(offset)
+                offset += len(values)
+        else:
+            raise ValueError(f"Unsupported transformer: {type(transformer).__name__}")
+
+    return {
+        "numeric_features": numeric_features,
+        "numeric_columns": np.asarray(numeric_columns, dtype=np.intp),
+        "mean": np.concatenate(means).astype(np.float64),
+        "scale": np.concatenate(scales).astype(np.float64),
+        "categorical_features": categorical_features,
+        "categories": categories,
+        "categorical_offsets": categorical_offsets,
+        "n_features_out": n_features_out,
+        "handle_unknown": handle_unknown
+    }
+
+
+class CompiledForest:
+    """Array-based predictor equivalent to a fitted eco model Pipeline"""
+
+    def __init__(self, numeric_features, numeric_columns, mean, scale,
+                 categorical_features, categories, categorical_offsets,
+                 n_features_out, children, feature, threshold,
+                 missing_go_to_left, value, roots, max_depth,
+                 handle_unknown="ignore", source_version=None):
+        self.numeric_features = list(numeric_features)
+        self.numeric_columns = numeric_columns
+        self.mean = mean
+        self.scale = scale
+        self.categorical_features = list(categorical_features)
+        self.categories = [list(values) for values in categories]
+        self.categorical_lookups = [
+            {value: code for code, value in enumerate(values)} for values in self.categories
+        ]
+        self.categorical_offsets = list(categorical_offsets)
+        self.n_features_out = int(n_features_out)
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.handle_unknown = handle_unknown
+        self.source_version = source_version
+        self.n_outputs = value.shape[1]
+        self._flat_children = children.ravel()
+        self._is_leaf = children[:, 0] == np.arange(len(children))
+
+    @property
+    def feature_names(self):
+        """Input columns in the order the Pipeline was fitted on"""
+        return self.numeric_features + self.categorical_features
+
+    @classmethod
+    def from_pipeline(cls, pipeline, source_version=None):
+        """Compile a fitted Pipeline(preprocessor, forest regressor).
+
+        Raises ValueError for pipelines this engine cannot reproduce exactly.
+        """
+        # scikit-learn is only needed to compile, not to load saved arrays
+        from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+        from sklearn.pipeline import Pipeline
+
+        if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 2:
+            raise ValueError("Expected a Pipeline with a preprocessor and a regressor")
+        preprocessor = pipeline.steps[0][1]
+        forest = pipeline.steps[1][1]
+        if not isinstance(forest, (RandomForestRegressor, ExtraTreesRegressor)):
+            raise ValueError(f"Unsupported regressor: {type(forest).__name__}")
+
+        preprocessing = compile_preprocessor(preprocessor)
+
+        # Pack every tree into one set of node arrays; leaves point at themselves
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        sizes = [tree.node_count for tree in trees]
+        roots = np.cumsum([0] + sizes[:-1]).astype(np.intp)
+        children, feature, threshold, missing_left, value = [], [], [], [], []
+        for tree, root in zip(trees, roots):
+            nodes = np.arange(tree.node_count, dtype=np.intp) + root
+            is_leaf = tree.children_left == -1
+            children.append(np.stack([
+                np.where(is_leaf, nodes, tree.children_left + root),
+                np.where(is_leaf, nodes, tree.children_right + root)
+            ], axis=1))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            missing_left.append(tree.missing_go_to_left.astype(bool))
+            value.append(tree.value[:, :, 0])
+
+        return cls(
+            **preprocessing,
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.intp),
+            feature=np.concatenate(feature).astype(np.intp),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            missing_go_to_left=np.concatenate(missing_left),
+            value=np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+            roots=roots,
+            max_depth=max(tree.max_depth for tree in trees),
+            source_version=source_version,
+        )
+
+    def save(self, directory):
+        """Write the arrays as .npy files plus a model.json metadata file.
+
+        The directory is written next to its final location and swapped in
+        with a rename, so readers never see a half-written export.
+        """
+        staging = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        metadata = {
+            "format_version": ARRAY_FORMAT_VERSION,
+            "source_version": self.source_version,
+            "numeric_features": self.numeric_features,
+            "categorical_features": self.categorical_features,
+            "categories": self.categories,
+            "categorical_offsets": self.categorical_offsets,
+            "n_features_out": self.n_features_out,
+            "max_depth": self.max_depth,
+            "handle_unknown": self.handle_unknown
+        }
+        with open(os.path.join(staging, "model.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(staging, directory)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        """Load arrays written by save, memory-mapped by default"""
+        with open(os.path.join(directory, "model.json")) as f:
+            metadata = json.load(f)
+        if metadata.get("format_version") != ARRAY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported array format version: {metadata.get('format_version')}")
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        return cls(
+            numeric_features=metadata["numeric_features"],
+            categorical_features=metadata["categorical_features"],
+            categories=metadata["categories"],
+            categorical_offsets=metadata["categorical_offsets"],
+            n_features_out=metadata["n_features_out"],
+            max_depth=metadata["max_depth"],
+            handle_unknown=metadata["handle_unknown"],
+            source_version=metadata.get("source_version"),
+            **arrays
+        )
+
+    def transform(self, records):
+        """Build the preprocessed float32 feature matrix for a list of dicts"""
+        try:
+            numeric = np.array(
+                [[record[column] for column in self.numeric_features] for record in records],
+                dtype=np.float64,
+            ).reshape(len(records), len(self.numeric_features))
+        except KeyError as e:
+            raise ValueError(f"Missing feature column: {e.args[0]}")
+        numeric -= self.mean
+        numeric /= self.scale
+
+        X = np.zeros((len(records), self.n_features_out), dtype=np.float32)
+        X[:, self.numeric_columns] = numeric
+        for column, lookup, offset in zip(self.categorical_features, self.categorical_lookups,
+                                          self.categorical_offsets):
+            for i, record in enumerate(records):
+                try:
+                    value = record[column]
+                except KeyError:
+                    raise ValueError(f"Missing feature column: {column}")
+                code = lookup.get(None if _is_nan(value) else value)
+                if code is not None:
+                    X[i, offset + code] = 1.0
+                elif self.handle_unknown == "error":
+                    raise ValueError(f"Found unknown category {value!r} in column {column}")
+        return X
+
+    def transform_encoded(self, rows):
+        """Build the preprocessed matrix from rows encoded by a FeatureSchema.
+
+        rows holds the feature_names columns in order, with categories as
+        integer codes into self.categories (negative for unknown).
+        """
+        rows = np.atleast_2d(rows)
+        n_numeric = len(self.numeric_features)
+        numeric = rows[:, :n_numeric] - self.mean
+        numeric /= self.scale
+
+        X = np.zeros((len(rows), self.n_features_out), dtype=np.float32)
+        X[:, self.numeric_columns] = numeric
+        for j, offset in enumerate(self.categorical_offsets):
+            codes = rows[:, n_numeric + j].astype(np.intp)
+            known = codes >= 0
+            if self.handle_unknown == "error" and not known.all():
+                raise ValueError(f"Found unknown category in column {self.categorical_features[j]}")
+            X[np.flatnonzero(known), offset + codes[known]] = 1.0
+        return X
+
+    def leaf_values(self, X):
+        """Per-tree predictions for a preprocessed matrix, shape (trees, rows, outputs)"""
+        n_rows, n_columns = X.shape
+        n_trees = len(self.roots)
+        flat_X = X.ravel()
+        node = np.repeat(self.roots, n_rows)
+        row_offset = np.tile(np.arange(n_rows) * n_columns, n_trees)
+        position = np.arange(n_trees * n_rows)
+        leaves = node.copy()
+
+        # Walk every (tree, row) pair down one level per step, dropping pairs
+        # as soon as they reach a leaf.
+        for _ in range(self.max_depth):
+            x = flat_X.take(row_offset + self.feature.take(node))
+            go_right = ~(x <= self.threshold.take(node))
+            missing = np.isnan(x)
+            if missing.any():
+                go_right = np.where(missing, ~self.missing_go_to_left.take(node), go_right)
+            node = self._flat_children.take(node * 2 + go_right)
+            at_leaf = self._is_leaf.take(node)
+            if at_leaf.any():
+                leaves[position[at_leaf]] = node[at_leaf]
+                active = ~at_leaf
+                node = node[active]
+                row_offset = row_offset[active]
+                position = position[active]
+                if not len(node):
+                    break
+        return self.value[leaves.reshape(n_trees, n_rows)]
+
+    def predict_transformed(self, X):
+        """Forest mean for a preprocessed matrix, matching model.predict"""
+        return forest_mean(self.leaf_values(X))
+
+    def predict_encoded_per_tree(self, rows):
+        """(forest mean, per-tree predictions) for encoded rows from one walk of the trees.
+
+        Per-tree predictions have shape (trees, rows, outputs).
+        """
+        leaves = self.leaf_values(self.transform_encoded(rows))
+        return forest_mean(leaves), leaves
+
+    def predict(self, records):
+        """Predict for a list of record dicts keyed by input column name"""
+        return self.predict_transformed(self.transform(records))
+
+    def predict_encoded(self, rows):
+        """Predict for rows encoded by a FeatureSchema"""
+        return self.predict_transformed(self.transform_encoded(rows))
+
+
+def forest_mean(per_tree):
+    """Mean of per-tree predictions shaped (trees, rows, outputs), matching model.predict"""
+    # Accumulate trees one after another (as scikit-learn does) so the
+    # floating point result is identical, then divide by the tree count.
+    prediction = np.cumsum(per_tree, axis=0)[-1]
+    prediction /= len(per_tree)
+    if prediction.shape[1] == 1:
+        return prediction[:, 0]
+    return prediction
+
+
+def arrays_version(directory):
+    """source_version recorded in an export, or None if there is no valid export"""
+    try:
+        with open(os.path.join(directory, "model.json")) as f:
+            return json.load(f).get("source_version")
+    except (OSError, ValueError):
+        return None
+
+
+def export_arrays(model_path="eco_model.pkl", directory="eco_model_arrays"):
+    """Compile a pickled pipeline and save its memory-mappable arrays"""
+    pipeline = joblib.load(model_path)
+    compiled = CompiledForest.from_pipeline(pipeline, source_version=file_fingerprint(model_path))
+    compiled.save(directory)
+    return compiled
+
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "eco_model.pkl"
+    directory = sys.argv[2] if len(sys.argv) > 2 else "eco_model_arrays"
+    compiled = export_arrays(model_path, directory)
+    print(f"✅ Exported {len(compiled.roots)} trees from {model_path} to {directory}/")
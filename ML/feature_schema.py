@@ -0,0 +1,324 @@
+"""
+Versioned feature schema for the eco model.
+Records the model's input columns in order with their dtypes, defaults and
+category vocabularies. retrain_model.py saves it next to eco_model.pkl, and
+the ML server loads it once to encode each request straight into a NumPy
+row: numeric values in place, categories as integer codes (-1 = unknown).
+Category values that miss the vocabulary are looked up again in normalized
+form and through features.CATEGORY_ALIASES before counting as unknown.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import CATEGORY_ALIASES, MATERIAL_PREFIX, normalize_category, parse_material_composition
+
+# Version of the schema file format written by FeatureSchema.save
+SCHEMA_FORMAT_VERSION = 1
+
+SCHEMA_PATH = "eco_model_schema.json"
+
+# Raw composition string, e.g. "Plastic 70%, Aluminum 20%", accepted instead of Material_* fields
+MATERIAL_COMPOSITION_FIELD = "Material Composition"
+
+NUMERIC = "float64"
+CATEGORICAL = "category"
+
+# Code stored for a category value the model has not seen
+UNKNOWN_CODE = -1
+
+# How a record's category value was resolved (see FeatureSchema.category_outcomes)
+EXACT = "exact"
+NORMALIZED = "normalized"
+MISSING = "missing"
+UNKNOWN = "unknown"
+CATEGORY_OUTCOMES = (EXACT, NORMALIZED, MISSING, UNKNOWN)
+
+
+class SchemaError(ValueError):
+    """Raised when a feature schema does not match the model it is used with"""
+
+
+def _is_nan(value):
+    return isinstance(value, float) and value != value
+
+
+class FeatureSchema:
+    """Column order, dtypes, defaults and vocabularies of the model input"""
+
+    def __init__(self, columns, dtypes, defaults, categories, source_version=None):
+        if not len(columns) == len(dtypes) == len(defaults):
+            raise SchemaError("columns, dtypes and defaults must have the same length")
+        unknown_dtypes = set(dtypes) - {NUMERIC, CATEGORICAL}
+        if unknown_dtypes:
+            raise SchemaError(f"Unsupported dtypes: {sorted(unknown_dtypes)}")
+        self.columns = list(columns)
+        self.dtypes = list(dtypes)
+        self.defaults = list(defaults)
+        self.categories = {column: list(values) for column, values in categories.items()}
+        self.source_version = source_version
+        self.index = {column: i for i, column in enumerate(self.columns)}
+
+        self.numeric_positions = [i for i, dtype in enumerate(self.dtypes) if dtype == NUMERIC]
+        self.categorical_positions = [i for i, dtype in enumerate(self.dtypes) if dtype == CATEGORICAL]
+        missing = [self.columns[i] for i in self.categorical_positions if self.columns[i] not in self.categories]
+        if missing:
+            raise SchemaError(f"No vocabulary for categorical columns: {missing}")
+        self.code_lookups = {
+            column: {value: code for code, value in enumerate(self.categories[column])}
+            for column in (self.columns[i] for i in self.categorical_positions)
+        }
+        # Normalized vocabulary and aliases of each column; the first spelling wins
+        self.aliases = {}
+        self.normalized_lookups = {}
+        for column, lookup in self.code_lookups.items():
+            aliases = {
+                alias: canonical for alias, canonical in CATEGORY_ALIASES.get(column, {}).items()
+                if canonical in lookup
+            }
+            normalized = {normalize_category(alias): lookup[canonical] for alias, canonical in aliases.items()}
+            for value, code in lookup.items():
+                if isinstance(value, str):
+                    normalized.setdefault(normalize_category(value), code)
+            self.aliases[column] = aliases
+            self.normalized_lookups[column] = normalized
+        self.material_positions = [
+            (i, column[len(MATERIAL_PREFIX):]) for i, column in enumerate(self.columns)
+            if column.startswith(MATERIAL_PREFIX)
+        ]
+
+        # Row of defaults that every encoded record starts from
+        self.template = np.empty(len(self.columns), dtype=np.float64)
+        for i, default in enumerate(self.defaults):
+            self.template[i] = self._encode_value(i, default)
+
+    @property
+    def width(self):
+        return len(self.columns)
+
+    @property
+    def fingerprint(self):
+        """Hash of the row layout: columns, dtypes and vocabularies, not defaults.
+
+        Schemas with the same fingerprint agree on what every position and
+        category code of an encoded row means, so a caller that encodes rows
+        itself can check they still fit the served model.
+        """
+        layout = json.dumps([self.columns, self.dtypes, self.categories], sort_keys=True)
+        return hashlib.sha256(layout.encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def from_compiled(cls, compiled):
+        """Derive a schema from a CompiledForest.
+
+        Numeric features default to the scaler mean (a neutral value after
+        scaling), material percentages to 0 and categories to unknown.
+        """
+        return cls._derive(compiled.numeric_features, compiled.mean, compiled.categorical_features,
+                           compiled.categories, compiled.source_version)
+
+    @classmethod
+    def from_pipeline(cls, pipeline, source_version=None):
+        """Derive a schema from a fitted Pipeline(preprocessor, regressor).
+
+        Works for any regressor, including ones CompiledForest cannot
+        compile; defaults are chosen as in from_compiled.
+        """
+        from fast_model import compile_preprocessor
+
+        preprocessing = compile_preprocessor(pipeline.steps[0][1])
+        return cls._derive(preprocessing["numeric_features"], preprocessing["mean"],
+                           preprocessing["categorical_features"], preprocessing["categories"], source_version)
+
+    @classmethod
+    def _derive(cls, numeric_features, mean, categorical_features, categories, source_version):
+        columns = list(numeric_features) + list(categorical_features)
+        dtypes = [NUMERIC] * len(numeric_features) + [CATEGORICAL] * len(categorical_features)
+        defaults = [
+            0.0 if column.startswith(MATERIAL_PREFIX) else float(value)
+            for column, value in zip(numeric_features, mean)
+        ] + [None] * len(categorical_features)
+        return cls(columns, dtypes, defaults, dict(zip(categorical_features, categories)), source_version)
+
+    def to_dict(self):
+        return {
+            "format_version": SCHEMA_FORMAT_VERSION,
+            "source_version": self.source_version,
+            "columns": [
+                {
+                    "name": column,
+                    "dtype": dtype,
+                    "default": default,
+                    **({"categories": self.categories[column]} if dtype == CATEGORICAL else {})
+                }
+                for column, dtype, default in zip(self.columns, self.dtypes, self.defaults)
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format_version") != SCHEMA_FORMAT_VERSION:
+            raise SchemaError(f"Unsupported schema format version: {data.get('format_version')}")
+        try:
+            columns = data["columns"]
+            return cls(
+                columns=[column["name"] for column in columns],
+                dtypes=[column["dtype"] for column in columns],
+                defaults=[column.get("default") for column in columns],
+                categories={
+                    column["name"]: column["categories"] for column in columns if "categories" in column
+                },
+                source_version=data.get("source_version")
+            )
+        except (KeyError, TypeError) as e:
+            raise SchemaError(f"Malformed feature schema: {str(e)}")
+
+    def save(self, path=SCHEMA_PATH):
+        """Write the schema as JSON, replacing any previous file atomically"""
+        staging = f"{path}.tmp-{os.getpid()}"
+        with open(staging, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path=SCHEMA_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def check_matches(self, other):
+        """Raise SchemaError unless other describes the same model input.
+
+        Defaults are not compared; they are serving policy, not part of the
+        model's contract.
+        """
+        problems = []
+        if self.columns != other.columns:
+            problems.append(f"columns {self.columns} != {other.columns}")
+        elif self.dtypes != other.dtypes:
+            problems.append(f"dtypes {self.dtypes} != {other.dtypes}")
+        else:
+            for column, values in self.categories.items():
+                if values != other.categories.get(column):
+                    problems.append(f"vocabulary of '{column}' differs")
+        if problems:
+            raise SchemaError("Feature schema does not match the model: " + "; ".join(problems))
+
+    def _encode_value(self, i, value):
+        column = self.columns[i]
+        if self.dtypes[i] == NUMERIC:
+            if value is None:
+                return np.nan
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid number for '{column}': {value!r}")
+        return self._category_code(column, value)
+
+    def _category_code(self, column, value):
+        """Code of a category value: exact match, then normalized or alias match"""
+        value = None if _is_nan(value) else value
+        try:
+            code = self.code_lookups[column].get(value)
+        except TypeError:
+            raise ValueError(f"Invalid category for '{column}': {value!r}")
+        if code is None and isinstance(value, str):
+            code = self.normalized_lookups[column].get(normalize_category(value))
+        return UNKNOWN_CODE if code is None else code
+
+    def category_outcomes(self, record, row):
+        """(column, outcome) for each categorical column of a record encoded into row.
+
+        The outcome is EXACT for a vocabulary value (or a missing value the
+        model was trained with), NORMALIZED for one matched after
+        normalization or through an alias, and MISSING or UNKNOWN when the
+        model scores the column blind.
+        """
+        outcomes = []
+        for i in self.categorical_positions:
+            column = self.columns[i]
+            value = record.get(column)
+            if row[i] == UNKNOWN_CODE:
+                outcomes.append((column, MISSING if value is None or _is_nan(value) else UNKNOWN))
+            elif column not in record or value in self.code_lookups[column] or _is_nan(value):
+                outcomes.append((column, EXACT))
+            else:
+                outcomes.append((column, NORMALIZED))
+        return outcomes
+
+    def encode(self, record, out=None):
+        """Encode a request record into a row (or into out, a preallocated row).
+
+        Columns missing from the record take their default. Material columns
+        can also come from a raw "Material Composition" string; explicit
+        Material_* fields take precedence. Raises ValueError for values that
+        cannot be encoded.
+        """
+        row = out if out is not None else np.empty(len(self.columns), dtype=np.float64)
+        row[:] = self.template
+        composition = record.get(MATERIAL_COMPOSITION_FIELD)
+        if isinstance(composition, str) and self.material_positions:
+            parsed = parse_material_composition(composition)
+            for i, material in self.material_positions:
+                if material in parsed:
+                    row[i] = parsed[material]
+        for column, value in record.items():
+            i = self.index.get(column)
+            if i is not None:
+                row[i] = self._encode_value(i, value)
+        return row
+
+    def encode_frame(self, frame):
+        """Encode the schema columns of a training-format DataFrame into rows.
+
+        Columns missing from the frame take their default, as in encode.
+        """
+        rows = np.tile(self.template, (len(frame), 1))
+        for i, column in enumerate(self.columns):
+            if column not in frame:
+                continue
+            if self.dtypes[i] == NUMERIC:
+                rows[:, i] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                values = frame[column].astype(object).where(frame[column].notna(), None)
+                codes = {value: self._category_code(column, value) for value in pd.unique(values)}
+                rows[:, i] = values.map(codes).to_numpy(dtype=np.float64)
+        return rows
+
+    def empty(self, n_rows):
+        """Preallocated matrix for n_rows encoded records"""
+        return np.empty((n_rows, len(self.columns)), dtype=np.float64)
+
+    def decode(self, rows):
+        """DataFrame with the original column values for encoded rows.
+
+        A missing value the model was trained with decodes to NaN, the
+        category the fitted OneHotEncoder knows, and unknown codes to None,
+        which it does not. Category columns are kept as object dtype so
+        pandas does not turn None into NaN.
+        """
+        rows = np.atleast_2d(rows)
+        data = {}
+        for i, column in enumerate(self.columns):
+            if self.dtypes[i] == NUMERIC:
+                data[column] = rows[:, i]
+            else:
+                vocabulary = [np.nan if value is None else value for value in self.categories[column]]
+                data[column] = pd.Series([
+                    vocabulary[int(code)] if code != UNKNOWN_CODE else None for code in rows[:, i]
+                ], dtype=object)
+        return pd.DataFrame(data, columns=self.columns)
+
+    def to_record(self, row):
+        """Decoded column values of one encoded row, keyed by column name"""
+        record = {}
+        for i, column in enumerate(self.columns):
+            if self.dtypes[i] == NUMERIC:
+                record[column] = float(row[i])
+            else:
+                code = int(row[i])
+                record[column] = self.categories[column][code] if code != UNKNOWN_CODE else None
+        return record
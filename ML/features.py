@@ -0,0 +1,107 @@
+"""
+Feature engineering shared by training, evaluation and the ML server.
+Material compositions such as "Aluminum 70%, Silicon 20%" are parsed in a
+single vectorized pass into Material_<name> percentage columns. Category
+values are compared in a normalized form, so "cardboard box", "Cardboard"
+and "CARDBOARD" reach the same model category.
+"""
+
+import functools
+import re
+
+import pandas as pd
+
+# One "<material> <percent>%" entry at the start of the string or after a comma.
+# Matches the same entries as the per-part regex retrain_model.py used to apply.
+MATERIAL_PATTERN = re.compile(r"(?:^|,)\s*(?P<material>[\w\s]+)\s+(?P<percent>\d+\.?\d*)%")
+
+MATERIAL_PREFIX = "Material_"
+
+NUMERIC_FEATURES = ["Weight (kg)", "Distance (km)", "Recyclable", "Repairable", "Lifespan (yrs)"]
+
+CATEGORICAL_FEATURES = ["Category", "Subcategory", "Packaging Used"]
+
+TARGETS = ["Carbon Footprint (kg CO2e)", "Eco Score"]
+
+# Eco score from which a product counts as eco-friendly. The model predicts
+# eco scores between 0 and 1; this is the storefront's 60 out of 100
+ECO_FRIENDLY_SCORE = 0.6
+
+# Number of most common materials turned into feature columns
+TOP_MATERIALS = 10
+
+# Spellings used by the storefront and other callers for a category the
+# model knows, per column, in normalized form (see normalize_category)
+CATEGORY_ALIASES = {
+    "Packaging Used": {
+        "cardboard box": "Cardboard",
+        "carton": "Cardboard",
+        "paper bag": "Paper",
+        "plastic bag": "Plastic",
+        "plastic bottle": "Plastic",
+        "plastic bubble wrap": "Plastic",
+        "bubble wrap": "Plastic",
+        "tetra pak": "Tetrapak"
+    }
+}
+
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_category(value):
+    """Comparison form of a category value: case, punctuation, spacing and
+    a plural "s" ending each word are ignored ("LED bulbs" -> "led bulb")"""
+    words = NON_ALPHANUMERIC.sub(" ", value.casefold()).split()
+    return " ".join(
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in words
+    )
+
+
+def parse_material_composition(composition):
+    """Percentages per material for one composition string"""
+    materials = {}
+    for match in MATERIAL_PATTERN.finditer(str(composition)):
+        material = match.group("material").strip()
+        materials[material] = materials.get(material, 0.0) + float(match.group("percent"))
+    return materials
+
+
+def _material_totals(compositions):
+    """Long-form (row, material) -> percent totals, in order of first appearance"""
+    extracted = compositions.astype(str).str.extractall(MATERIAL_PATTERN)
+    extracted["material"] = extracted["material"].str.strip()
+    extracted["percent"] = extracted["percent"].astype(float)
+    rows = extracted.index.get_level_values(0)
+    return extracted.groupby([rows, "material"], sort=False)["percent"].sum()
+
+
+def top_materials(compositions, n=TOP_MATERIALS):
+    """The n materials that appear in the most compositions"""
+    totals = _material_totals(pd.Series(compositions))
+    appearances = pd.Series(totals.index.get_level_values("material"))
+    return appearances.value_counts().nlargest(n).index.tolist()
+
+
+def material_columns(compositions, materials):
+    """DataFrame with a Material_<name> column for each material, in one pass"""
+    compositions = pd.Series(compositions)
+    wide = _material_totals(compositions).unstack(fill_value=0.0)
+    wide = wide.reindex(index=compositions.index, columns=materials, fill_value=0.0)
+    wide.columns = [f"{MATERIAL_PREFIX}{material}" for material in materials]
+    return wide.fillna(0.0)
+
+
+def prepare_dataset(df, materials=None):
+    """Add material columns and numeric Yes/No flags to a product dataset.
+
+    Returns the prepared DataFrame and the material list used; the list is
+    derived from the data when not given.
+    """
+    if materials is None:
+        materials = top_materials(df["Material Composition"])
+    df = pd.concat([df, material_columns(df["Material Composition"], materials)], axis=1)
+    df["Recyclable"] = df["Recyclable"].map({"Yes": 1, "No": 0})
+    df["Repairable"] = df["Repairable"].map({"Yes": 1, "No": 0})
+    return df, materials
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Incremental Eco Model Retraining
+Updates the forest of a previous retrain_model.py artifact with new product
+data instead of refitting every tree from scratch.
+
+Rows of the updated dataset that the previous artifact was trained on are
+recognised by a hash of their raw values and taken from its cached feature
+matrix; only new or changed rows are parsed. The fitted preprocessing
+(scaler, category vocabularies, material columns) is kept so the existing
+trees stay valid, and --add-trees new trees are grown with warm start on the
+new training rows plus a replay sample of rows the forest already knows.
+--max-trees drops the oldest trees beyond that size, so frequent runs
+refresh the forest instead of growing it without bound.
+
+Unless --no-compare is given, a full retrain on the same data is timed too,
+and the previous, incremental and fully retrained models are evaluated on
+the same held-out rows: the previous test split plus a test split of the
+new rows. Categories or materials the preprocessing has never seen are
+reported, since only a full retrain can learn them.
+
+Usage:
+    python incremental_retrain.py updated_dataset.csv
+    python incremental_retrain.py updated_dataset.csv --base model_artifacts/<artifact> --add-trees 10
+    python incremental_retrain.py updated_dataset.csv --max-trees 120 --no-compare --no-publish
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import train_test_split
+
+from features import CATEGORICAL_FEATURES, MATERIAL_PREFIX, NUMERIC_FEATURES, TARGETS, top_materials
+from retrain_model import (
+    ARTIFACTS_DIR, METRICS_FILE, MODEL_PATH, build_model, cache_features, cached_features,
+    dataset_hash, evaluate, feature_frames, fit_surrogate, publish, row_hashes, save_artifact
+)
+
+
+def latest_artifact(artifacts_dir=ARTIFACTS_DIR):
+    """Most recent artifact directory (names start with a UTC timestamp), or None"""
+    if not os.path.isdir(artifacts_dir):
+        return None
+    names = sorted(
+        name for name in os.listdir(artifacts_dir)
+        if not name.startswith(".") and os.path.exists(os.path.join(artifacts_dir, name, METRICS_FILE))
+    )
+    return os.path.join(artifacts_dir, names[-1]) if names else None
+
+
+def feature_cache_key(digest, materials):
+    """Cache key for features prepared with a fixed material list.
+
+    Kept apart from the plain dataset hash, because a full retrain derives
+    the material columns from the data and may pick different ones.
+    """
+    return f"{digest}-m{hashlib.sha256(json.dumps(materials).encode()).hexdigest()[:8]}"
+
+
+def base_features(run_info):
+    """Cached feature entry of the rows an artifact was trained on"""
+    entry = cached_features(run_info.get("feature_cache_key", run_info["dataset_hash"]))
+    if entry is None or "row_hashes" not in entry:
+        raise SystemExit(
+            f"❌ No cached features for dataset {run_info['dataset_hash']}; "
+            "run retrain_model.py once to train a base model"
+        )
+    return entry
+
+
+def held_out_rows(entry, test_size, random_state):
+    """Mask of the cached rows that models built on them were evaluated on, not trained on.
+
+    Entries written by this script record the mask, so held-out rows stay
+    held out across chained runs. For an entry of retrain_model.py it is
+    that script's test split, which depends only on the row count.
+    """
+    if "held_out" in entry:
+        return np.asarray(entry["held_out"], dtype=bool)
+    held_out = np.zeros(len(entry["X"]), dtype=bool)
+    _, test = train_test_split(np.arange(len(entry["X"])), test_size=test_size, random_state=random_state)
+    held_out[test] = True
+    return held_out
+
+
+def match_rows(hashes, known_hashes):
+    """Position of each row among known_hashes, or -1 for rows not seen before"""
+    order = np.argsort(known_hashes, kind="stable")
+    ordered = known_hashes[order]
+    i = np.minimum(np.searchsorted(ordered, hashes), len(ordered) - 1)
+    return np.where(ordered[i] == hashes, order[i], -1)
+
+
+def unseen_values(model, X_new, raw_new, materials):
+    """Categories and materials in new rows that the fitted preprocessing ignores"""
+    encoder = model.named_steps["preprocessor"].named_transformers_["cat"].named_steps["onehot"]
+    unseen = {}
+    for column, vocabulary in zip(CATEGORICAL_FEATURES, encoder.categories_):
+        values = set(X_new[column].dropna()) - set(vocabulary)
+        if values:
+            unseen[column] = sorted(map(str, values))
+    new_materials = set(top_materials(raw_new["Material Composition"])) - set(materials)
+    if new_materials:
+        unseen["materials"] = sorted(new_materials)
+    return unseen
+
+
+def warm_start(model, X, y, add_trees, max_trees=None, n_jobs=-1):
+    """Grow add_trees more trees on (X, y) with the model's fitted preprocessing.
+
+    The oldest trees are dropped once there are more than max_trees.
+    """
+    forest = model.named_steps["regressor"]
+    Xt = model.named_steps["preprocessor"].transform(X)
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + add_trees, n_jobs=n_jobs)
+    forest.fit(Xt, y)
+    # Predict single-threaded, as retrain_model.py saves its models
+    forest.set_params(warm_start=False, n_jobs=None)
+    if max_trees and len(forest.estimators_) > max_trees:
+        forest.estimators_ = forest.estimators_[-max_trees:]
+        forest.n_estimators = max_trees
+    return model
+
+
+def full_retrain_forest(forest, hyperparameters):
+    """An unfitted forest configured as the base artifact's full retrain was.
+
+    Warm starts grow n_estimators, so the base forest's own settings are
+    overridden by the hyperparameters recorded in its run info.
+    """
+    valid = forest.get_params()
+    return clone(forest).set_params(**{k: v for k, v in hyperparameters.items() if k in valid})
+
+
+def print_comparison(rows):
+    cf_target, eco_target = TARGETS
+    print(f"\n{'model':<14} {'trees':>5} {'time':>8} {'CF MAE':>8} {'CF R²':>6} {'Eco MAE':>8} {'Eco R²':>7}")
+    for name, trees, seconds, metrics in rows:
+        cf, eco = metrics[cf_target], metrics[eco_target]
+        elapsed = f"{seconds:>7.2f}s" if seconds is not None else f"{'-':>8}"
+        print(f"{name:<14} {trees:>5} {elapsed} {cf['mae']:>8.2f} {cf['r2']:>6.3f} {eco['mae']:>8.3f} {eco['r2']:>7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add trees to the eco model for new product data")
+    parser.add_argument("dataset", help="updated dataset CSV: previous rows plus new or changed ones")
+    parser.add_argument("--base", help="artifact directory to build on (default: the latest one)")
+    parser.add_argument("--add-trees", type=int, default=20, help="trees grown on the new data")
+    parser.add_argument("--max-trees", type=int, default=None, help="drop the oldest trees beyond this many")
+    parser.add_argument("--replay", type=float, default=1.0,
+                        help="previously seen training rows mixed in per new training row")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores used to fit trees (-1 = all)")
+    parser.add_argument("--no-compare", action="store_true", help="skip the full retrain comparison")
+    parser.add_argument("--no-publish", action="store_true",
+                        help=f"only write the artifact, leave {MODEL_PATH} unchanged")
+    args = parser.parse_args()
+
+    print("🔧 Incremental Eco Model Retraining")
+    print("=" * 40)
+    base_dir = args.base or latest_artifact()
+    if base_dir is None:
+        parser.error(f"no artifact in {ARTIFACTS_DIR}/; run retrain_model.py first")
+    with open(os.path.join(base_dir, METRICS_FILE)) as f:
+        base_info = json.load(f)
+    model = joblib.load(os.path.join(base_dir, MODEL_PATH))
+    if not isinstance(model.named_steps["regressor"], RandomForestRegressor):
+        parser.error(f"{base_dir} is not a random forest; retrain it with retrain_model.py")
+    hyperparameters = base_info.get("hyperparameters", {})
+    test_size = hyperparameters.get("test_size", 0.2)
+    random_state = hyperparameters.get("random_state", 42)
+    print(f"Base model {base_info['model_version']} ({len(model.named_steps['regressor'].estimators_)} trees)")
+
+    started = time.perf_counter()
+    known = base_features(base_info)
+    materials = known["materials"]
+    raw = pd.read_csv(args.dataset)
+    positions = match_rows(row_hashes(raw), known["row_hashes"])
+    is_new = positions < 0
+    X_new, y_new, _ = feature_frames(raw[is_new].reset_index(drop=True), materials)
+    features_seconds = time.perf_counter() - started
+    print(f"   {len(raw):,} rows: {int((~is_new).sum()):,} reused from the feature cache, "
+          f"{int(is_new.sum()):,} new or changed ({features_seconds:.2f}s)")
+    if len(X_new) < 2:
+        print("✅ Nothing to add; the model is up to date")
+        return
+
+    unseen = unseen_values(model, X_new, raw[is_new], materials)
+    for column, values in unseen.items():
+        print(f"   ⚠️  Unseen {column}: {', '.join(values)} (ignored until a full retrain)")
+
+    # Held-out rows: those the base model was evaluated on, plus a test split of the new rows
+    base_held_out = held_out_rows(known, test_size, random_state)
+    base_train, base_test = np.flatnonzero(~base_held_out), np.flatnonzero(base_held_out)
+    new_train, new_test = train_test_split(np.arange(len(X_new)), test_size=test_size, random_state=random_state)
+    # The same rows of the updated dataset: previous held-out rows still in it, and the new test rows
+    held_out = np.zeros(len(raw), dtype=bool)
+    held_out[~is_new] = base_held_out[positions[~is_new]]
+    held_out[np.flatnonzero(is_new)[new_test]] = True
+    rng = np.random.default_rng(random_state)
+    replay = rng.choice(base_train, size=min(len(base_train), round(args.replay * len(new_train))), replace=False)
+    X_fit = pd.concat([X_new.iloc[new_train], known["X"].iloc[replay]], ignore_index=True)
+    y_fit = pd.concat([y_new.iloc[new_train], known["y"].iloc[replay]], ignore_index=True)
+    X_eval = pd.concat([known["X"].iloc[base_test], X_new.iloc[new_test]], ignore_index=True)
+    y_eval = pd.concat([known["y"].iloc[base_test], y_new.iloc[new_test]], ignore_index=True)
+
+    full_forest = full_retrain_forest(model.named_steps["regressor"], hyperparameters)
+    results = [("previous", len(model.named_steps["regressor"].estimators_), None, evaluate(model, X_eval, y_eval))]
+
+    print(f"Growing {args.add_trees} trees on {len(new_train):,} new + {len(replay):,} replayed rows...")
+    started = time.perf_counter()
+    warm_start(model, X_fit, y_fit, args.add_trees, args.max_trees, args.n_jobs)
+    incremental_seconds = features_seconds + time.perf_counter() - started
+    metrics = evaluate(model, X_eval, y_eval)
+    results.append(("incremental", len(model.named_steps["regressor"].estimators_), incremental_seconds, metrics))
+
+    comparison = None
+    if not args.no_compare:
+        print("Timing a full retrain on the same data...")
+        started = time.perf_counter()
+        X_all, y_all, full_materials = feature_frames(raw)
+        numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in full_materials]
+        full_model = build_model(numeric_features, full_forest.set_params(n_jobs=args.n_jobs))
+        full_model.fit(X_all[~held_out], y_all[~held_out])
+        full_seconds = time.perf_counter() - started
+        full_metrics = evaluate(full_model, X_all[held_out], y_all[held_out])
+        results.append(("full retrain", full_forest.n_estimators, full_seconds, full_metrics))
+        comparison = {
+            "full_seconds": full_seconds,
+            "full_metrics": full_metrics,
+            "speedup": full_seconds / incremental_seconds,
+            "evaluated_rows": int(held_out.sum())
+        }
+    print_comparison(results)
+    if comparison:
+        print(f"\n⏱️ Incremental run {comparison['speedup']:.1f}× faster than a full retrain")
+
+    # Cache the updated dataset's features so the next run reuses them as well, and
+    # evaluates on the same held-out rows instead of ones this model was trained on
+    digest = dataset_hash(args.dataset)
+    cache_key = feature_cache_key(digest, materials)
+    X_reused, y_reused = known["X"].iloc[positions[~is_new]], known["y"].iloc[positions[~is_new]]
+    order = np.argsort(np.concatenate([np.flatnonzero(~is_new), np.flatnonzero(is_new)]), kind="stable")
+    cache_features(cache_key, {
+        "X": pd.concat([X_reused, X_new], ignore_index=True).iloc[order].reset_index(drop=True),
+        "y": pd.concat([y_reused, y_new], ignore_index=True).iloc[order].reset_index(drop=True),
+        "materials": materials,
+        "row_hashes": row_hashes(raw),
+        "held_out": held_out
+    })
+
+    # The surrogate is distilled afresh: the updated forest is a different model
+    surrogate = fit_surrogate(model, pd.concat([X_new.iloc[new_train], known["X"].iloc[base_train]]), X_eval, y_eval)
+
+    forest = model.named_steps["regressor"]
+    directory, version = save_artifact(model, {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dataset": os.path.abspath(args.dataset),
+        "dataset_hash": digest,
+        "feature_cache_key": cache_key,
+        "rows": {"train": len(X_fit), "test": len(X_eval)},
+        "materials": materials,
+        # Those of the full retrain the forest descends from; it now has incremental.trees
+        "hyperparameters": hyperparameters,
+        "metrics": metrics,
+        "surrogate_metrics": surrogate.metrics,
+        "incremental": {
+            "base_version": base_info["model_version"],
+            "new_rows": int(is_new.sum()),
+            "reused_rows": int((~is_new).sum()),
+            "replayed_rows": len(replay),
+            "added_trees": args.add_trees,
+            "trees": forest.n_estimators,
+            "seconds": incremental_seconds,
+            "unseen": unseen,
+            "comparison": comparison
+        }
+    }, surrogate=surrogate)
+    print(f"   {directory}/")
+    if args.no_publish:
+        print(f"\n✅ Model updated; {MODEL_PATH} left unchanged")
+        return
+    publish(directory)
+    print(f"\n✅ Model updated and published as {MODEL_PATH} ({version})")
+
+
+if __name__ == "__main__":
+    main()
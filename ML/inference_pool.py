@@ -0,0 +1,198 @@
+"""
+Bounded inference pool for the ML server.
+Model calls run on a fixed number of worker threads instead of the event
+loop, and requests are admitted only while the wait queue has room, so
+cheap endpoints such as /health stay responsive under prediction load.
+
+Requests belong to a priority class. Each class has its own bounded queue,
+and a free worker always goes to the oldest waiting job of the highest
+class, so bulk scoring cannot hold interactive requests back by more than
+one running job. Jobs may carry a deadline; one that is reached before the
+job gets a worker is dropped instead of scored.
+"""
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Priority classes, highest first
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot admit more requests"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised for a job whose deadline passed before it could run"""
+
+
+def deadline_passed(deadline, now=None):
+    """Whether a time.monotonic() deadline (or None for no deadline) has passed"""
+    return deadline is not None and (time.monotonic() if now is None else now) > deadline
+
+
+class TokenBucket:
+    """Rate limit of `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self, count=1):
+        """Take count tokens; returns 0 if it could, otherwise seconds until it can.
+
+        A request larger than the burst goes through whenever the bucket is
+        full and leaves it in debt, so large batches are slowed, not refused.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        needed = min(count, self.burst)
+        if self.tokens >= needed:
+            self.tokens -= count
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "tokens": round(self.tokens, 2)}
+
+
+class InferencePool:
+    """Thread pool with a concurrency limit and a bounded wait queue per priority class.
+
+    Callers reserve queue space with admit() before doing any work and hand
+    the reservation to run(), which releases it once the job starts.
+    max_queue_depth applies to every class not given its own depth in
+    class_queue_depths.
+    """
+
+    def __init__(self, max_workers=1, max_queue_depth=256, class_queue_depths=None):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue_depths = {priority: max(0, int(max_queue_depth)) for priority in PRIORITIES}
+        for priority, depth in (class_queue_depths or {}).items():
+            self._check_priority(priority)
+            self.max_queue_depths[priority] = max(0, int(depth))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self.queued_by_class = dict.fromkeys(PRIORITIES, 0)
+        self.rejected_by_class = dict.fromkeys(PRIORITIES, 0)
+        self.running = 0
+        self.completed = 0
+        self.expired = 0
+        self._free_slots = self.max_workers
+        self._waiters = {priority: deque() for priority in PRIORITIES}
+
+    @staticmethod
+    def _check_priority(priority):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority class {priority!r} (expected one of {', '.join(PRIORITIES)})")
+
+    @property
+    def queued(self):
+        return sum(self.queued_by_class.values())
+
+    @property
+    def rejected(self):
+        return sum(self.rejected_by_class.values())
+
+    def try_admit(self, count=1, priority=INTERACTIVE):
+        """Reserve queue space for count requests if there is room; returns whether it did"""
+        self._check_priority(priority)
+        if self.queued_by_class[priority] + count > self.max_queue_depths[priority]:
+            return False
+        self.queued_by_class[priority] += count
+        return True
+
+    def admit(self, count=1, priority=INTERACTIVE):
+        """Reserve queue space for count requests or raise QueueFullError"""
+        if not self.try_admit(count, priority):
+            self.rejected_by_class[priority] += count
+            raise QueueFullError(
+                f"Inference queue for {priority} requests is full "
+                f"({self.queued_by_class[priority]}/{self.max_queue_depths[priority]} waiting)"
+            )
+
+    def release(self, count=1, priority=INTERACTIVE):
+        """Give back queue space for requests that will not run"""
+        self.queued_by_class[priority] = max(0, self.queued_by_class[priority] - count)
+
+    async def _acquire_slot(self, priority):
+        if self._free_slots > 0 and not any(self._waiters.values()):
+            self._free_slots -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up
+                self._release_slot()
+            else:
+                self._waiters[priority].remove(future)
+            raise
+
+    def _release_slot(self):
+        """Hand the slot to the first waiter of the highest class, or free it"""
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self._free_slots += 1
+
+    async def run(self, fn, *args, admitted=0, priority=INTERACTIVE, deadline=None):
+        """Run fn(*args) on a worker thread once a slot is free.
+
+        admitted is the number of queue reservations of this class the job
+        covers; they are released when the job starts (or fails to). Raises
+        DeadlineExceededError without running fn if deadline (a
+        time.monotonic() value) has passed by the time a slot is free.
+        """
+        try:
+            await self._acquire_slot(priority)
+        finally:
+            self.release(admitted, priority)
+        try:
+            if deadline_passed(deadline):
+                self.expired += 1
+                raise DeadlineExceededError("Deadline passed while waiting for an inference thread")
+            self.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+            finally:
+                self.running -= 1
+                self.completed += 1
+        finally:
+            self._release_slot()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Concurrency and queue occupancy for monitoring"""
+        return {
+            "max_workers": self.max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "classes": {
+                priority: {
+                    "max_queue_depth": self.max_queue_depths[priority],
+                    "queued": self.queued_by_class[priority],
+                    "waiting_for_thread": sum(not f.done() for f in self._waiters[priority]),
+                    "rejected": self.rejected_by_class[priority]
+                }
+                for priority in PRIORITIES
+            }
+        }
@@ -0,0 +1,213 @@
+"""
+Minimal Prometheus-style metrics for the ML server.
+Counters, gauges and histograms rendered in the Prometheus text exposition
+format, without depending on prometheus_client. Updates take a lock, so
+metrics can be recorded from the event loop and the inference threads.
+"""
+
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5
+]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum and max"""
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+    def samples(self, name, labels="", scale=1.0):
+        """Exposition lines with cumulative buckets; scale converts the bucket unit"""
+        with self._lock:
+            counts = list(self.counts)
+            count = self.count
+            total = self.total
+        inner = labels[1:-1] + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+            cumulative += bucket_count
+            le = _number(bound * scale if bound != float("inf") else bound)
+            lines.append(f'{name}_bucket{{{inner}le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels} {_number(total * scale)}")
+        lines.append(f"{name}_count{labels} {count}")
+        return lines
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter, optionally labelled"""
+    type = "counter"
+
+    def __init__(self, name, help, label_names=()):
+        super().__init__(name, help, label_names)
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, optionally labelled"""
+    type = "gauge"
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose value is read from fn() when metrics are scraped.
+
+    fn returns a number, or a dict mapping label value tuples to numbers.
+    """
+
+    def __init__(self, name, help, fn, type="gauge", label_names=()):
+        super().__init__(name, help, label_names)
+        self.type = type
+        self.fn = fn
+
+    def render(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+            for labels, value in values.items() if value is not None
+        ]
+
+
+class HistogramVec(_Metric):
+    """Histogram with one child per combination of label values"""
+    type = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS, scale=1.0, children=None):
+        super().__init__(name, help, label_names)
+        self.buckets = list(buckets)
+        self.scale = scale
+        self._children = {}
+        self._source = children
+
+    def labels(self, *label_values):
+        child = self._children.get(label_values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(label_values, Histogram(self.buckets))
+        return child
+
+    def observe(self, value, *label_values):
+        self.labels(*label_values).observe(value)
+
+    def render(self):
+        children = self._source() if self._source is not None else dict(self._children)
+        lines = self.header()
+        for labels, histogram in sorted(children.items()):
+            lines += histogram.samples(self.name, _labels(self.label_names, labels), self.scale)
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, label_names=()):
+        return self.register(Counter(name, help, label_names))
+
+    def gauge(self, name, help, label_names=()):
+        return self.register(Gauge(name, help, label_names))
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(HistogramVec(name, help, label_names, buckets))
+
+    def callback(self, name, help, fn, type="gauge", label_names=()):
+        return self.register(CallbackMetric(name, help, fn, type, label_names))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
@@ -1,12 +1,38 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import joblib
-import pandas as pd
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import numpy as np
 import uvicorn
+import asyncio
+import functools
+import hmac
+import json
 import logging
+import math
+import os
+import random
+import sys
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from batching import BATCH_SIZE_BUCKETS, QUEUE_WAIT_BUCKETS_MS, MicroBatcher
+from catalogue_index import CRITERIA, ECO_SCORE, INDEX_PATH, CatalogueIndex
+from inference_pool import (
+    BULK, INTERACTIVE, PRIORITIES, DeadlineExceededError, InferencePool, QueueFullError, TokenBucket,
+    deadline_passed
+)
+from metrics import CONTENT_TYPE, HistogramVec, Registry
+from feature_schema import CATEGORY_OUTCOMES, EXACT, SCHEMA_PATH, UNKNOWN, UNKNOWN_CODE, SchemaError
+from features import ECO_FRIENDLY_SCORE
+from model_store import ARRAYS_PATH, MODEL_PATH, artifact_paths, load_serving_model, per_tree_spread
+from packed_rows import (
+    PACKED_CONTENT_TYPE, RESULT_COLUMNS, SCHEMA_HEADER, STATUS_CODES,
+    decode_rows, describe, is_packed, pack_predictions, pack_results
+)
+from prediction_cache import PredictionCache, SingleFlight, row_key
+from shadow import DIFF_BUCKETS, ShadowScorer
+from surrogate import SURROGATE_PATH
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -23,44 +49,789 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variable for model
-model = None
+# Time the server module was imported; fallback start time where /proc is unavailable
+SERVER_STARTED_AT = time.perf_counter()
+
+# Active model version: the model, its schema and fingerprint in one object
+# that reloads replace as a whole (see activate_model)
+serving = None
+
+# Candidate model scoring a sample of traffic off the request path, if any
+shadow = None
+
+# Precomputed scores of the product catalogue (see catalogue_index.py), if built
+catalogue = None
+
+# Load timings and memory use recorded on startup
+startup_stats = {}
+
+# Set ML_FAST_INFERENCE=0 to always predict through the scikit-learn pipeline
+FAST_INFERENCE = os.environ.get("ML_FAST_INFERENCE", "1") != "0"
+
+# Poll eco_model.pkl every ML_MODEL_WATCH_SECONDS and hot-reload it when it
+# changes; 0 disables the watcher (POST /admin/reload still works)
+MODEL_WATCH_SECONDS = float(os.environ.get("ML_MODEL_WATCH_SECONDS", "0"))
+
+# Artifact directory of a candidate model to shadow at startup, and the
+# fraction of successful predictions it scores
+SHADOW_MODEL = os.environ.get("ML_SHADOW_MODEL")
+SHADOW_SAMPLE_RATE = float(os.environ.get("ML_SHADOW_SAMPLE_RATE", "0.05"))
+
+# Directory of the catalogue index memory-mapped at startup
+CATALOGUE_INDEX_PATH = os.environ.get("ML_CATALOGUE_INDEX", INDEX_PATH)
+
+# Answer from the surrogate fast tier instead of 503 when the inference
+# queue is full; ML_OVERLOAD_FAST_TIER=0 sheds load with 503 instead
+OVERLOAD_FAST_TIER = os.environ.get("ML_OVERLOAD_FAST_TIER", "1") != "0"
+
+# Admin endpoints require this value in the X-Admin-Token header; without
+# it they only accept requests from the local machine
+ADMIN_TOKEN = os.environ.get("ML_ADMIN_TOKEN")
+
+# Results of recently scored inputs; ML_CACHE_SIZE=0 disables caching
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get("ML_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.environ.get("ML_CACHE_TTL_SECONDS", "3600"))
+)
+
+# /predict calls for a record that is already being scored wait for that result
+flights = SingleFlight()
+
+# Loads models in the background so reloads never take an inference thread
+loader_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+# Serializes reloads from the admin endpoint and the file watcher
+_reload_lock = None
 
 def load_model():
     """Load the ML model with error handling"""
-    global model
     try:
-        model = joblib.load("eco_model.pkl")
-        logger.info("Model loaded successfully")
+        activate_model(load_serving_model(MODEL_PATH, ARRAYS_PATH, SCHEMA_PATH, SURROGATE_PATH, FAST_INFERENCE))
         return True
     except FileNotFoundError:
-        logger.error("Model file 'eco_model.pkl' not found")
+        logger.error(f"Model file '{MODEL_PATH}' not found")
+        return False
+    except SchemaError as e:
+        logger.error(f"Refusing to load model: {str(e)}")
         return False
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
         return False
 
+def activate_model(candidate):
+    """Make candidate the model new requests are scored with"""
+    global serving
+    serving = candidate
+    model_info.clear()
+    model_info.set(1, candidate.version)
+    prediction_cache.set_model_version(candidate.version)
+    logger.info(f"Model loaded successfully (version {candidate.version})")
+
+def load_warm_model(paths):
+    """Load a model and run a first prediction; runs on the loader thread"""
+    candidate = load_serving_model(*paths, fast_inference=FAST_INFERENCE)
+    candidate.warm_up()
+    return candidate
+
+async def reload_model(artifact=None):
+    """Load, warm up and switch to a new model without interrupting requests.
+    
+    Loads the published model files, or the files of a retrain_model.py
+    artifact directory. Requests already running finish on the previous
+    model. Raises if loading fails, leaving the current model active.
+    """
+    global _reload_lock
+    if _reload_lock is None:
+        _reload_lock = asyncio.Lock()
+    paths = artifact_paths(artifact) if artifact else (MODEL_PATH, ARRAYS_PATH, SCHEMA_PATH, SURROGATE_PATH)
+    async with _reload_lock:
+        started = time.perf_counter()
+        previous = serving.version if serving is not None else None
+        try:
+            candidate = await asyncio.get_running_loop().run_in_executor(
+                loader_executor, load_warm_model, paths
+            )
+        except Exception as e:
+            model_reloads.inc("failed")
+            logger.error(f"Reload of '{paths[0]}' failed, still serving {previous}: {str(e)}")
+            raise
+        if candidate.version == previous:
+            model_reloads.inc("unchanged")
+            return {"status": "unchanged", "model_version": previous}
+        activate_model(candidate)
+        model_reloads.inc("success")
+        load_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"Hot-reloaded model {previous} -> {candidate.version} in {load_ms} ms")
+        return {
+            "status": "reloaded",
+            "previous_version": previous,
+            "model_version": candidate.version,
+            "source": candidate.source,
+            "load_ms": load_ms
+        }
+
+def model_file_state():
+    """Modification time and size of the published model file, or None"""
+    try:
+        stat = os.stat(MODEL_PATH)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+async def watch_model_file():
+    """Hot-reload the published model whenever eco_model.pkl is replaced"""
+    last_seen = model_file_state()
+    while True:
+        await asyncio.sleep(MODEL_WATCH_SECONDS)
+        current = model_file_state()
+        if current is None or current == last_seen:
+            continue
+        last_seen = current
+        try:
+            await reload_model()
+        except Exception:
+            # Logged by reload_model; retried when the file changes again
+            pass
+
+def start_shadow(artifact, sample_rate):
+    """Load a candidate model and start shadow-scoring traffic with it"""
+    global shadow
+    candidate = load_warm_model(artifact_paths(artifact))
+    previous, shadow = shadow, ShadowScorer(candidate, format_prediction, sample_rate)
+    if previous is not None:
+        previous.shutdown()
+    logger.info(f"Shadowing model {candidate.version} on {shadow.sample_rate:.1%} of predictions")
+    return shadow
+
+def stop_shadow():
+    global shadow
+    previous, shadow = shadow, None
+    if previous is not None:
+        previous.shutdown()
+    return previous
+
+def model_ready():
+    """True once a model is loaded"""
+    return serving is not None
+
+def load_catalogue():
+    """Memory-map the catalogue index if one has been built"""
+    global catalogue
+    if not os.path.isdir(CATALOGUE_INDEX_PATH):
+        logger.info(f"No '{CATALOGUE_INDEX_PATH}' directory, catalogue lookups disabled")
+        return False
+    try:
+        index = CatalogueIndex.load(CATALOGUE_INDEX_PATH)
+    except Exception as e:
+        logger.warning(f"Could not load '{CATALOGUE_INDEX_PATH}': {str(e)}")
+        return False
+    catalogue = index
+    logger.info(f"Memory-mapped catalogue index of {len(index)} products (model {index.model_version})")
+    if serving is not None and index.model_version != serving.version:
+        logger.warning(
+            f"Catalogue index was scored with model {index.model_version}, serving {serving.version}; "
+            "rebuild it with 'python catalogue_index.py'"
+        )
+    return True
+
+def process_memory_mb():
+    """Resident memory of this process, split into anonymous and file-backed pages"""
+    memory = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    memory[key] = round(int(value.split()[0]) / 1024, 1)
+        return {
+            "rss_mb": memory.get("VmRSS"),
+            "rss_anon_mb": memory.get("RssAnon"),
+            "rss_file_mb": memory.get("RssFile")
+        }
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return {"rss_mb": round(peak / divisor, 1)}
+
+def process_age_seconds():
+    """Seconds since this process started, including interpreter and import time"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name; the start time is field 22 of the full line
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - SERVER_STARTED_AT
+
+# Micro-batching settings: how long to collect concurrent /predict calls
+# and how many records may be scored together
+BATCH_WAIT_MS = float(os.environ.get("ML_BATCH_WAIT_MS", "2"))
+BATCH_MAX_SIZE = int(os.environ.get("ML_BATCH_MAX_SIZE", "64"))
+
+# Model calls run on ML_INFERENCE_THREADS worker threads; at most
+# ML_INFERENCE_QUEUE_DEPTH interactive and ML_BULK_QUEUE_DEPTH bulk requests
+# may wait for one before we answer 503, and interactive requests go first
+inference_pool = InferencePool(
+    max_workers=int(os.environ.get("ML_INFERENCE_THREADS", "1")),
+    max_queue_depth=int(os.environ.get("ML_INFERENCE_QUEUE_DEPTH", "256")),
+    class_queue_depths={BULK: int(os.environ.get("ML_BULK_QUEUE_DEPTH", "64"))}
+)
+
+# Requests pick their priority class with this header (or ?priority=)
+PRIORITY_HEADER = "X-Priority"
+
+# Milliseconds the client waits for an answer; requests still queued when
+# it runs out are dropped with 504 instead of scored
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+# Token-bucket rate limits per priority class, in records per second, e.g.
+# ML_RATE_LIMIT_BULK=200 with bursts of ML_RATE_BURST_BULK; 0 = unlimited
+rate_limits = {}
+for _priority in PRIORITIES:
+    _rate = float(os.environ.get(f"ML_RATE_LIMIT_{_priority.upper()}", "0"))
+    if _rate > 0:
+        rate_limits[_priority] = TokenBucket(_rate, float(os.environ.get(f"ML_RATE_BURST_{_priority.upper()}", "0")))
+
+# Coalesces concurrent /predict calls, created on startup
+batcher = None
+
+# Background task polling the model file when ML_MODEL_WATCH_SECONDS is set
+watcher = None
+
+# Metrics exposed on /metrics in the Prometheus text format
+registry = Registry()
+stage_seconds = registry.histogram(
+    "ml_request_stage_seconds", "Time spent in each stage of a prediction request", ("endpoint", "stage")
+)
+request_seconds = registry.histogram(
+    "ml_request_duration_seconds", "End-to-end latency of prediction requests", ("endpoint",)
+)
+model_call_seconds = registry.histogram("ml_model_predict_seconds", "Duration of one vectorized model call")
+outcomes = registry.counter(
+    "ml_predictions_total", "Predicted records by outcome (success, fallback, error)", ("endpoint", "outcome")
+)
+in_flight = registry.gauge("ml_requests_in_flight", "Prediction requests currently being handled", ("endpoint",))
+model_info = registry.gauge("ml_model_info", "Version of the loaded model", ("version",))
+registry.callback("ml_model_loaded", "Whether a model is loaded", lambda: int(model_ready()))
+registry.callback("ml_inference_queue_depth", "Requests waiting for an inference thread by priority class",
+                  lambda: {(priority,): queued for priority, queued in inference_pool.queued_by_class.items()},
+                  label_names=("priority",))
+registry.callback("ml_inference_running", "Model calls currently running", lambda: inference_pool.running)
+registry.callback("ml_inference_rejected_total", "Requests rejected with 503 because the queue was full",
+                  lambda: inference_pool.rejected, type="counter")
+shed = registry.counter(
+    "ml_requests_shed_total", "Requests shed before scoring by priority class and reason "
+    "(queue_full, rate_limited, deadline)", ("priority", "reason")
+)
+coalesced = registry.counter(
+    "ml_coalesced_predictions_total", "Requests answered by joining an identical in-flight prediction", ("endpoint",)
+)
+registry.callback("ml_predictions_in_flight", "Distinct records currently being scored for /predict",
+                  lambda: len(flights))
+fast_tier = registry.counter(
+    "ml_fast_tier_total", "Records answered by the surrogate fast tier by reason (requested, overload)",
+    ("endpoint", "reason")
+)
+category_values = registry.counter(
+    "ml_category_values_total", "Categorical values of scored records by column and how they resolved "
+    "(exact, normalized, missing, unknown)", ("column", "result")
+)
+registry.callback("ml_cache_lookups_total", "Prediction cache lookups by result",
+                  lambda: {("hit",): prediction_cache.hits, ("miss",): prediction_cache.misses},
+                  type="counter", label_names=("result",))
+registry.callback("ml_cache_entries", "Entries in the prediction cache", lambda: len(prediction_cache))
+registry.register(HistogramVec(
+    "ml_batch_size", "Records per micro-batch", buckets=BATCH_SIZE_BUCKETS,
+    children=lambda: {(): batcher.batch_sizes} if batcher is not None else {}
+))
+registry.register(HistogramVec(
+    "ml_batch_queue_wait_seconds", "Time records waited in the micro-batcher before scoring",
+    buckets=QUEUE_WAIT_BUCKETS_MS, scale=0.001,
+    children=lambda: {(): batcher.queue_wait_ms} if batcher is not None else {}
+))
+model_reloads = registry.counter(
+    "ml_model_reloads_total", "Hot reload attempts by result (success, unchanged, failed)", ("result",)
+)
+registry.callback("ml_shadow_predictions_total", "Records sampled for the shadow model by result",
+                  lambda: {(result,): getattr(shadow, result) for result in ("scored", "dropped", "failed")}
+                  if shadow is not None else {},
+                  type="counter", label_names=("result",))
+registry.callback("ml_shadow_decision_flips_total",
+                  "Shadow-scored records whose eco-friendly decision differs from the active model",
+                  lambda: shadow.decision_flips if shadow is not None else None, type="counter")
+registry.register(HistogramVec(
+    "ml_shadow_abs_diff", "Absolute difference between shadow and active predictions", ("field",),
+    buckets=DIFF_BUCKETS,
+    children=lambda: {(field,): h for field, h in shadow.abs_diff.items()} if shadow is not None else {}
+))
+
+# Full request and response payloads are logged for this fraction of requests,
+# or for every request when the log level is DEBUG
+PAYLOAD_LOG_SAMPLE_RATE = float(os.environ.get("ML_PAYLOAD_LOG_SAMPLE_RATE", "0"))
+
 # Load model on startup
 @app.on_event("startup")
 async def startup_event():
-    if not load_model():
+    global batcher, watcher
+    load_started = time.perf_counter()
+    if model_ready():
+        # Already loaded by a pre-forking launcher (serve.py) before this worker started
+        logger.info(f"Using model loaded before worker start (version {serving.version})")
+        record_startup_stats(load_started)
+    elif not load_model():
         logger.error("Failed to load model on startup")
+    else:
+        record_startup_stats(load_started)
+    load_catalogue()
+    batcher = MicroBatcher(
+        predict_submitted,
+        max_wait_ms=BATCH_WAIT_MS,
+        max_batch_size=BATCH_MAX_SIZE,
+        pool=inference_pool
+    )
+    batcher.start()
+    if MODEL_WATCH_SECONDS > 0:
+        watcher = asyncio.get_running_loop().create_task(watch_model_file())
+        logger.info(f"Watching '{MODEL_PATH}' for new models every {MODEL_WATCH_SECONDS:g}s")
+    if SHADOW_MODEL:
+        try:
+            start_shadow(SHADOW_MODEL, SHADOW_SAMPLE_RATE)
+        except Exception as e:
+            logger.error(f"Could not load shadow model '{SHADOW_MODEL}': {str(e)}")
+
+def record_startup_stats(load_started):
+    """Run a first prediction and log how long startup took and memory use"""
+    loaded = time.perf_counter()
+    try:
+        serving.warm_up()
+    except Exception as e:
+        logger.warning(f"Warm-up prediction failed: {str(e)}")
+    startup_stats.update({
+        "memory_mapped": serving.memory_mapped,
+        "model_load_ms": round((loaded - load_started) * 1000, 1),
+        "time_to_first_prediction_ms": round(process_age_seconds() * 1000, 1),
+        **process_memory_mb()
+    })
+    logger.info(
+        f"Startup: model load {startup_stats['model_load_ms']} ms, "
+        f"time to first prediction {startup_stats['time_to_first_prediction_ms']} ms, "
+        f"RSS {startup_stats['rss_mb']} MB (memory mapped: {startup_stats['memory_mapped']})"
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if watcher is not None:
+        watcher.cancel()
+    stop_shadow()
+    loader_executor.shutdown(wait=False)
+    if batcher is not None:
+        await batcher.stop()
+    inference_pool.shutdown()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "message": "Eco ML Server is running"
+        "model_loaded": model_ready(),
+        "message": "Eco ML Server is running",
+        "model_version": serving.version if serving is not None else None,
+        "startup": startup_stats,
+        "inference": inference_pool.stats(),
+        "rate_limits": {priority: bucket.stats() for priority, bucket in rate_limits.items()},
+        "batching": batcher.stats() if batcher is not None else None,
+        "cache": prediction_cache.stats(),
+        "single_flight": flights.stats(),
+        "fast_tier": {
+            "available": serving is not None and serving.surrogate is not None,
+            "on_overload": OVERLOAD_FAST_TIER
+        },
+        "shadow": shadow.stats() if shadow is not None else None,
+        "catalogue": catalogue_stats(),
+        "categories": category_stats()
+    }
+
+def category_stats():
+    """Share of each categorical column's values the served model could not place"""
+    if serving is None:
+        return None
+    stats = {}
+    for column in serving.schema.code_lookups:
+        counts = {result: category_values.value(column, result) for result in CATEGORY_OUTCOMES}
+        seen = sum(counts.values())
+        stats[column] = {
+            **counts,
+            "unknown_rate": round(counts[UNKNOWN] / seen, 4) if seen else None
+        }
+    return stats
+
+# Fields every product record must provide
+REQUIRED_FIELDS = ['Weight (kg)', 'Distance (km)']
+
+# Upper bound on the number of records accepted by /predict/batch
+MAX_BATCH_SIZE = int(os.environ.get("ML_MAX_BATCH_SIZE", "1000"))
+
+# /predict/stream scores this many records per vectorized model call
+STREAM_CHUNK_SIZE = int(os.environ.get("ML_STREAM_CHUNK_SIZE", "512"))
+
+# Longest NDJSON line accepted by /predict/stream, in bytes
+STREAM_MAX_LINE_BYTES = int(os.environ.get("ML_STREAM_MAX_LINE_BYTES", str(64 * 1024)))
+
+# Share of the per-tree predictions covered by ?uncertainty=true intervals
+DEFAULT_INTERVAL = 0.9
+
+def validate_record(input_data):
+    """Raise ValueError if a product record cannot be scored"""
+    if not isinstance(input_data, dict):
+        raise ValueError("Product record must be a JSON object")
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in input_data]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+
+def prepare_record(served, input_data, out=None):
+    """Encode a validated record into an input row for the served model.
+    
+    Missing columns take their schema default; raises ValueError for values
+    the schema cannot encode.
+    """
+    row = served.schema.encode(input_data, out=out)
+    for column, result in served.schema.category_outcomes(input_data, row):
+        category_values.inc(column, result)
+    return row
+
+def count_packed_categories(served, rows):
+    """Count the categorical values of packed rows, which arrive already encoded"""
+    schema = served.schema
+    for i in schema.categorical_positions:
+        unknown = int(np.count_nonzero(rows[:, i] == UNKNOWN_CODE))
+        if unknown:
+            category_values.inc(schema.columns[i], UNKNOWN, amount=unknown)
+        if len(rows) > unknown:
+            category_values.inc(schema.columns[i], EXACT, amount=len(rows) - unknown)
+
+def format_prediction(prediction):
+    """Convert one row of model output into the API response shape"""
+    # Convert numpy types to native Python types
+    carbon_footprint = float(round(prediction[0], 2))
+    eco_score = float(round(prediction[1], 2))
+    
+    is_eco_friendly = False
+    if len(prediction) > 2:
+        is_eco_friendly = bool(prediction[2])
+    else:
+        is_eco_friendly = eco_score >= ECO_FRIENDLY_SCORE
+    
+    return {
+        "carbon_footprint": carbon_footprint,
+        "eco_score": eco_score,
+        "isEcoFriendly": is_eco_friendly,
+        "status": "success"
     }
 
+def fallback_prediction(served, record, error):
+    """Prediction used when the model fails on an encoded record.
+    
+    Answers with the surrogate shipped with the model, or with a rough
+    heuristic when there is none.
+    """
+    if served.surrogate is None:
+        return heuristic_prediction(served.schema.to_record(record), error)
+    result = format_prediction(served.predict_surrogate(record)[0])
+    result["status"] = "fallback"
+    result["warning"] = f"ML model failed, answered by the surrogate: {str(error)}"
+    return result
+
+def heuristic_prediction(input_data, error):
+    """Heuristic prediction used when the model fails and has no surrogate"""
+    weight = input_data.get('Weight (kg)', 1)
+    recyclable = input_data.get('Recyclable', 0)
+    repairable = input_data.get('Repairable', 0)
+    
+    # Simple heuristic-based fallback
+    carbon_footprint = weight * 2.5  # Rough estimate
+    eco_score = 50 + (recyclable * 20) + (repairable * 15)  # Basic scoring
+    eco_score = min(100, max(0, eco_score))  # Clamp between 0-100
+    
+    return {
+        "carbon_footprint": round(carbon_footprint, 2),
+        "eco_score": round(eco_score / 100, 2),  # Normalize to 0-1
+        "isEcoFriendly": eco_score >= 60,
+        "status": "fallback",
+        "warning": f"ML model failed: {str(error)}"
+    }
+
+def log_prediction_error(e, served, records):
+    """Log the details of a failed model.predict call"""
+    data = served.schema.decode(np.vstack(records))
+    logger.error(f"Model prediction error: {str(e)}")
+    logger.error(f"Error type: {type(e).__name__}")
+    logger.error(f"Data shape: {data.shape if hasattr(data, 'shape') else 'No shape'}")
+    logger.error(f"Data columns: {list(data.columns) if hasattr(data, 'columns') else 'No columns'}")
+    logger.error(f"Data types: {data.dtypes if hasattr(data, 'dtypes') else 'No dtypes'}")
+    logger.error(f"Traceback: {traceback.format_exc()}")
+
+def request_class(request, default=INTERACTIVE):
+    """(priority class, deadline) of a request.
+    
+    The class comes from the X-Priority header or ?priority=; the deadline
+    is when the client gives up according to X-Request-Timeout-Ms, as a
+    time.monotonic() value, or None without the header.
+    """
+    priority = (request.headers.get(PRIORITY_HEADER) or request.query_params.get("priority") or default).lower()
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(PRIORITIES)}")
+    timeout = request.headers.get(TIMEOUT_HEADER)
+    if timeout is None:
+        return priority, None
+    try:
+        timeout_ms = float(timeout)
+    except ValueError:
+        timeout_ms = None
+    if timeout_ms is None or not 0 < timeout_ms < math.inf:
+        raise HTTPException(status_code=400, detail=f"{TIMEOUT_HEADER} must be a positive number of milliseconds")
+    return priority, time.monotonic() + timeout_ms / 1000
+
+def deadline_exceeded(priority):
+    """504 for a request whose client timeout ran out before it was scored"""
+    shed.inc(priority, "deadline")
+    return HTTPException(status_code=504, detail="Request timeout passed before it could be scored")
+
+def admit_inference(count=1, served=None, priority=INTERACTIVE, deadline=None, records=None):
+    """Reserve room in the inference queue of a priority class or shed the request.
+    
+    Answers 504 if the deadline has already passed, 429 when the class is
+    over its rate limit (which counts `records`, by default count) and 503
+    when its queue is full. Pass the served
+    model when the request can be answered by its fast tier instead: then
+    a full queue returns False rather than 503 (if the model has a
+    surrogate and ML_OVERLOAD_FAST_TIER is on).
+    """
+    if deadline_passed(deadline):
+        raise deadline_exceeded(priority)
+    bucket = rate_limits.get(priority)
+    if bucket is not None:
+        wait = bucket.take(count if records is None else records)
+        if wait > 0:
+            shed.inc(priority, "rate_limited")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit for {priority} requests exceeded",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+    if inference_pool.try_admit(count, priority):
+        return True
+    if served is not None and served.surrogate is not None and OVERLOAD_FAST_TIER:
+        logger.warning(f"Inference queue for {priority} requests is full, answering from the fast tier")
+        return False
+    try:
+        inference_pool.admit(count, priority)
+    except QueueFullError as e:
+        logger.warning(f"Rejecting request: {str(e)}")
+        shed.inc(priority, "queue_full")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+    return True
+
+def fast_tier_requested(request, served, interval=None):
+    """Whether the caller asked for the surrogate with ?tier=fast (?tier=full is the default)"""
+    tier = request.query_params.get("tier", "full").lower()
+    if tier not in ("fast", "full"):
+        raise HTTPException(status_code=400, detail="tier must be 'fast' or 'full'")
+    if tier == "full":
+        return False
+    if served.surrogate is None:
+        raise HTTPException(status_code=400, detail="No fast tier: the served model has no surrogate")
+    if interval is not None:
+        raise HTTPException(status_code=400, detail="Uncertainty estimates need the full model, not tier=fast")
+    return True
+
+def predict_fast(served, records):
+    """Score encoded records with the surrogate, in one vectorized call.
+    
+    Fast enough to run on the event loop; results are marked "tier": "fast"
+    and are never cached.
+    """
+    results = []
+    for prediction in served.predict_surrogate(np.vstack(records)):
+        result = format_prediction(prediction)
+        result["tier"] = "fast"
+        results.append(result)
+    return results
+
+def run_model(served, records):
+    """Run the served model on encoded rows and return the raw prediction rows"""
+    rows = np.vstack(records)
+    started = time.perf_counter()
+    try:
+        return served.predict(rows)
+    finally:
+        model_call_seconds.observe(time.perf_counter() - started)
+
+def predict_records(served, records):
+    """Score many prepared records with a single model.predict call.
+    
+    If the vectorized call fails, each record is retried on its own so that
+    one bad row only affects its own result.
+    """
+    try:
+        return [format_prediction(row) for row in run_model(served, records)]
+    except Exception as e:
+        log_prediction_error(e, served, records)
+    return predict_each(served, records)
+
+def predict_each(served, records):
+    """Score records one at a time, using the fallback for those that fail"""
+    results = []
+    for record in records:
+        try:
+            results.append(format_prediction(run_model(served, [record])[0]))
+        except Exception as e:
+            logger.warning(f"Record failed on its own, using fallback: {str(e)}")
+            try:
+                results.append(fallback_prediction(served, record, e))
+            except Exception:
+                results.append({"status": "error", "error": f"ML model failed: {str(e)}"})
+    return results
+
+def uncertainty_interval(request, served):
+    """Interval requested with ?uncertainty=true (and optionally &interval=0.8), or None"""
+    if request.query_params.get("uncertainty", "").lower() not in ("1", "true", "yes"):
+        return None
+    try:
+        interval = float(request.query_params.get("interval", DEFAULT_INTERVAL))
+    except ValueError:
+        interval = None
+    if interval is None or not 0 < interval < 1:
+        raise HTTPException(status_code=400, detail="interval must be a number between 0 and 1")
+    if not served.supports_uncertainty:
+        raise HTTPException(status_code=400, detail="Uncertainty estimates need a random forest model")
+    return interval
+
+def predict_records_with_uncertainty(served, records, interval):
+    """Score records like predict_records and add the spread of the forest's trees.
+    
+    Each successful result gets an "uncertainty" object with the per-tree
+    standard deviation and the central `interval` of the per-tree
+    predictions for both targets. Comes from the same tree walk as the
+    prediction.
+    """
+    started = time.perf_counter()
+    try:
+        predictions, per_tree = served.predict_per_tree(np.vstack(records))
+    except Exception as e:
+        log_prediction_error(e, served, records)
+        return predict_each(served, records)
+    finally:
+        model_call_seconds.observe(time.perf_counter() - started)
+    
+    std, lower, upper = per_tree_spread(per_tree, interval)
+    results = []
+    for i, prediction in enumerate(predictions):
+        result = format_prediction(prediction)
+        result["uncertainty"] = {
+            "interval": interval,
+            **{
+                field: {
+                    "std": round(float(std[i, j]), 4),
+                    "lower": round(float(lower[i, j]), 4),
+                    "upper": round(float(upper[i, j]), 4)
+                }
+                for j, field in enumerate(["carbon_footprint", "eco_score"])
+            }
+        }
+        results.append(result)
+    return results
+
+def predict_packed_rows(served, rows):
+    """Score decoded packed rows into a packed result matrix"""
+    try:
+        return pack_predictions(run_model(served, rows))
+    except Exception as e:
+        log_prediction_error(e, served, rows)
+    return pack_results(predict_each(served, rows))
+
+def predict_submitted(items):
+    """Score micro-batched (served model, row) pairs.
+    
+    Rows encoded just before a reload can share a batch with rows for the
+    new model, so each model scores the rows that were encoded for it.
+    """
+    groups = {}
+    for i, (served, _) in enumerate(items):
+        groups.setdefault(served, []).append(i)
+    results = [None] * len(items)
+    for served, indices in groups.items():
+        for i, result in zip(indices, predict_records(served, [items[i][1] for i in indices])):
+            results[i] = result
+    return results
+
+def offer_to_shadow(inputs, results):
+    """Hand a sample of scored records to the shadow model, if one is running"""
+    if shadow is not None:
+        shadow.offer(inputs, results)
+
+def log_payloads():
+    """Whether to log the full payloads of the current request"""
+    if logger.isEnabledFor(logging.DEBUG):
+        return True
+    return PAYLOAD_LOG_SAMPLE_RATE > 0 and random.random() < PAYLOAD_LOG_SAMPLE_RATE
+
+def serialize(content, endpoint):
+    """Render the JSON response, timing the serialization stage"""
+    started = time.perf_counter()
+    response = JSONResponse(content)
+    stage_seconds.observe(time.perf_counter() - started, endpoint, "serialize")
+    return response
+
+def instrumented(endpoint):
+    """Track in-flight requests, end-to-end latency and failed requests of an endpoint"""
+    def decorate(handler):
+        @functools.wraps(handler)
+        async def wrapper(request: Request):
+            started = time.perf_counter()
+            in_flight.inc(endpoint)
+            try:
+                return await handler(request)
+            except Exception:
+                outcomes.inc(endpoint, "error")
+                raise
+            finally:
+                in_flight.dec(endpoint)
+                request_seconds.observe(time.perf_counter() - started, endpoint)
+        return wrapper
+    return decorate
+
 @app.post("/predict")
+@instrumented("predict")
 async def predict(request: Request):
-    """Predict carbon footprint and eco score"""
+    """Predict carbon footprint and eco score.
+    
+    With ?uncertainty=true the result also describes how much the forest's
+    trees disagree (see predict_records_with_uncertainty). With ?tier=fast,
+    or when the inference queue is full, the surrogate answers instead of
+    the forest and the result is marked "tier": "fast". Requests are
+    interactive unless they ask for ?priority=bulk (see request_class).
+    Concurrent requests for the same record are scored once (see flights).
+    """
+    if is_packed(request.headers.get("content-type")):
+        return await predict_packed(request, "predict", max_rows=1)
+    started = time.perf_counter()
+    priority, deadline = request_class(request)
     try:
         # Check if model is loaded
-        if model is None:
+        if not model_ready():
             logger.error("Model not loaded")
             raise HTTPException(
                 status_code=503, 
@@ -70,104 +841,702 @@ async def predict(request: Request):
         # Parse input data
         try:
             input_data = await request.json()
+        except Exception as e:
+            logger.error(f"Error parsing JSON: {str(e)}")
+            raise HTTPException(
+                status_code=400, 
+                detail="Invalid JSON data provided"
+            )
+        parsed = time.perf_counter()
+        stage_seconds.observe(parsed - started, "predict", "parse")
+        verbose = log_payloads()
+        if verbose:
             logger.info(f"Received input data: {input_data}")
+        
+        # Validate required fields and encode the record for the current model;
+        # it is scored by that model even if another one is loaded meanwhile
+        served = serving
+        interval = uncertainty_interval(request, served)
+        fast = fast_tier_requested(request, served, interval)
+        try:
+            validate_record(input_data)
+            record = prepare_record(served, input_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        key = row_key(record)
+        # The cache holds forest results, which a fast-tier request must not be answered with
+        cached = prediction_cache.get(key, served.version) if interval is None and not fast else None
+        encoded = time.perf_counter()
+        stage_seconds.observe(encoded - parsed, "predict", "features")
+        if cached is not None:
+            if verbose:
+                logger.info(f"Prediction served from cache: {cached}")
+            outcomes.inc("predict", "success")
+            offer_to_shadow([input_data], [cached])
+            return serialize(cached, "predict")
+        
+        # Identical records already being scored share that computation
+        flight_key = (served.version, key)
+        flight = flights.get(flight_key) if interval is None and not fast else None
+        result = None
+        tier_reason = None
+        if flight is not None:
+            try:
+                result = await flights.join(flight)
+                coalesced.inc("predict")
+            except DeadlineExceededError:
+                # The first caller's timeout ran out; this request is scored on its own
+                flight = None
+        
+        # Make prediction; concurrent calls are scored together off the event loop
+        if result is None:
+            if fast or not admit_inference(
+                served=served if interval is None else None, priority=priority, deadline=deadline
+            ):
+                tier_reason = "requested" if fast else "overload"
+                result = predict_fast(served, [record])[0]
+                fast_tier.inc("predict", tier_reason)
+            elif interval is None:
+                result = await flights.run(
+                    flight_key, batcher.submit((served, record), priority=priority, deadline=deadline)
+                )
+            else:
+                # The per-tree spread is only computed when asked for, outside the micro-batches
+                result = (await inference_pool.run(
+                    predict_records_with_uncertainty, served, [record], interval,
+                    admitted=1, priority=priority, deadline=deadline
+                ))[0]
+        stage_seconds.observe(time.perf_counter() - encoded, "predict", "predict")
+        
+        if result["status"] == "error":
+            raise HTTPException(status_code=400, detail=result["error"])
+        if result["status"] == "success":
+            if interval is None and tier_reason is None and flight is None:
+                prediction_cache.put(key, result, served.version)
+            if verbose:
+                logger.info(f"Prediction successful: {result}")
+        else:
+            logger.warning(f"Using fallback prediction: {result}")
+        outcomes.inc("predict", result["status"])
+        if tier_reason is None:
+            offer_to_shadow([input_data], [result])
+        return serialize(result, "predict")
+            
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except DeadlineExceededError:
+        raise deadline_exceeded(priority)
+    except Exception as e:
+        logger.error(f"Unexpected error in predict endpoint: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error. Please try again later."
+        )
+
+@app.post("/predict/batch")
+@instrumented("batch")
+async def predict_batch(request: Request):
+    """Predict carbon footprint and eco score for a list of products.
+    
+    Accepts either a JSON array of product records or an object with a
+    "products" array. Results are returned in input order; a record that
+    fails validation gets an "error" result without affecting the others.
+    Packed rows (see packed_rows.py) are accepted as well, and
+    ?uncertainty=true, ?tier=fast and priority classes work as on /predict.
+    """
+    if is_packed(request.headers.get("content-type")):
+        return await predict_packed(request, "batch", max_rows=MAX_BATCH_SIZE)
+    started = time.perf_counter()
+    priority, deadline = request_class(request)
+    try:
+        if not model_ready():
+            logger.error("Model not loaded")
+            raise HTTPException(
+                status_code=503, 
+                detail="ML model is not available. Please try again later."
+            )
+        
+        try:
+            payload = await request.json()
         except Exception as e:
             logger.error(f"Error parsing JSON: {str(e)}")
             raise HTTPException(
                 status_code=400, 
                 detail="Invalid JSON data provided"
             )
+        parsed = time.perf_counter()
+        stage_seconds.observe(parsed - started, "batch", "parse")
         
-        # Validate required fields
-        required_fields = ['Weight (kg)', 'Distance (km)']
-        missing_fields = [field for field in required_fields if field not in input_data]
-        if missing_fields:
+        records = payload.get("products") if isinstance(payload, dict) else payload
+        if not isinstance(records, list):
             raise HTTPException(
                 status_code=400,
-                detail=f"Missing required fields: {', '.join(missing_fields)}"
+                detail="Expected a JSON array of products or an object with a 'products' array"
+            )
+        if len(records) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"
             )
         
-        # Get the expected material columns from the model's feature names
-        expected_materials = [
-            'Plastic', 'Aluminum', 'Steel', 'Copper', 'Silicon', 'Organic', 
-            'Glass', 'Insulation Foam', 'Drum Metal'
-        ]
+        logger.debug(f"Received batch of {len(records)} records")
         
-        # Ensure all material fields are present
-        material_features = {}
-        for material in expected_materials:
-            material_features[f"Material_{material}"] = input_data.get(f"Material_{material}", 0)
+        served = serving
+        interval = uncertainty_interval(request, served)
+        fast = fast_tier_requested(request, served, interval)
+        results = [None] * len(records)
+        rows = served.schema.empty(len(records))
+        pending_indices = []
+        pending_keys = []
+        for i, input_data in enumerate(records):
+            try:
+                validate_record(input_data)
+                prepare_record(served, input_data, out=rows[i])
+            except ValueError as e:
+                results[i] = {"status": "error", "error": str(e)}
+                continue
+            key = row_key(rows[i])
+            if interval is None and not fast:
+                results[i] = prediction_cache.get(key, served.version)
+            if results[i] is None:
+                pending_indices.append(i)
+                pending_keys.append(key)
+        encoded = time.perf_counter()
+        stage_seconds.observe(encoded - parsed, "batch", "features")
         
-        # Merge input_data and material_features (material_features will overwrite if present)
-        data = pd.DataFrame([{**input_data, **material_features}])
+        tier_reason = None
+        if pending_indices:
+            tier_reason = "requested" if fast else None
+            if tier_reason is None and not admit_inference(
+                served=served if interval is None else None, priority=priority, deadline=deadline,
+                records=len(pending_indices)
+            ):
+                tier_reason = "overload"
+            if tier_reason is not None:
+                predictions = predict_fast(served, rows[pending_indices])
+                fast_tier.inc("batch", tier_reason, amount=len(pending_indices))
+            elif interval is None:
+                predictions = await inference_pool.run(
+                    predict_records, served, rows[pending_indices], admitted=1, priority=priority, deadline=deadline
+                )
+            else:
+                predictions = await inference_pool.run(
+                    predict_records_with_uncertainty, served, rows[pending_indices], interval,
+                    admitted=1, priority=priority, deadline=deadline
+                )
+            for i, key, result in zip(pending_indices, pending_keys, predictions):
+                if result["status"] == "success" and interval is None and tier_reason is None:
+                    prediction_cache.put(key, result, served.version)
+                results[i] = result
+            stage_seconds.observe(time.perf_counter() - encoded, "batch", "predict")
         
-        logger.info(f"Prepared data for prediction: {data.to_dict('records')[0]}")
+        statuses = {}
+        for result in results:
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+        for status, count in statuses.items():
+            outcomes.inc("batch", status, amount=count)
+        succeeded = statuses.get("success", 0)
+        logger.debug(f"Batch prediction finished: {succeeded}/{len(records)} succeeded")
+        if tier_reason is None:
+            offer_to_shadow(records, results)
+        return serialize({
+            "results": results,
+            "count": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }, "batch")
         
-        try:
-            # Make prediction
-            prediction = model.predict(data)[0]
-            logger.info(f"Raw prediction: {prediction}")
-            
-            # Convert numpy types to native Python types
-            carbon_footprint = float(round(prediction[0], 2))
-            eco_score = float(round(prediction[1], 2))
-            
-            is_eco_friendly = False
-            if len(prediction) > 2:
-                is_eco_friendly = bool(prediction[2])
-            else:
-                is_eco_friendly = eco_score >= 60
-            
-            result = {
-                "carbon_footprint": carbon_footprint,
-                "eco_score": eco_score,
-                "isEcoFriendly": is_eco_friendly,
-                "status": "success"
-            }
-            
-            logger.info(f"Prediction successful: {result}")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Model prediction error: {str(e)}")
-            logger.error(f"Error type: {type(e).__name__}")
-            logger.error(f"Data shape: {data.shape if hasattr(data, 'shape') else 'No shape'}")
-            logger.error(f"Data columns: {list(data.columns) if hasattr(data, 'columns') else 'No columns'}")
-            logger.error(f"Data types: {data.dtypes if hasattr(data, 'dtypes') else 'No dtypes'}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Return fallback prediction with warning
-            weight = input_data.get('Weight (kg)', 1)
-            recyclable = input_data.get('Recyclable', 0)
-            repairable = input_data.get('Repairable', 0)
-            
-            # Simple heuristic-based fallback
-            carbon_footprint = weight * 2.5  # Rough estimate
-            eco_score = 50 + (recyclable * 20) + (repairable * 15)  # Basic scoring
-            eco_score = min(100, max(0, eco_score))  # Clamp between 0-100
-            
-            fallback_result = {
-                "carbon_footprint": round(carbon_footprint, 2),
-                "eco_score": round(eco_score / 100, 2),  # Normalize to 0-1
-                "isEcoFriendly": eco_score >= 60,
-                "status": "fallback",
-                "warning": f"ML model failed: {str(e)}"
-            }
-            
-            logger.warning(f"Using fallback prediction: {fallback_result}")
-            return fallback_result
-            
     except HTTPException:
-        # Re-raise HTTP exceptions
         raise
+    except DeadlineExceededError:
+        raise deadline_exceeded(priority)
     except Exception as e:
-        logger.error(f"Unexpected error in predict endpoint: {str(e)}")
+        logger.error(f"Unexpected error in batch predict endpoint: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(
             status_code=500,
             detail="Internal server error. Please try again later."
         )
 
+async def predict_packed(request, endpoint, max_rows):
+    """Score a packed request body and answer with packed result rows.
+    
+    Rows skip JSON parsing and record encoding, and also the prediction
+    cache and shadow sampling, which work on records. The X-Prediction-Tier
+    response header tells whether the surrogate fast tier answered.
+    """
+    started = time.perf_counter()
+    priority, deadline = request_class(request)
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="ML model is not available. Please try again later.")
+    served = serving
+    fingerprint = request.headers.get(SCHEMA_HEADER)
+    if fingerprint is None:
+        raise HTTPException(status_code=400, detail=f"Packed requests need the {SCHEMA_HEADER} header (see GET /schema)")
+    if fingerprint != served.schema.fingerprint:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Rows follow schema {fingerprint} but the served model expects {served.schema.fingerprint}; "
+                   "fetch GET /schema and re-encode"
+        )
+    try:
+        rows = decode_rows(await request.body(), served.schema)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > max_rows:
+        raise HTTPException(status_code=413, detail=f"Too many rows: {len(rows)} (max {max_rows})")
+    parsed = time.perf_counter()
+    stage_seconds.observe(parsed - started, endpoint, "parse")
+    count_packed_categories(served, rows)
+    
+    tier_reason = "requested" if fast_tier_requested(request, served) else None
+    if tier_reason is None and not admit_inference(
+        served=served, priority=priority, deadline=deadline, records=len(rows)
+    ):
+        tier_reason = "overload"
+    try:
+        if tier_reason is not None:
+            results = pack_predictions(served.predict_surrogate(rows))
+            fast_tier.inc(endpoint, tier_reason, amount=len(rows))
+        elif len(rows) == 1 and endpoint == "predict":
+            # Single rows join the micro-batches of JSON /predict calls
+            results = pack_results([await batcher.submit((served, rows[0]), priority=priority, deadline=deadline)])
+        else:
+            results = await inference_pool.run(
+                predict_packed_rows, served, rows, admitted=1, priority=priority, deadline=deadline
+            )
+    except DeadlineExceededError:
+        raise deadline_exceeded(priority)
+    stage_seconds.observe(time.perf_counter() - parsed, endpoint, "predict")
+    
+    statuses = np.bincount(results[:, RESULT_COLUMNS.index("status")].astype(np.int64), minlength=len(STATUS_CODES))
+    for status, code in STATUS_CODES.items():
+        if statuses[code]:
+            outcomes.inc(endpoint, status, amount=int(statuses[code]))
+    return Response(
+        content=results.tobytes(),
+        media_type=PACKED_CONTENT_TYPE,
+        headers={
+            "X-Model-Version": served.version,
+            SCHEMA_HEADER: served.schema.fingerprint,
+            "X-Prediction-Tier": "full" if tier_reason is None else "fast"
+        }
+    )
+
+@app.get("/schema")
+async def model_schema():
+    """Feature schema of the served model, for callers that send packed rows"""
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="ML model is not available. Please try again later.")
+    served = serving
+    return {
+        **served.schema.to_dict(),
+        "aliases": served.schema.aliases,
+        "fingerprint": served.schema.fingerprint,
+        "model_version": served.version,
+        "packed": describe(served.schema)
+    }
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """Streaming response that leaves the request body to the generator.
+    
+    StreamingResponse normally consumes receive() to watch for disconnects,
+    which would steal the upload that the generator is still reading.
+    Disconnects surface through request.stream() instead.
+    """
+    media_type = "application/x-ndjson"
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def ndjson_lines(request):
+    """Yield (line_number, line) for each non-blank line of the request body.
+    
+    At most one partial line is buffered; a line longer than
+    STREAM_MAX_LINE_BYTES is discarded as it arrives and yielded as None.
+    """
+    buffer = b""
+    skipping = False
+    line_number = 0
+    async for data in request.stream():
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end < 0:
+                break
+            line, buffer = buffer + data[start:end], b""
+            start = end + 1
+            line_number += 1
+            if skipping or len(line) > STREAM_MAX_LINE_BYTES:
+                skipping = False
+                yield line_number, None
+            elif line.strip():
+                yield line_number, line
+        if not skipping:
+            buffer += data[start:]
+            if len(buffer) > STREAM_MAX_LINE_BYTES:
+                skipping = True
+                buffer = b""
+    if skipping:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, buffer
+
+async def admit_when_ready(records, priority=BULK):
+    """Wait for the rate limit and for room in the inference queue instead of failing a running stream"""
+    bucket = rate_limits.get(priority)
+    if bucket is not None:
+        wait = bucket.take(records)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = bucket.take(records)
+    while not inference_pool.try_admit(1, priority):
+        await asyncio.sleep(0.01)
+
+async def score_chunk(served, rows, results, keys, inputs, count, priority=BULK):
+    """Score the encoded rows of one stream chunk and render them as NDJSON"""
+    encoded = time.perf_counter()
+    pending = [i for i in range(count) if results[i] is None]
+    if pending:
+        await admit_when_ready(len(pending), priority)
+        predictions = await inference_pool.run(predict_records, served, rows[pending], admitted=1, priority=priority)
+        for i, result in zip(pending, predictions):
+            if result["status"] == "success":
+                prediction_cache.put(keys[i], result, served.version)
+            results[i] = result
+    offer_to_shadow(inputs[:count], results[:count])
+    predicted = time.perf_counter()
+    stage_seconds.observe(predicted - encoded, "stream", "predict")
+    
+    statuses = {}
+    for result in results[:count]:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    for status, total in statuses.items():
+        outcomes.inc("stream", status, amount=total)
+    body = "".join(json.dumps(result) + "\n" for result in results[:count]).encode("utf-8")
+    stage_seconds.observe(time.perf_counter() - predicted, "stream", "serialize")
+    return body
+
+async def stream_predictions(request, priority=BULK):
+    """Read NDJSON records in chunks and yield NDJSON results as each chunk is scored.
+    
+    The whole stream is scored by the model that was active when it started.
+    """
+    served = serving
+    rows = served.schema.empty(STREAM_CHUNK_SIZE)
+    results = [None] * STREAM_CHUNK_SIZE
+    keys = [None] * STREAM_CHUNK_SIZE
+    inputs = [None] * STREAM_CHUNK_SIZE
+    count = 0
+    total = 0
+    started = time.perf_counter()
+    in_flight.inc("stream")
+    try:
+        chunk_started = time.perf_counter()
+        async for line_number, line in ndjson_lines(request):
+            results[count] = None
+            inputs[count] = None
+            try:
+                if line is None:
+                    raise ValueError(f"Line longer than {STREAM_MAX_LINE_BYTES} bytes")
+                try:
+                    input_data = json.loads(line)
+                except ValueError:
+                    raise ValueError("Invalid JSON")
+                validate_record(input_data)
+                prepare_record(served, input_data, out=rows[count])
+                inputs[count] = input_data
+                keys[count] = row_key(rows[count])
+                results[count] = prediction_cache.get(keys[count], served.version)
+            except ValueError as e:
+                results[count] = {"status": "error", "error": f"Line {line_number}: {str(e)}"}
+            count += 1
+            
+            if count == STREAM_CHUNK_SIZE:
+                stage_seconds.observe(time.perf_counter() - chunk_started, "stream", "features")
+                yield await score_chunk(served, rows, results, keys, inputs, count, priority)
+                total += count
+                count = 0
+                chunk_started = time.perf_counter()
+        
+        if count:
+            stage_seconds.observe(time.perf_counter() - chunk_started, "stream", "features")
+            yield await score_chunk(served, rows, results, keys, inputs, count, priority)
+            total += count
+        logger.debug(f"Streamed {total} predictions")
+    finally:
+        in_flight.dec("stream")
+        request_seconds.observe(time.perf_counter() - started, "stream")
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request):
+    """Score newline-delimited JSON product records as a stream.
+    
+    Records are read and scored STREAM_CHUNK_SIZE at a time with one
+    vectorized call per chunk, and one NDJSON result line per input line is
+    streamed back in order. Only one chunk is held in memory, and the upload
+    is read no faster than results are consumed. Results start before the
+    upload ends, so clients sending large files must read the response while
+    they send (as curl does). Streams are bulk work unless they ask for
+    ?priority=interactive; they wait for queue room instead of failing and
+    X-Request-Timeout-Ms does not apply to them.
+    """
+    priority, _ = request_class(request, default=BULK)
+    if not model_ready():
+        logger.error("Model not loaded")
+        raise HTTPException(
+            status_code=503, 
+            detail="ML model is not available. Please try again later."
+        )
+    return NDJSONStreamingResponse(stream_predictions(request, priority))
+
+# Largest number of alternatives returned by /catalogue/{id}/alternatives
+MAX_ALTERNATIVES = 50
+
+def catalogue_stats():
+    if catalogue is None:
+        return None
+    return {
+        "products": len(catalogue),
+        "subcategories": len(catalogue.subcategories),
+        "model_version": catalogue.model_version,
+        "created_at": catalogue.created_at,
+        "stale": serving is not None and catalogue.model_version != serving.version
+    }
+
+def catalogue_entry(index, position):
+    """API shape of an indexed product: its id, name, subcategory and prediction"""
+    product = index.product(position)
+    return {
+        "id": product["id"],
+        "name": product["name"],
+        "subcategory": product["subcategory"],
+        **format_prediction(product["prediction"])
+    }
+
+def find_catalogue_product(product_id):
+    """(index, position) of a catalogue product, or an HTTP error"""
+    index = catalogue
+    if index is None:
+        raise HTTPException(status_code=503, detail="Catalogue index is not available")
+    position = index.position(product_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail=f"Product '{product_id}' is not in the catalogue index")
+    return index, position
+
+@app.get("/catalogue/{product_id}")
+async def catalogue_product(product_id: str):
+    """Precomputed prediction for a catalogue product"""
+    index, position = find_catalogue_product(product_id)
+    return {**catalogue_entry(index, position), "model_version": index.model_version}
+
+@app.get("/catalogue/{product_id}/alternatives")
+async def catalogue_alternatives(product_id: str, k: int = 5):
+    """Up to k greener products in the same subcategory, greenest first.
+    
+    Greener means a higher eco score, or the same eco score with a lower
+    carbon footprint.
+    """
+    if not 1 <= k <= MAX_ALTERNATIVES:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_ALTERNATIVES}")
+    index, position = find_catalogue_product(product_id)
+    return {
+        "product": catalogue_entry(index, position),
+        "alternatives": [catalogue_entry(index, int(i)) for i in index.greener_alternatives(position, k)],
+        "model_version": index.model_version
+    }
+
+def similar_products(index, vector, prediction, k, subcategory_code, criterion):
+    """Catalogue entries of the k nearest greener products, with their distances"""
+    positions, distances = index.similar_greener(vector, prediction, k, subcategory_code, criterion)
+    return [
+        {**catalogue_entry(index, int(position)), "distance": round(float(distance), 4)}
+        for position, distance in zip(positions, distances)
+    ]
+
+def score_and_recommend(served, index, record, index_row, subcategory_code, k, criterion):
+    """Score an encoded record with the served model, then search the catalogue for it"""
+    prediction = run_model(served, [record])[0]
+    vector = index.vectorize(index_row)[0]
+    return format_prediction(prediction), similar_products(index, vector, prediction, k, subcategory_code, criterion)
+
+@app.post("/recommend")
+@instrumented("recommend")
+async def recommend(request: Request):
+    """Up to k catalogue products most similar to a product that are greener.
+
+    The body names a catalogue product ({"product_id": ...}) or carries a
+    product record in the /predict format ({"product": {...}}), with an
+    optional "k" (default 5) and "criterion": "eco_score" for a higher eco
+    score (the default) or "carbon_footprint" for a lower carbon footprint.
+    Similarity is the distance between the products' preprocessed feature
+    vectors; the search stays within the product's subcategory when the
+    catalogue has products in it.
+    """
+    started = time.perf_counter()
+    priority, deadline = request_class(request)
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON data provided")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object")
+    k = body.get("k", 5)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_ALTERNATIVES:
+        raise HTTPException(status_code=400, detail=f"k must be an integer between 1 and {MAX_ALTERNATIVES}")
+    criterion = body.get("criterion", ECO_SCORE)
+    if criterion not in CRITERIA:
+        raise HTTPException(status_code=400, detail=f"criterion must be one of: {', '.join(CRITERIA)}")
+
+    if "product_id" in body:
+        index, position = find_catalogue_product(body["product_id"])
+        admit_inference(priority=priority, deadline=deadline)
+        try:
+            recommendations = await inference_pool.run(
+                similar_products, index, index.vector(position), index.predictions[position], k,
+                int(index.subcategory_codes[position]), criterion,
+                admitted=1, priority=priority, deadline=deadline
+            )
+        except DeadlineExceededError:
+            raise deadline_exceeded(priority)
+        product = catalogue_entry(index, position)
+    elif "product" in body:
+        index = catalogue
+        if index is None:
+            raise HTTPException(status_code=503, detail="Catalogue index is not available")
+        if not model_ready():
+            raise HTTPException(status_code=503, detail="ML model is not available. Please try again later.")
+        # The record is scored by the served model and compared in the index's feature space
+        served = serving
+        input_data = body["product"]
+        try:
+            validate_record(input_data)
+            record = prepare_record(served, input_data)
+            index_row = index.schema.encode(input_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        admit_inference(priority=priority, deadline=deadline)
+        try:
+            product, recommendations = await inference_pool.run(
+                score_and_recommend, served, index, record, index_row,
+                index.subcategory_code(input_data.get("Subcategory")), k, criterion,
+                admitted=1, priority=priority, deadline=deadline
+            )
+        except DeadlineExceededError:
+            raise deadline_exceeded(priority)
+    else:
+        raise HTTPException(status_code=400, detail="Provide a 'product_id' or a 'product' record")
+
+    stage_seconds.observe(time.perf_counter() - started, "recommend", "search")
+    outcomes.inc("recommend", "success")
+    return serialize({
+        "product": product,
+        "criterion": criterion,
+        "recommendations": recommendations,
+        "model_version": index.model_version
+    }, "recommend")
+
+def require_admin(request):
+    """Reject admin calls without the ML_ADMIN_TOKEN token, or from other hosts when none is set"""
+    if ADMIN_TOKEN:
+        if hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+            return
+    elif request.client is not None and request.client.host in ("127.0.0.1", "::1", "localhost"):
+        return
+    raise HTTPException(status_code=403, detail="Admin access denied")
+
+async def admin_options(request):
+    """JSON object body of an admin call; an empty body means no options"""
+    body = await request.body()
+    if not body.strip():
+        return {}
+    try:
+        options = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON data provided")
+    if not isinstance(options, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    return options
+
+def model_load_error(e):
+    """HTTP error for a model that could not be loaded"""
+    if isinstance(e, FileNotFoundError):
+        return HTTPException(status_code=404, detail=f"Model file not found: {str(e)}")
+    if isinstance(e, SchemaError):
+        return HTTPException(status_code=409, detail=f"Refusing to load model: {str(e)}")
+    return HTTPException(status_code=500, detail=f"Could not load model: {str(e)}")
+
+@app.post("/admin/reload")
+async def admin_reload(request: Request):
+    """Hot-reload the model without dropping requests.
+    
+    Loads eco_model.pkl (or the artifact directory given as {"artifact":
+    "model_artifacts/<run>"}) in the background, warms it up, then switches
+    new requests to it. On failure the current model keeps serving. With
+    several workers (serve.py) each worker reloads on its own, so use
+    ML_MODEL_WATCH_SECONDS to have all of them pick up a published model.
+    """
+    require_admin(request)
+    options = await admin_options(request)
+    try:
+        return await reload_model(options.get("artifact"))
+    except Exception as e:
+        raise model_load_error(e)
+
+@app.get("/admin/shadow")
+async def admin_shadow_stats(request: Request):
+    """Divergence between the shadow model and the active model"""
+    require_admin(request)
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="No shadow model is running")
+    return {"model_version": serving.version if serving is not None else None, **shadow.stats()}
+
+@app.post("/admin/shadow")
+async def admin_start_shadow(request: Request):
+    """Shadow-score a sample of traffic with a candidate artifact.
+    
+    Body: {"artifact": "model_artifacts/<run>", "sample_rate": 0.05}. Sampled
+    records are scored by the candidate on its own thread after the response
+    is computed; clients always get the active model's results. Replaces
+    any running shadow model.
+    """
+    require_admin(request)
+    options = await admin_options(request)
+    artifact = options.get("artifact")
+    if not isinstance(artifact, str):
+        raise HTTPException(status_code=400, detail="'artifact' must be an artifact directory")
+    try:
+        sample_rate = float(options.get("sample_rate", SHADOW_SAMPLE_RATE))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'sample_rate' must be a number")
+    try:
+        scorer = await asyncio.get_running_loop().run_in_executor(
+            loader_executor, start_shadow, artifact, sample_rate
+        )
+    except Exception as e:
+        raise model_load_error(e)
+    return scorer.stats()
+
+@app.delete("/admin/shadow")
+async def admin_stop_shadow(request: Request):
+    """Stop shadow scoring and return the final divergence statistics"""
+    require_admin(request)
+    previous = stop_shadow()
+    if previous is None:
+        raise HTTPException(status_code=404, detail="No shadow model is running")
+    return previous.stats()
+
+@app.post("/admin/catalogue/reload")
+async def admin_reload_catalogue(request: Request):
+    """Memory-map a rebuilt catalogue index"""
+    require_admin(request)
+    if not load_catalogue():
+        raise HTTPException(status_code=404, detail=f"No valid catalogue index at '{CATALOGUE_INDEX_PATH}'")
+    return catalogue_stats()
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
@@ -0,0 +1,209 @@
+"""
+Model loading for the ML server.
+A ServingModel bundles one model version: the memory-mapped compiled arrays
+(or the unpickled pipeline), its feature schema, the surrogate distilled
+from it if one was shipped, and the fingerprint of the model file. The
+server keeps the active ServingModel in a single reference, so a reload
+builds and warms up a complete new bundle in the background and switches
+over with one assignment, while requests already running finish on the
+bundle they started with.
+"""
+
+import logging
+import os
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+
+from fast_model import CompiledForest, arrays_version, file_fingerprint, forest_mean
+from feature_schema import SCHEMA_PATH, FeatureSchema
+from surrogate import SURROGATE_PATH, Surrogate
+
+logger = logging.getLogger(__name__)
+
+MODEL_PATH = "eco_model.pkl"
+
+# Memory-mappable arrays exported by retrain_model.py / fast_model.py
+ARRAYS_PATH = "eco_model_arrays"
+
+
+class ServingModel:
+    """One loaded model version and the schema its input rows are encoded with"""
+
+    def __init__(self, version, schema, pipeline=None, compiled=None, source=MODEL_PATH, surrogate=None):
+        if pipeline is None and compiled is None:
+            raise ValueError("A serving model needs a pipeline or compiled arrays")
+        self.version = version
+        self.schema = schema
+        self.pipeline = pipeline
+        self.compiled = compiled
+        self.source = source
+        self.surrogate = surrogate
+
+    @property
+    def memory_mapped(self):
+        return self.compiled is not None and isinstance(self.compiled.value, np.memmap)
+
+    def predict(self, rows):
+        """Raw prediction rows for a matrix of encoded rows"""
+        if self.compiled is not None:
+            return self.compiled.predict_encoded(rows)
+        return self.pipeline.predict(self.schema.decode(rows))
+
+    @property
+    def supports_uncertainty(self):
+        """Whether per-tree predictions are available (random forests only)"""
+        if self.compiled is not None:
+            return True
+        return isinstance(self.pipeline.steps[-1][1], (RandomForestRegressor, ExtraTreesRegressor))
+
+    def predict_per_tree(self, rows):
+        """(prediction rows, per-tree predictions shaped (trees, rows, outputs)).
+
+        One pass over the forest gives both; the prediction rows equal
+        predict(rows). Raises ValueError if the model is not a forest.
+        """
+        if self.compiled is not None:
+            return self.compiled.predict_encoded_per_tree(rows)
+        if not self.supports_uncertainty:
+            raise ValueError("Per-tree predictions need a random forest model")
+        forest = self.pipeline.steps[-1][1]
+        X = self.pipeline[:-1].transform(self.schema.decode(rows))
+        per_tree = np.stack([tree.predict(X) for tree in forest.estimators_]).reshape(
+            len(forest.estimators_), len(rows), -1
+        )
+        return forest_mean(per_tree), per_tree
+
+    def predict_surrogate(self, rows):
+        """Surrogate prediction rows for a matrix of encoded rows.
+
+        Raises ValueError if no surrogate was shipped with the model.
+        """
+        if self.surrogate is None:
+            raise ValueError("No surrogate was shipped with this model")
+        return self.surrogate.predict_encoded(rows)
+
+    def warm_up(self):
+        """Score the schema's default row once, paging in the arrays"""
+        return self.predict(self.schema.template[np.newaxis, :])
+
+
+def per_tree_spread(per_tree, interval=0.9):
+    """(std, lower, upper) over the trees for each row and output.
+
+    lower and upper bound the central `interval` share of the per-tree
+    predictions.
+    """
+    tail = (1 - interval) / 2
+    lower, upper = np.quantile(per_tree, [tail, 1 - tail], axis=0)
+    return per_tree.std(axis=0), lower, upper
+
+
+def artifact_paths(directory):
+    """Model, arrays, schema and surrogate paths inside a retrain_model.py artifact directory"""
+    return (
+        os.path.join(directory, MODEL_PATH),
+        os.path.join(directory, ARRAYS_PATH),
+        os.path.join(directory, SCHEMA_PATH),
+        os.path.join(directory, SURROGATE_PATH)
+    )
+
+
+def load_serving_model(model_path=MODEL_PATH, arrays_path=ARRAYS_PATH, schema_path=SCHEMA_PATH,
+                       surrogate_path=SURROGATE_PATH, fast_inference=True):
+    """Load a model file with its arrays, schema and surrogate.
+
+    Raises FileNotFoundError when the model file is missing and SchemaError
+    when the schema saved for the model does not match it.
+    """
+    version = file_fingerprint(model_path)
+    compiled = load_compiled_arrays(version, arrays_path, model_path) if fast_inference else None
+    pipeline = None
+    if compiled is None:
+        pipeline = joblib.load(model_path)
+        compiled = compile_model(pipeline, version) if fast_inference else None
+
+    if compiled is not None:
+        schema = load_feature_schema(FeatureSchema.from_compiled(compiled), schema_path)
+    else:
+        schema = load_feature_schema(FeatureSchema.from_pipeline(pipeline, version), schema_path)
+    surrogate = load_surrogate(version, schema, surrogate_path)
+    return ServingModel(version, schema, pipeline=pipeline, compiled=compiled, source=model_path,
+                        surrogate=surrogate)
+
+
+def load_compiled_arrays(version, arrays_path=ARRAYS_PATH, model_path=MODEL_PATH):
+    """Memory-map the exported arrays if they match the model file"""
+    if not os.path.isdir(arrays_path):
+        logger.info(f"No '{arrays_path}' directory, unpickling {model_path}")
+        return None
+    if arrays_version(arrays_path) != version:
+        logger.warning(
+            f"'{arrays_path}' was exported from a different {model_path}; "
+            "run 'python fast_model.py' to refresh it"
+        )
+        return None
+    try:
+        compiled = CompiledForest.load(arrays_path)
+    except Exception as e:
+        logger.warning(f"Could not load '{arrays_path}': {str(e)}")
+        return None
+    logger.info(f"Memory-mapped {len(compiled.roots)} trees from '{arrays_path}'")
+    return compiled
+
+
+def load_surrogate(version, schema, surrogate_path=SURROGATE_PATH):
+    """Load the surrogate if it was distilled from this model version.
+
+    A missing, stale or unreadable surrogate is not an error: the model is
+    served without one.
+    """
+    if not os.path.exists(surrogate_path):
+        logger.info(f"No '{surrogate_path}' found, serving without a surrogate")
+        return None
+    try:
+        surrogate = Surrogate.load(surrogate_path)
+    except Exception as e:
+        logger.warning(f"Could not load '{surrogate_path}': {str(e)}")
+        return None
+    if surrogate.source_version != version or surrogate.columns != schema.columns:
+        logger.warning(f"'{surrogate_path}' was distilled from a different model, serving without it")
+        return None
+    logger.info(f"Surrogate loaded (distilled from {version})")
+    return surrogate
+
+
+def load_feature_schema(expected, schema_path=SCHEMA_PATH):
+    """Load the saved feature schema and check it against the model.
+
+    expected is the schema derived from the loaded model and is used as is
+    when there is no schema file, or when the file was saved for another
+    model version (retrain_model.publish() swaps it in before the model
+    file). Raises SchemaError if a schema saved for this model does not
+    match.
+    """
+    if not os.path.exists(schema_path):
+        logger.warning(f"No '{schema_path}' found, deriving the feature schema from the model")
+        return expected
+    schema = FeatureSchema.load(schema_path)
+    if schema.source_version is not None and schema.source_version != expected.source_version:
+        logger.warning(
+            f"'{schema_path}' was saved for model {schema.source_version}, "
+            "deriving the feature schema from the model"
+        )
+        return expected
+    schema.check_matches(expected)
+    logger.info(f"Feature schema loaded ({schema.width} columns)")
+    return schema
+
+
+def compile_model(pipeline, version=None):
+    """Compile the pipeline for fast inference, or return None if unsupported"""
+    try:
+        compiled = CompiledForest.from_pipeline(pipeline, source_version=version)
+        logger.info(f"Model compiled for fast inference ({len(compiled.roots)} trees)")
+        return compiled
+    except Exception as e:
+        logger.warning(f"Fast inference unavailable, using scikit-learn predict: {str(e)}")
+        return None
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Model Size / Latency Sweep
+Trains candidate eco models on the retraining split and records, for each:
+MAE and R² per target on the held-out 20% (the modeltest.py evaluation),
+pickle and array size, and single-row and batch latency through the engine
+the ML server would use (the compiled NumPy forest for random forests, the
+scikit-learn pipeline for gradient boosting).
+
+Candidates are random forests over a grid of tree count, max depth and
+min-samples-leaf, plus histogram gradient boosting. A candidate is
+Pareto-optimal when no other one is at least as accurate, small and fast.
+The fastest Pareto-optimal candidate whose MAE stays within
+--max-mae-increase of the default forest is exported as a versioned
+artifact, and published for the server with --publish.
+
+Usage:
+    python model_sweep.py
+    python model_sweep.py --trees 10 25 50 --depths 8 12 none --leaves 1 3 --output sweep.json
+    python model_sweep.py --trees 10 25 --hgb-iterations   # forests only
+    python model_sweep.py --max-mae-increase 0.02 --publish
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.multioutput import MultiOutputRegressor
+
+from fast_model import CompiledForest
+from feature_schema import FeatureSchema
+from features import MATERIAL_PREFIX, NUMERIC_FEATURES, TARGETS
+from retrain_model import (
+    DEFAULT_DATASET, build_model, evaluate, fit_surrogate, load_features, publish, save_artifact
+)
+
+# The forest retrain_model.py trains by default; accuracy loss is measured against it
+BASELINE = {"n_estimators": 100, "max_depth": None, "min_samples_leaf": 1}
+
+
+def _depth(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def candidates(args):
+    """(name, kind, params, unfitted regressor) for every configuration to try"""
+    grid = set(itertools.product(args.trees, args.depths, args.leaves))
+    grid.add(tuple(BASELINE.values()))
+    for trees, depth, leaf in sorted(grid, key=lambda c: (c[0], c[1] or 0, c[2])):
+        params = {"n_estimators": trees, "max_depth": depth, "min_samples_leaf": leaf}
+        yield (f"rf-{trees}-d{depth or 'full'}-l{leaf}", "random_forest", params,
+               RandomForestRegressor(**params, random_state=args.random_state, n_jobs=-1))
+    for iterations, leaves in itertools.product(args.hgb_iterations, args.hgb_leaves):
+        params = {"max_iter": iterations, "max_leaf_nodes": leaves}
+        # One booster per target; HistGradientBoostingRegressor is single-output
+        yield (f"hgb-{iterations}-n{leaves}", "gradient_boosting", params,
+               MultiOutputRegressor(HistGradientBoostingRegressor(**params, random_state=args.random_state),
+                                    n_jobs=-1))
+
+
+def _per_call_ms(fn, repeats):
+    """Median wall time of fn() in milliseconds"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return float(np.median(times) * 1000)
+
+
+def measure_latency(model, rows, repeats, batch_size):
+    """Single-row and batch latency through the serving engine, in ms"""
+    try:
+        compiled = CompiledForest.from_pipeline(model)
+        schema = FeatureSchema.from_compiled(compiled)
+        engine, predict = "compiled", compiled.predict_encoded
+    except ValueError:
+        schema = FeatureSchema.from_pipeline(model)
+        # Same path as the server without compiled arrays: decode, then pipeline.predict
+        engine, predict = "pipeline", lambda encoded: model.predict(schema.decode(encoded))
+    encoded = np.vstack([schema.encode(record) for record in rows])
+    singles = itertools.cycle(encoded[i:i + 1] for i in range(len(encoded)))
+    batch = np.resize(encoded, (batch_size, encoded.shape[1]))
+    predict(encoded[:1])
+    return {
+        "engine": engine,
+        "single_ms": _per_call_ms(lambda: predict(next(singles)), repeats),
+        "batch_ms": _per_call_ms(lambda: predict(batch), max(3, repeats // 20))
+    }
+
+
+def artifact_size_mb(model, path):
+    """Pickle size and, for compilable forests, the exported array size"""
+    joblib.dump(model, path)
+    sizes = {"pickle_mb": os.path.getsize(path) / (1024 * 1024), "arrays_mb": None}
+    try:
+        compiled = CompiledForest.from_pipeline(model)
+    except ValueError:
+        return sizes
+    arrays = tempfile.mkdtemp(dir=os.path.dirname(path))
+    compiled.save(os.path.join(arrays, "arrays"))
+    sizes["arrays_mb"] = sum(
+        entry.stat().st_size for entry in os.scandir(os.path.join(arrays, "arrays"))
+    ) / (1024 * 1024)
+    shutil.rmtree(arrays)
+    return sizes
+
+
+def mae_increase(metrics, baseline):
+    """Worst relative MAE increase over the targets compared to the baseline"""
+    return max(metrics[target]["mae"] / baseline[target]["mae"] - 1 for target in TARGETS)
+
+
+def pareto_front(results):
+    """Names of results not dominated on (MAE increase, single-row latency, pickle size)"""
+    def objectives(result):
+        return (result["mae_increase"], result["single_ms"], result["pickle_mb"])
+
+    front = []
+    for result in results:
+        mine = objectives(result)
+        dominated = any(
+            all(o <= m for o, m in zip(objectives(other), mine)) and objectives(other) != mine
+            for other in results
+        )
+        if not dominated:
+            front.append(result["name"])
+    return front
+
+
+def print_table(results, front):
+    print(f"\n{'candidate':<22} {'CF MAE':>8} {'CF R²':>6} {'Eco MAE':>8} {'Eco R²':>7} "
+          f"{'ΔMAE':>7} {'pickle':>9} {'1-row':>9} {'batch':>9} {'fit':>7}")
+    for r in results:
+        cf, eco = (r["metrics"][target] for target in TARGETS)
+        marker = " *" if r["name"] in front else ""
+        print(f"{r['name']:<22} {cf['mae']:>8.2f} {cf['r2']:>6.3f} {eco['mae']:>8.3f} {eco['r2']:>7.3f} "
+              f"{r['mae_increase']:>+7.1%} {r['pickle_mb']:>7.2f}MB {r['single_ms']:>7.3f}ms "
+              f"{r['batch_ms']:>7.2f}ms {r['fit_seconds']:>6.1f}s{marker}")
+    print("* Pareto-optimal (MAE increase, single-row latency, pickle size)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep eco model size against accuracy and latency")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--trees", type=int, nargs="+", default=[10, 25, 50, 100])
+    parser.add_argument("--depths", type=_depth, nargs="+", default=[8, 12, 16, None],
+                        help="max depths to try; 'none' grows full trees")
+    parser.add_argument("--leaves", type=int, nargs="+", default=[1, 3], help="min samples per leaf")
+    parser.add_argument("--hgb-iterations", type=int, nargs="*", default=[100, 300],
+                        help="gradient boosting rounds to try; give the flag no values to skip it")
+    parser.add_argument("--hgb-leaves", type=int, nargs="+", default=[15, 31])
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--repeats", type=int, default=300, help="timed single-row predictions per candidate")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-mae-increase", type=float, default=0.05,
+                        help="accuracy budget for the exported model, relative to the default forest")
+    parser.add_argument("--output", help="write every candidate's results to this JSON file")
+    parser.add_argument("--no-export", action="store_true", help="only report, do not write an artifact")
+    parser.add_argument("--publish", action="store_true", help="publish the exported model as eco_model.pkl")
+    args = parser.parse_args()
+
+    print("🔧 Model Size / Latency Sweep")
+    print("=" * 40)
+    X, y, materials, digest, _ = load_features(args.dataset)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, random_state=args.random_state
+    )
+    numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in materials]
+    records = X_test.astype(object).where(X_test.notna(), None).to_dict("records")
+
+    workdir = tempfile.mkdtemp(prefix="model_sweep-")
+    results = []
+    try:
+        for name, kind, params, regressor in candidates(args):
+            model = build_model(numeric_features, regressor)
+            started = time.perf_counter()
+            model.fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - started
+            # Predict single-threaded, as the saved serving model does
+            model.set_params(regressor__n_jobs=None)
+
+            path = os.path.join(workdir, f"{name}.pkl")
+            result = {
+                "name": name,
+                "kind": kind,
+                "params": params,
+                "metrics": evaluate(model, X_test, y_test),
+                "fit_seconds": fit_seconds,
+                "path": path,
+                **artifact_size_mb(model, path),
+                **measure_latency(model, records, args.repeats, args.batch_size)
+            }
+            results.append(result)
+            print(f"   {name}: eco MAE {result['metrics'][TARGETS[1]]['mae']:.3f}, "
+                  f"{result['pickle_mb']:.2f} MB, {result['single_ms']:.3f} ms/row")
+
+        baseline = next(
+            r for r in results if r["kind"] == "random_forest" and r["params"] == BASELINE
+        )
+        for result in results:
+            result["mae_increase"] = mae_increase(result["metrics"], baseline["metrics"])
+            result["speedup"] = baseline["single_ms"] / result["single_ms"]
+        front = pareto_front(results)
+        print_table(results, front)
+
+        eligible = [
+            r for r in results if r["name"] in front and r["mae_increase"] <= args.max_mae_increase
+        ]
+        chosen = min(eligible, key=lambda r: (r["single_ms"], r["pickle_mb"], r["mae_increase"]))
+        print(f"\n🏁 Selected {chosen['name']}: {chosen['speedup']:.1f}× faster single-row, "
+              f"{baseline['pickle_mb'] / chosen['pickle_mb']:.1f}× smaller, "
+              f"MAE {chosen['mae_increase']:+.1%} vs {baseline['name']}")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({
+                    "dataset_hash": digest,
+                    "baseline": baseline["name"],
+                    "pareto_front": front,
+                    "selected": chosen["name"],
+                    "candidates": [{k: v for k, v in r.items() if k != "path"} for r in results]
+                }, f, indent=2)
+            print(f"   Results written to {args.output}")
+
+        if args.no_export:
+            return
+        model = joblib.load(chosen["path"])
+        surrogate = fit_surrogate(model, X_train, X_test, y_test)
+        directory, version = save_artifact(model, {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "dataset": os.path.abspath(args.dataset),
+            "dataset_hash": digest,
+            "rows": {"train": len(X_train), "test": len(X_test)},
+            "materials": materials,
+            "kind": chosen["kind"],
+            "hyperparameters": {**chosen["params"], "random_state": args.random_state,
+                                "test_size": args.test_size},
+            "metrics": chosen["metrics"],
+            "surrogate_metrics": surrogate.metrics,
+            "sweep": {k: chosen[k] for k in ("mae_increase", "speedup", "pickle_mb", "single_ms", "batch_ms")}
+        }, surrogate=surrogate)
+        print(f"   Exported {directory}/")
+        if args.publish:
+            publish(directory)
+            print(f"✅ Published {chosen['name']} as eco_model.pkl ({version})")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
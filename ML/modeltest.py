@@ -1,49 +1,21 @@
 import pandas as pd
 import joblib
-import re
-from collections import defaultdict
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import numpy as np
 
+from features import CATEGORICAL_FEATURES, MATERIAL_PREFIX, NUMERIC_FEATURES, TARGETS, prepare_dataset
+
 # Load dataset
 df = pd.read_csv("realistic_eco_dataset_1000.csv")
 
-# Extract materials
-def extract_material_percentages(material_string):
-    material_dict = defaultdict(float)
-    for part in str(material_string).split(","):
-        match = re.match(r"([\w\s]+)\s+(\d+\.?\d*)%", part.strip())
-        if match:
-            material = match.group(1).strip()
-            percent = float(match.group(2))
-            material_dict[material] += percent
-    return material_dict
-
-# Top 10 materials
-all_materials = []
-for row in df["Material Composition"]:
-    all_materials.extend(extract_material_percentages(row).keys())
-
-top_materials = pd.Series(all_materials).value_counts().nlargest(10).index.tolist()
-
-# Add material features
-for mat in top_materials:
-    df[f"Material_{mat}"] = df["Material Composition"].apply(
-        lambda x: extract_material_percentages(x).get(mat, 0)
-    )
-
-# Convert to numeric
-df["Recyclable"] = df["Recyclable"].map({"Yes": 1, "No": 0})
-df["Repairable"] = df["Repairable"].map({"Yes": 1, "No": 0})
+# Top 10 materials as Material_* columns, plus numeric Yes/No flags
+df, top_materials = prepare_dataset(df)
 
 # Features & targets
-features = [
-    "Weight (kg)", "Distance (km)", "Recyclable", "Repairable", "Lifespan (yrs)",
-    "Packaging Used", "Category", "Subcategory"
-] + [f"Material_{m}" for m in top_materials]
+features = NUMERIC_FEATURES + CATEGORICAL_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in top_materials]
 
-target = ["Carbon Footprint (kg CO2e)", "Eco Score"]
+target = TARGETS
 
 X = df[features]
 y = df[target]
@@ -0,0 +1,94 @@
+"""
+Packed binary protocol for the ML server.
+Internal callers can skip JSON entirely: they encode records themselves
+following GET /schema (columns in order, categories as integer codes, -1 for
+an unknown category, NaN for a missing number) and POST the rows as
+little-endian float64 values, row after row. The request body becomes a
+NumPy matrix without parsing, and results come back the same way, one row
+of RESULT_COLUMNS per input row.
+
+Rows are only meaningful for the schema they were encoded with, so every
+packed request names the schema fingerprint it used and is refused when
+the served model's schema differs.
+"""
+
+import numpy as np
+
+from feature_schema import UNKNOWN_CODE
+from features import ECO_FRIENDLY_SCORE
+
+PACKED_CONTENT_TYPE = "application/x-eco-rows"
+
+# Header carrying FeatureSchema.fingerprint of the schema the rows follow
+SCHEMA_HEADER = "X-Schema-Fingerprint"
+
+# Little-endian float64, for request and response rows alike
+ROW_DTYPE = np.dtype("<f8")
+
+# Columns of each response row
+RESULT_COLUMNS = ["carbon_footprint", "eco_score", "isEcoFriendly", "status"]
+
+# Values of the status column; error rows carry NaN in the other columns
+STATUS_CODES = {"success": 0, "fallback": 1, "error": 2}
+
+
+def is_packed(content_type):
+    """Whether a Content-Type header selects the packed protocol"""
+    return (content_type or "").split(";")[0].strip().lower() == PACKED_CONTENT_TYPE
+
+
+def describe(schema):
+    """Layout of packed requests and responses for schema, as served by /schema"""
+    return {
+        "content_type": PACKED_CONTENT_TYPE,
+        "dtype": ROW_DTYPE.str,
+        "row_bytes": schema.width * ROW_DTYPE.itemsize,
+        "fingerprint_header": SCHEMA_HEADER,
+        "unknown_code": UNKNOWN_CODE,
+        "result_columns": RESULT_COLUMNS,
+        "status_codes": STATUS_CODES
+    }
+
+
+def decode_rows(body, schema):
+    """Matrix of encoded rows from a packed request body.
+
+    Raises ValueError if the body is not a whole number of rows or holds a
+    category code outside the schema's vocabularies.
+    """
+    row_bytes = schema.width * ROW_DTYPE.itemsize
+    if not body or len(body) % row_bytes:
+        raise ValueError(f"Body must be a non-empty multiple of {row_bytes} bytes ({schema.width} float64 values per row)")
+    rows = np.frombuffer(body, dtype=ROW_DTYPE).reshape(-1, schema.width)
+    for i in schema.categorical_positions:
+        codes = rows[:, i]
+        size = len(schema.categories[schema.columns[i]])
+        valid = (codes == np.floor(codes)) & (codes >= UNKNOWN_CODE) & (codes < size)
+        if not valid.all():
+            bad = int(np.argmin(valid))
+            raise ValueError(f"Row {bad}: invalid code {float(codes[bad])!r} for '{schema.columns[i]}'")
+    return rows
+
+
+def pack_predictions(predictions):
+    """Result rows for raw model output rows, formatted like format_prediction"""
+    predictions = np.asarray(predictions, dtype=np.float64)
+    results = np.empty((len(predictions), len(RESULT_COLUMNS)), dtype=ROW_DTYPE)
+    results[:, 0] = np.round(predictions[:, 0], 2)
+    results[:, 1] = np.round(predictions[:, 1], 2)
+    if predictions.shape[1] > 2:
+        results[:, 2] = predictions[:, 2] != 0
+    else:
+        results[:, 2] = results[:, 1] >= ECO_FRIENDLY_SCORE
+    results[:, 3] = STATUS_CODES["success"]
+    return results
+
+
+def pack_results(results):
+    """Result rows for API result dicts (success, fallback or error)"""
+    packed = np.full((len(results), len(RESULT_COLUMNS)), np.nan, dtype=ROW_DTYPE)
+    for i, result in enumerate(results):
+        packed[i, 3] = STATUS_CODES[result["status"]]
+        if result["status"] != "error":
+            packed[i, :3] = result["carbon_footprint"], result["eco_score"], result["isEcoFriendly"]
+    return packed
@@ -0,0 +1,157 @@
+"""
+Prediction result cache for the ML server.
+Results are keyed on a hash of the encoded model input row, so the same
+product payload is only scored by the forest once per model version.
+SingleFlight covers the moment before a result is cached: concurrent
+requests for the same row share the one computation already running.
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def row_key(row):
+    """Hash an encoded model input row (see feature_schema.FeatureSchema.encode)"""
+    return hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a per-entry time-to-live"""
+
+    def __init__(self, max_size=10000, ttl_seconds=3600.0):
+        self.max_size = max(0, int(max_size))
+        self.ttl = float(ttl_seconds)
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def set_model_version(self, version):
+        """Drop every cached result if a different model was loaded"""
+        with self._lock:
+            if version != self.model_version:
+                self._entries.clear()
+                self.model_version = version
+
+    def get(self, key, model_version=None):
+        """Return a copy of the cached result for key, or None.
+
+        A key encoded for a model version other than the current one misses,
+        so requests that straddle a model reload never mix versions.
+        """
+        if key is None or not self.enabled:
+            return None
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, stored_at = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key, result, model_version=None):
+        """Store a result, evicting the least recently used entries.
+
+        Results computed by a model version that is no longer current are dropped.
+        """
+        if key is None or not self.enabled:
+            return
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                return
+            self._entries[key] = (dict(result), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit/miss counters and occupancy for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "model_version": self.model_version,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+class SingleFlight:
+    """Share one in-flight computation among concurrent callers with the same key.
+
+    Used from the event loop only. The computation runs as its own task, so
+    a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.started = 0
+        self.joined = 0
+
+    def get(self, key):
+        """The task computing key, or None when nothing is in flight"""
+        return self._flights.get(key)
+
+    async def run(self, key, coroutine):
+        """Run coroutine as the flight for key and return its result.
+
+        The caller must have checked get(key) first; while the flight runs,
+        others join it with join().
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._flights[key] = task
+        self.started += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def join(self, task):
+        """Wait for an in-flight task and return a copy of its result"""
+        self.joined += 1
+        return dict(await asyncio.shield(task))
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Retrieved here so a flight every caller abandoned does not log an unhandled error
+            task.exception()
+
+    def __len__(self):
+        return len(self._flights)
+
+    def stats(self):
+        return {"in_flight": len(self._flights), "started": self.started, "joined": self.joined}
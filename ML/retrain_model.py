@@ -1,112 +1,383 @@
-import pandas as pd
+#!/usr/bin/env python3
+"""
+Eco Model Retraining
+Trains the eco model pipeline (StandardScaler/OneHotEncoder + RandomForestRegressor)
+on a dataset in the realistic_eco_dataset_1000.csv format.
+
+The parsed feature matrix is cached under .feature_cache/, keyed by a hash of
+the dataset file, so reruns on the same data skip the CSV and material
+parsing. Trees are fitted on all cores. Every run writes a versioned
+artifact directory under model_artifacts/ (model, inference arrays, feature
+schema, surrogate and metrics.json); the new model is then published as
+eco_model.pkl / eco_model_arrays / eco_model_schema.json / eco_surrogate.json
+for the ML server. The surrogate is a linear model distilled from the forest
+(see surrogate.py) that the server falls back on and serves as a fast tier.
+
+Usage:
+    python retrain_model.py
+    python retrain_model.py --n-estimators 200 --min-samples-leaf 2 --no-publish
+    python retrain_model.py --benchmark-rows 1000000
+
+For a few hundred new products, incremental_retrain.py adds trees to the
+previous artifact instead of refitting all of them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
 import joblib
-import re
-from collections import defaultdict
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+import numpy as np
+import pandas as pd
 from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
-import numpy as np
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 
-# Load dataset
-print("Loading dataset...")
-df = pd.read_csv("realistic_eco_dataset_1000.csv")
-
-# Extract materials
-def extract_material_percentages(material_string):
-    material_dict = defaultdict(float)
-    for part in str(material_string).split(","):
-        match = re.match(r"([\w\s]+)\s+(\d+\.?\d*)%", part.strip())
-        if match:
-            material = match.group(1).strip()
-            percent = float(match.group(2))
-            material_dict[material] += percent
-    return material_dict
-
-# Top 10 materials
-print("Processing materials...")
-all_materials = []
-for row in df["Material Composition"]:
-    all_materials.extend(extract_material_percentages(row).keys())
-
-top_materials = pd.Series(all_materials).value_counts().nlargest(10).index.tolist()
-
-# Add material features
-for mat in top_materials:
-    df[f"Material_{mat}"] = df["Material Composition"].apply(
-        lambda x: extract_material_percentages(x).get(mat, 0)
+from fast_model import CompiledForest, file_fingerprint
+from feature_schema import SCHEMA_PATH, FeatureSchema
+from features import (
+    CATEGORICAL_FEATURES, MATERIAL_PREFIX, NUMERIC_FEATURES, TARGETS, TOP_MATERIALS, prepare_dataset
+)
+from surrogate import SURROGATE_PATH, Surrogate
+
+DEFAULT_DATASET = "realistic_eco_dataset_1000.csv"
+
+# Files the ML server loads
+MODEL_PATH = "eco_model.pkl"
+ARRAYS_PATH = "eco_model_arrays"
+
+ARTIFACTS_DIR = "model_artifacts"
+METRICS_FILE = "metrics.json"
+FEATURE_CACHE_DIR = ".feature_cache"
+
+# Bump when prepare_dataset or the cache contents change, so cached feature matrices are rebuilt
+FEATURE_CACHE_VERSION = 2
+
+# Numeric columns scaled when synthesizing a benchmark dataset
+JITTER_COLUMNS = ["Weight (kg)", "Distance (km)"]
+
+
+def dataset_hash(path):
+    """Content hash of a dataset file plus the feature extraction version"""
+    digest = hashlib.sha256(f"features-v{FEATURE_CACHE_VERSION}-top{TOP_MATERIALS}".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def row_hashes(df):
+    """64-bit hash of every raw dataset row, to recognise rows across dataset versions.
+
+    Numbers are hashed as floats, so a row still matches when appended rows
+    turn an integer column of the CSV into a float one.
+    """
+    normalized = df.apply(
+        lambda column: column.astype(np.float64) if pd.api.types.is_numeric_dtype(column) else column
     )
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy()
+
+
+def feature_frames(df, materials=None):
+    """(X, y, materials) for a raw dataset DataFrame"""
+    df, materials = prepare_dataset(df, materials)
+    numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in materials]
+    return df[numeric_features + CATEGORICAL_FEATURES], df[TARGETS], materials
+
+
+def cached_features(key, cache_dir=FEATURE_CACHE_DIR):
+    """Cache entry (X, y, materials, row_hashes and, from incremental runs, held_out) stored under key, or None"""
+    cache_path = os.path.join(cache_dir, f"{key}.pkl")
+    if not os.path.exists(cache_path):
+        return None
+    return joblib.load(cache_path)
 
-# Convert to numeric
-df["Recyclable"] = df["Recyclable"].map({"Yes": 1, "No": 0})
-df["Repairable"] = df["Repairable"].map({"Yes": 1, "No": 0})
 
-# Features & targets
-numeric_features = [
-    "Weight (kg)", "Distance (km)", "Recyclable", "Repairable", "Lifespan (yrs)"
-] + [f"Material_{m}" for m in top_materials]
+def cache_features(key, entry, cache_dir=FEATURE_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{key}.pkl")
+    staging = f"{cache_path}.tmp-{os.getpid()}"
+    joblib.dump(entry, staging)
+    os.replace(staging, cache_path)
 
-categorical_features = ["Category", "Subcategory", "Packaging Used"]
 
-target = ["Carbon Footprint (kg CO2e)", "Eco Score"]
+def load_features(path, cache_dir=FEATURE_CACHE_DIR, use_cache=True):
+    """Feature matrix, targets and material list for a dataset.
 
-X = df[numeric_features + categorical_features]
-y = df[target]
+    Returns (X, y, materials, digest, cache_hit). The prepared matrix is
+    stored in cache_dir under the dataset hash and reused while the file is
+    unchanged.
+    """
+    digest = dataset_hash(path)
+    cached = cached_features(digest, cache_dir) if use_cache else None
+    if cached is not None:
+        return cached["X"], cached["y"], cached["materials"], digest, True
 
-# Split the data
-print("Splitting data...")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    raw = pd.read_csv(path)
+    X, y, materials = feature_frames(raw)
+    if use_cache:
+        cache_features(digest, {"X": X, "y": y, "materials": materials, "row_hashes": row_hashes(raw)}, cache_dir)
+    return X, y, materials, digest, False
 
-# Create preprocessing pipeline
-print("Creating preprocessing pipeline...")
-numeric_transformer = Pipeline(steps=[
-    ('scaler', StandardScaler())
-])
 
-categorical_transformer = Pipeline(steps=[
-    ('onehot', OneHotEncoder(handle_unknown='ignore'))
-])
+def synthesize_dataset(source, rows, seed, path):
+    """Write a rows-long dataset resampled from source, for timing runs.
 
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numeric_transformer, numeric_features),
-        ('cat', categorical_transformer, categorical_features)
+    Rows are drawn with replacement and their weight and distance scaled by
+    up to ±10%, so the forest sees realistic but not duplicated values.
+    """
+    df = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    synthetic = df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+    for column in JITTER_COLUMNS:
+        synthetic[column] = (synthetic[column] * rng.uniform(0.9, 1.1, rows)).round(2)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    synthetic.to_csv(staging, index=False)
+    os.replace(staging, path)
+
+
+def build_model(numeric_features, regressor):
+    """Unfitted pipeline with the standard preprocessing in front of regressor"""
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('num', Pipeline(steps=[('scaler', StandardScaler())]), numeric_features),
+            ('cat', Pipeline(steps=[('onehot', OneHotEncoder(handle_unknown='ignore'))]), CATEGORICAL_FEATURES)
+        ])
+    return Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('regressor', regressor)
     ])
 
-# Create and train model
-print("Training model...")
-model = Pipeline(steps=[
-    ('preprocessor', preprocessor),
-    ('regressor', RandomForestRegressor(n_estimators=100, random_state=42))
-])
 
-model.fit(X_train, y_train)
+def evaluate(model, X_test, y_test):
+    """MAE, MSE and R² per target on the held-out split"""
+    return score_predictions(y_test, model.predict(X_test))
+
+
+def score_predictions(y_true, y_pred):
+    """MAE, MSE and R² per target of prediction rows against y_true"""
+    metrics = {}
+    for i, target in enumerate(TARGETS):
+        metrics[target] = {
+            "mae": float(mean_absolute_error(y_true[target], y_pred[:, i])),
+            "mse": float(mean_squared_error(y_true[target], y_pred[:, i])),
+            "r2": float(r2_score(y_true[target], y_pred[:, i]))
+        }
+    return metrics
+
+
+def fit_surrogate(model, X_train, X_test, y_test):
+    """Distill the fitted model into a Surrogate and score it on the held-out split.
+
+    Its metrics hold the error against the true targets ("test") and
+    against the model's own predictions ("agreement").
+    """
+    surrogate = Surrogate.fit(model, X_train)
+    y_pred = surrogate.predict_encoded(FeatureSchema.from_pipeline(model).encode_frame(X_test))
+    surrogate.metrics = {
+        "test": score_predictions(y_test, y_pred),
+        "agreement": score_predictions(pd.DataFrame(model.predict(X_test), columns=TARGETS), y_pred)
+    }
+    return surrogate
+
+
+def print_metrics(metrics):
+    for (label, digits), target in zip([("🌍 Carbon Footprint", 2), ("🌱 Eco Score", 3)], TARGETS):
+        values = metrics[target]
+        print(f"\n{label}:")
+        print("MAE:", round(values["mae"], digits))
+        print("MSE:", round(values["mse"], digits))
+        print("R² Score:", round(values["r2"], digits))
+
+
+def save_artifact(model, run_info, artifacts_dir=ARTIFACTS_DIR, surrogate=None):
+    """Write model, inference arrays, schema, surrogate and metrics to a new versioned directory.
+
+    The directory is named <UTC timestamp>-<model fingerprint>; returns it
+    with the model version. Regressors CompiledForest cannot compile (such
+    as gradient boosting) get no arrays and are served through the pipeline.
+    The surrogate, if given, is stamped with the model version. If run_info
+    has a "timings" dict, the time spent writing the artifact is added to it
+    as save_seconds before metrics.json is written.
+    """
+    started = time.perf_counter()
+    os.makedirs(artifacts_dir, exist_ok=True)
+    staging = os.path.join(artifacts_dir, f".tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    joblib.dump(model, os.path.join(staging, MODEL_PATH))
+    version = file_fingerprint(os.path.join(staging, MODEL_PATH))
+    try:
+        compiled = CompiledForest.from_pipeline(model, source_version=version)
+        compiled.save(os.path.join(staging, ARRAYS_PATH))
+        schema = FeatureSchema.from_compiled(compiled)
+    except ValueError:
+        schema = FeatureSchema.from_pipeline(model, version)
+    schema.save(os.path.join(staging, SCHEMA_PATH))
+    if surrogate is not None:
+        surrogate.source_version = version
+        surrogate.save(os.path.join(staging, SURROGATE_PATH))
+    if "timings" in run_info:
+        run_info["timings"]["save_seconds"] = time.perf_counter() - started
+    with open(os.path.join(staging, METRICS_FILE), "w") as f:
+        json.dump({"model_version": version, **run_info}, f, indent=2)
+
+    directory = os.path.join(artifacts_dir, f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{version}")
+    os.replace(staging, directory)
+    return directory, version
+
+
+def _copy_atomic(source, destination):
+    staging = f"{destination}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    if os.path.isdir(source):
+        shutil.copytree(source, staging)
+        shutil.rmtree(destination, ignore_errors=True)
+    else:
+        shutil.copyfile(source, staging)
+    os.replace(staging, destination)
+
+
+def publish(directory):
+    """Make an artifact the model the ML server loads.
+
+    Arrays, schema and surrogate are swapped in before the model file.
+    Each records the model version it was exported from and the loader
+    ignores exports that do not match the model file, so a server that
+    starts midway unpickles the old model, derives its schema and serves
+    without a surrogate.
+    """
+    arrays = os.path.join(directory, ARRAYS_PATH)
+    if os.path.isdir(arrays):
+        _copy_atomic(arrays, ARRAYS_PATH)
+    else:
+        shutil.rmtree(ARRAYS_PATH, ignore_errors=True)
+    _copy_atomic(os.path.join(directory, SCHEMA_PATH), SCHEMA_PATH)
+    surrogate = os.path.join(directory, SURROGATE_PATH)
+    if os.path.exists(surrogate):
+        _copy_atomic(surrogate, SURROGATE_PATH)
+    elif os.path.exists(SURROGATE_PATH):
+        os.remove(SURROGATE_PATH)
+    _copy_atomic(os.path.join(directory, MODEL_PATH), MODEL_PATH)
+
+
+def _max_features(value):
+    """'sqrt', 'log2', a fraction such as 0.5, or a whole number of features"""
+    if value in ("sqrt", "log2"):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() and number > 1 else number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the eco model")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=None)
+    parser.add_argument("--min-samples-leaf", type=int, default=1)
+    parser.add_argument("--max-features", type=_max_features, default=1.0,
+                        help="features tried per split: sqrt, log2, a fraction or a count")
+    parser.add_argument("--max-samples", type=float, default=None,
+                        help="fraction of rows bootstrapped per tree (default: all)")
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="cores used to fit trees (-1 = all)")
+    parser.add_argument("--no-cache", action="store_true", help="rebuild the feature matrix")
+    parser.add_argument("--no-publish", action="store_true",
+                        help=f"only write the artifact, leave {MODEL_PATH} unchanged")
+    parser.add_argument("--benchmark-rows", type=int, default=None,
+                        help="train on a synthetic dataset of this many rows resampled from --dataset "
+                             "and report timings (implies --no-publish)")
+    args = parser.parse_args()
+
+    timings = {}
+    dataset = args.dataset
+    if args.benchmark_rows:
+        dataset = os.path.join(FEATURE_CACHE_DIR, f"synthetic_{args.benchmark_rows}_seed{args.random_state}.csv")
+        if not os.path.exists(dataset):
+            print(f"Synthesizing {args.benchmark_rows:,} rows from {args.dataset}...")
+            started = time.perf_counter()
+            synthesize_dataset(args.dataset, args.benchmark_rows, args.random_state, dataset)
+            timings["synthesize_seconds"] = time.perf_counter() - started
+
+    print("Loading dataset and materials...")
+    started = time.perf_counter()
+    X, y, materials, digest, cache_hit = load_features(dataset, use_cache=not args.no_cache)
+    timings["features_seconds"] = time.perf_counter() - started
+    print(f"   {len(X):,} rows, dataset {digest} ({'cached features' if cache_hit else 'parsed'})")
+
+    print("Splitting data...")
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, random_state=args.random_state
+    )
+
+    params = {
+        "n_estimators": args.n_estimators,
+        "max_depth": args.max_depth,
+        "min_samples_leaf": args.min_samples_leaf,
+        "max_features": args.max_features,
+        "max_samples": args.max_samples,
+        "random_state": args.random_state
+    }
+    print(f"Training model on {os.cpu_count()} core(s)..." if args.n_jobs == -1 else
+          f"Training model with n_jobs={args.n_jobs}...")
+    numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in materials]
+    model = build_model(numeric_features, RandomForestRegressor(**params, n_jobs=args.n_jobs))
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    timings["fit_seconds"] = time.perf_counter() - started
+
+    print("Evaluating...")
+    started = time.perf_counter()
+    metrics = evaluate(model, X_test, y_test)
+    timings["evaluate_seconds"] = time.perf_counter() - started
+    print_metrics(metrics)
 
-# Save the model
-print("Saving model...")
-joblib.dump(model, "eco_model.pkl")
+    print("\nDistilling surrogate...")
+    started = time.perf_counter()
+    surrogate = fit_surrogate(model, X_train, X_test, y_test)
+    timings["surrogate_seconds"] = time.perf_counter() - started
+    for target in TARGETS:
+        print(f"   {target}: MAE {surrogate.metrics['test'][target]['mae']:.3f}, "
+              f"{surrogate.metrics['agreement'][target]['mae']:.3f} from the model")
 
-# Predict
-print("Making predictions...")
-y_pred = model.predict(X_test)
+    # Fitting uses every core; the saved model predicts single-threaded so
+    # server and bulk-scoring workers do not oversubscribe the CPUs
+    model.set_params(regressor__n_jobs=None)
 
-# Evaluate
-y_true_cf = y_test["Carbon Footprint (kg CO2e)"]
-y_pred_cf = y_pred[:, 0]
+    print("\nSaving artifact...")
+    directory, version = save_artifact(model, {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "dataset": os.path.abspath(dataset),
+        "dataset_hash": digest,
+        "rows": {"train": len(X_train), "test": len(X_test)},
+        "materials": materials,
+        "hyperparameters": {**params, "test_size": args.test_size},
+        "n_jobs": args.n_jobs,
+        "metrics": metrics,
+        "surrogate_metrics": surrogate.metrics,
+        "timings": timings
+    }, surrogate=surrogate)
+    print(f"   {directory}/")
 
-y_true_eco = y_test["Eco Score"]
-y_pred_eco = y_pred[:, 1]
+    print("\n⏱️ Timings:")
+    for name, seconds in timings.items():
+        print(f"   {name.replace('_seconds', '')}: {seconds:.2f}s")
 
-print("\n🌍 Carbon Footprint:")
-print("MAE:", round(mean_absolute_error(y_true_cf, y_pred_cf), 2))
-print("MSE:", round(mean_squared_error(y_true_cf, y_pred_cf), 2))
-print("R² Score:", round(r2_score(y_true_cf, y_pred_cf), 2))
+    if args.no_publish or args.benchmark_rows:
+        print(f"\n✅ Model trained; {MODEL_PATH} left unchanged")
+        return
+    publish(directory)
+    print(f"\n✅ Model retrained and published as {MODEL_PATH} ({version})")
 
-print("\n🌱 Eco Score:")
-print("MAE:", round(mean_absolute_error(y_true_eco, y_pred_eco), 3))
-print("MSE:", round(mean_squared_error(y_true_eco, y_pred_eco), 3))
-print("R² Score:", round(r2_score(y_true_eco, y_pred_eco), 3))
 
-print("\n✅ Model retrained and saved successfully!") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the ML server.
+Loads the model once in the parent process, then pre-forks worker processes
+that share one listening socket. The compiled forest is memory-mapped before
+the fork, so every worker scores from the same physical pages.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [serve] %(message)s")
+logger = logging.getLogger("serve")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Eco ML Server with pre-forked workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ML_WORKERS", "0")),
+                        help="number of worker processes (default: one per available CPU)")
+    parser.add_argument("--pin-cpus", action="store_true",
+                        default=os.environ.get("ML_PIN_CPUS", "0") == "1",
+                        help="pin each worker to its own CPU core (Linux only)")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds to wait for in-flight requests on shutdown")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    return parser.parse_args()
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def prepare_model():
+    """Load the model in the parent so workers inherit it across fork"""
+    import fast_model
+    import ml_server
+
+    # Make sure the memory-mappable arrays match the pickle before forking
+    if ml_server.FAST_INFERENCE and os.path.exists(ml_server.MODEL_PATH):
+        version = fast_model.file_fingerprint(ml_server.MODEL_PATH)
+        if fast_model.arrays_version(ml_server.ARRAYS_PATH) != version:
+            try:
+                fast_model.export_arrays(ml_server.MODEL_PATH, ml_server.ARRAYS_PATH)
+                logger.info(f"Exported '{ml_server.ARRAYS_PATH}' for shared memory-mapped serving")
+            except Exception as e:
+                logger.warning(f"Could not export inference arrays: {str(e)}")
+
+    if not ml_server.load_model():
+        logger.error("Failed to load model; workers will start without it")
+    return ml_server.app
+
+
+def bind_socket(host, port, backlog):
+    # An explicit IPPROTO_TCP lets asyncio enable TCP_NODELAY on accepted connections;
+    # with proto 0 responses stall on delayed ACKs (~40 ms per request)
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM,
+                         socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index, app, sock, args, cpu):
+    """Body of a forked worker process; never returns"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    logger.info(f"Worker {index} started (pid {os.getpid()}, cpu {cpu if cpu is not None else 'any'})")
+
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+    server = uvicorn.Server(config)
+    exit_code = 0
+    try:
+        server.run(sockets=[sock])
+    except Exception as e:
+        logger.error(f"Worker {index} crashed: {str(e)}")
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+class Supervisor:
+    """Forks the workers, restarts crashed ones and shuts them down gracefully"""
+
+    def __init__(self, app, sock, args):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers = {}
+        self.shutting_down = False
+        cpus = available_cpus()
+        if args.pin_cpus and not hasattr(os, "sched_setaffinity"):
+            logger.warning("CPU pinning is not supported on this platform")
+        self.cpu_for = [
+            cpus[i % len(cpus)] if args.pin_cpus and hasattr(os, "sched_setaffinity") else None
+            for i in range(args.workers)
+        ]
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(index, self.app, self.sock, self.args, self.cpu_for[index])
+        self.workers[pid] = index
+
+    def handle_stop(self, signum, frame):
+        if self.shutting_down:
+            return
+        self.shutting_down = True
+        logger.info(f"Received {signal.Signals(signum).name}, stopping {len(self.workers)} workers")
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Force-kill anything still running after the grace period
+        signal.alarm(max(1, int(self.args.graceful_timeout) + 5))
+
+    def handle_alarm(self, signum, frame):
+        for pid in list(self.workers):
+            logger.warning(f"Worker pid {pid} did not stop in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGALRM, self.handle_alarm)
+        for index in range(self.args.workers):
+            self.spawn(index)
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.workers.pop(pid, None)
+            if index is None or self.shutting_down:
+                continue
+            logger.error(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+            time.sleep(1)
+            self.spawn(index)
+        logger.info("All workers stopped")
+
+
+def main():
+    args = parse_args()
+    if not hasattr(os, "fork"):
+        print("❌ serve.py needs a POSIX system; use 'uvicorn ml_server:app --workers N' instead")
+        sys.exit(1)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if args.workers <= 0:
+        args.workers = len(available_cpus())
+
+    app = prepare_model()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+    Supervisor(app, sock, args).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Shadow scoring for the ML server.
+A candidate model scores a sampled fraction of live traffic on its own
+thread, after the response has been computed with the active model, and
+records how far its predictions diverge. Clients only ever see the active
+model's results, and when the shadow thread falls behind, samples are
+dropped instead of queueing.
+"""
+
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the absolute-difference histogram buckets
+DIFF_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100]
+
+# Response fields compared between the active and the candidate model
+COMPARED_FIELDS = ["carbon_footprint", "eco_score"]
+
+
+class ShadowScorer:
+    """Score sampled requests with a candidate ServingModel and track divergence.
+
+    format_fn turns a raw prediction row into the API response shape, so
+    both models' results are compared exactly as clients would see them.
+    """
+
+    def __init__(self, candidate, format_fn, sample_rate=0.05, max_pending=8):
+        self.candidate = candidate
+        self.format_fn = format_fn
+        self.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+        self.max_pending = max(1, int(max_pending))
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self.pending = 0
+        self.scored = 0
+        self.dropped = 0
+        self.failed = 0
+        self.decision_flips = 0
+        self.abs_diff = {field: Histogram(DIFF_BUCKETS) for field in COMPARED_FIELDS}
+        self._lock = threading.Lock()
+
+    def offer(self, inputs, results):
+        """Sample successful (input record, active result) pairs for shadow scoring.
+
+        Called on the request path; only draws the sample and hands it to
+        the shadow thread.
+        """
+        sampled = [
+            (record, result) for record, result in zip(inputs, results)
+            if result is not None and result.get("status") == "success" and random.random() < self.sample_rate
+        ]
+        if not sampled:
+            return
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.dropped += len(sampled)
+                return
+            self.pending += 1
+        self.executor.submit(self._score, sampled)
+
+    def _score(self, sampled):
+        try:
+            schema = self.candidate.schema
+            rows = schema.empty(len(sampled))
+            for i, (record, _) in enumerate(sampled):
+                schema.encode(record, out=rows[i])
+            predictions = self.candidate.predict(rows)
+            flips = 0
+            for (_, active), prediction in zip(sampled, predictions):
+                shadow = self.format_fn(prediction)
+                for field in COMPARED_FIELDS:
+                    self.abs_diff[field].observe(abs(shadow[field] - active[field]))
+                flips += shadow["isEcoFriendly"] != active["isEcoFriendly"]
+            with self._lock:
+                self.scored += len(sampled)
+                self.decision_flips += flips
+        except Exception as e:
+            logger.warning(f"Shadow model {self.candidate.version} failed: {str(e)}")
+            with self._lock:
+                self.failed += len(sampled)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Sampling counters and per-field divergence for monitoring"""
+        return {
+            "candidate_version": self.candidate.version,
+            "source": self.candidate.source,
+            "sample_rate": self.sample_rate,
+            "scored": self.scored,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self.pending,
+            "decision_flips": self.decision_flips,
+            "flip_rate": round(self.decision_flips / self.scored, 4) if self.scored else 0.0,
+            "abs_diff": {field: histogram.to_dict() for field, histogram in self.abs_diff.items()}
+        }
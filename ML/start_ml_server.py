@@ -4,6 +4,7 @@ ML Server Startup Script
 This script checks dependencies and starts the ML server with proper error handling.
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -48,6 +49,16 @@ def check_model_file():
     
     file_size = os.path.getsize(model_file) / (1024 * 1024)  # Size in MB
     print(f"✅ Model file found ({file_size:.1f} MB)")
+    
+    if os.path.isdir("eco_model_arrays"):
+        print("✅ Memory-mapped inference arrays found")
+    else:
+        print("⚠️  No 'eco_model_arrays' directory; run 'python fast_model.py' for faster startup")
+    
+    if os.path.exists("eco_model_schema.json"):
+        print("✅ Feature schema found")
+    else:
+        print("⚠️  No 'eco_model_schema.json'; the server will derive the schema from the model")
     return True
 
 def test_server_health():
@@ -69,19 +80,25 @@ def test_server_health():
         print(f"❌ Health check failed: {e}")
         return False
 
-def start_server():
+def start_server(workers=None):
     """Start the ML server"""
     print("🚀 Starting ML Server...")
     
     try:
-        # Start the server using uvicorn
-        process = subprocess.Popen([
-            sys.executable, "-m", "uvicorn", 
-            "ml_server:app", 
-            "--host", "0.0.0.0", 
-            "--port", "8001",
-            "--reload"
-        ], cwd=os.path.dirname(os.path.abspath(__file__)))
+        if workers:
+            # Production mode: pre-forked workers sharing one loaded model
+            print(f"   Production mode with {workers} workers")
+            command = [sys.executable, "serve.py", "--port", "8001", "--workers", str(workers)]
+        else:
+            # Development mode: single uvicorn process with auto-reload
+            command = [
+                sys.executable, "-m", "uvicorn", 
+                "ml_server:app", 
+                "--host", "0.0.0.0", 
+                "--port", "8001",
+                "--reload"
+            ]
+        process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)))
         
         print("⏳ Waiting for server to start...")
         time.sleep(3)  # Wait for server to start
@@ -114,6 +131,11 @@ def start_server():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Check dependencies and start the ML server")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run in production mode with this many pre-forked workers")
+    args = parser.parse_args()
+    
     print("🔧 ML Server Setup and Startup")
     print("=" * 40)
     
@@ -131,7 +153,7 @@ def main():
         return
     
     # Start server
-    if not start_server():
+    if not start_server(args.workers):
         sys.exit(1)
 
 if __name__ == "__main__":
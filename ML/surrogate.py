@@ -0,0 +1,124 @@
+"""
+Calibrated surrogate for the eco model.
+A ridge regression distilled from the fitted pipeline: trained on the
+model's own predictions for the training rows, over the same preprocessed
+features, and clipped to the range the model predicts, so its answers keep
+the model's scale and meaning. The scaler and one-hot encoding are folded
+into per-column weights and per-category tables, so it scores rows encoded
+by a FeatureSchema with a few array operations.
+
+retrain_model.py ships it in every artifact as eco_surrogate.json. The ML
+server answers with it when the forest fails on a record, and uses it as a
+fast tier when a caller asks for one or the inference queue is full.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from fast_model import compile_preprocessor
+
+# Version of the file format written by Surrogate.save
+SURROGATE_FORMAT_VERSION = 1
+
+SURROGATE_PATH = "eco_surrogate.json"
+
+# Ridge regularization strength
+DEFAULT_ALPHA = 1.0
+
+# Training rows the surrogate is distilled from at most
+MAX_DISTILL_ROWS = 50000
+
+
+class Surrogate:
+    """Linear model over FeatureSchema-encoded rows, clipped to [lower, upper]"""
+
+    def __init__(self, columns, mean, weights, intercept, category_weights, lower, upper,
+                 source_version=None, metrics=None):
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.category_weights = [np.asarray(table, dtype=np.float64) for table in category_weights]
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.source_version = source_version
+        self.metrics = metrics or {}
+
+    @classmethod
+    def fit(cls, model, X, alpha=DEFAULT_ALPHA, max_rows=MAX_DISTILL_ROWS, random_state=42):
+        """Distill a fitted Pipeline(preprocessor, regressor) on the training frame X"""
+        from sklearn.linear_model import Ridge
+
+        preprocessor = model.steps[0][1]
+        preprocessing = compile_preprocessor(preprocessor)
+        if len(X) > max_rows:
+            X = X.sample(max_rows, random_state=random_state)
+        target = np.asarray(model.predict(X)).reshape(len(X), -1)
+        ridge = Ridge(alpha=alpha).fit(preprocessor.transform(X), target)
+
+        # Fold the scaler into the numeric weights: w·(x - mean)/scale = (w/scale)·(x - mean)
+        coef = ridge.coef_.T
+        weights = coef[preprocessing["numeric_columns"]] / preprocessing["scale"][:, np.newaxis]
+        category_weights = [
+            coef[offset:offset + len(values)]
+            for offset, values in zip(preprocessing["categorical_offsets"], preprocessing["categories"])
+        ]
+        return cls(
+            columns=preprocessing["numeric_features"] + preprocessing["categorical_features"],
+            mean=preprocessing["mean"],
+            weights=weights,
+            intercept=ridge.intercept_,
+            category_weights=category_weights,
+            lower=target.min(axis=0),
+            upper=target.max(axis=0)
+        )
+
+    def predict_encoded(self, rows):
+        """Prediction rows for rows encoded by a FeatureSchema.
+
+        Missing numbers count as the training mean and unknown categories
+        add nothing, as with the model's preprocessing.
+        """
+        rows = np.atleast_2d(rows)
+        n_numeric = len(self.mean)
+        prediction = np.nan_to_num(rows[:, :n_numeric] - self.mean) @ self.weights
+        prediction += self.intercept
+        for j, table in enumerate(self.category_weights):
+            codes = rows[:, n_numeric + j].astype(np.intp)
+            known = codes >= 0
+            prediction[known] += table[codes[known]]
+        return np.clip(prediction, self.lower, self.upper)
+
+    def to_dict(self):
+        return {
+            "format_version": SURROGATE_FORMAT_VERSION,
+            "source_version": self.source_version,
+            "columns": self.columns,
+            "mean": self.mean.tolist(),
+            "weights": self.weights.tolist(),
+            "intercept": self.intercept.tolist(),
+            "category_weights": [table.tolist() for table in self.category_weights],
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "metrics": self.metrics
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format_version") != SURROGATE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported surrogate format version: {data.get('format_version')}")
+        return cls(**{key: value for key, value in data.items() if key != "format_version"})
+
+    def save(self, path=SURROGATE_PATH):
+        """Write the surrogate as JSON, replacing any previous file atomically"""
+        staging = f"{path}.tmp-{os.getpid()}"
+        with open(staging, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(staging, path)
+
+    @classmethod
+    def load(cls, path=SURROGATE_PATH):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,70 @@
+"""Catalogue index building, lookups and the /recommend endpoint"""
+
+import numpy as np
+import pytest
+
+import ml_server
+from catalogue_index import CARBON, ECO, CatalogueIndex, normalize_subcategory, read_catalogue
+from conftest import DATASET
+from fast_model import compile_preprocessor
+
+
+@pytest.fixture(scope="module")
+def index(model, served, tmp_path_factory):
+    schema = served.schema
+    ids, names, subcategories, records = read_catalogue(DATASET, schema)
+    rows = np.vstack([schema.encode(record) for record in records])
+    preprocessing = compile_preprocessor(model.steps[0][1])
+    built = CatalogueIndex.build(ids, names, subcategories, rows, served.predict(rows), schema,
+                                 preprocessing["mean"], preprocessing["scale"], model_version=served.version)
+    directory = str(tmp_path_factory.mktemp("catalogue") / "index")
+    built.save(directory)
+    return CatalogueIndex.load(directory)
+
+
+@pytest.mark.parametrize("spelling", ["Laptop", "Laptops", " laptop ", "LAPTOPS"])
+def test_subcategory_spellings_share_a_group(index, spelling):
+    assert normalize_subcategory(spelling) == "laptop"
+    assert index.subcategory_code(spelling) == index.subcategory_code("Laptop") is not None
+
+
+def test_unknown_subcategory_has_no_group(index):
+    assert index.subcategory_code("Tablet") is None
+
+
+def test_greener_alternatives(index):
+    position = int(np.argmin(index.predictions[:, ECO]))
+    alternatives = index.greener_alternatives(position, k=10)
+    assert len(alternatives) > 0
+    assert all(index.subcategory(p) == index.subcategory(position) for p in alternatives)
+    scores = index.predictions[alternatives]
+    assert (scores[:, ECO] >= index.predictions[position, ECO]).all()
+    # Greenest first: eco score descending, then carbon footprint ascending
+    assert list(alternatives) == sorted(alternatives, key=lambda p: (-index.predictions[p, ECO],
+                                                                     index.predictions[p, CARBON]))
+
+
+def test_product_lookup(index):
+    product = index.product(index.position(index.ids[3].decode()))
+    assert product["id"] == index.ids[3].decode()
+    assert index.position("no such product") is None
+
+
+def test_recommend_searches_the_resolved_subcategory(client, index, monkeypatch):
+    monkeypatch.setattr(ml_server, "catalogue", index)
+    searched = []
+    similar_products = ml_server.similar_products
+
+    def recording(index, vector, prediction, k, subcategory_code, criterion):
+        searched.append(subcategory_code)
+        return similar_products(index, vector, prediction, k, subcategory_code, criterion)
+
+    monkeypatch.setattr(ml_server, "similar_products", recording)
+    record = {"Weight (kg)": 2.0, "Distance (km)": 300, "Category": "Electronics", "Subcategory": "Laptops",
+              "Material Composition": "Aluminum 50%, Plastic 30%, Silicon 20%"}
+    response = client.post("/recommend", json={"product": record, "k": 5})
+    assert response.status_code == 200
+    recommendations = response.json()["recommendations"]
+    assert searched == [index.subcategory_code("Laptop")]
+    assert recommendations
+    assert {item["subcategory"] for item in recommendations} == {"laptop"}
@@ -0,0 +1,47 @@
+"""Equivalence of the compiled forest, the pipeline path and model.predict"""
+
+import numpy as np
+import pytest
+
+from fast_model import CompiledForest
+from model_store import artifact_paths, load_serving_model
+
+
+@pytest.fixture(scope="module")
+def frame(dataset):
+    """Dataset rows with missing and unknown categories mixed in"""
+    X = dataset[0].copy()
+    X.loc[X.index[:20], "Packaging Used"] = "Styrofoam"
+    X.loc[X.index[20:40], "Subcategory"] = "Tablet"
+    X.loc[X.index[40:60], "Category"] = None
+    assert X["Packaging Used"].isna().any()
+    return X
+
+
+def test_compiled_forest_matches_pipeline(model, frame):
+    compiled = CompiledForest.from_pipeline(model)
+    expected = model.predict(frame)
+    assert np.array_equal(compiled.predict(frame.to_dict("records")), expected)
+
+
+def test_encoded_rows_match_pipeline(model, served, frame):
+    assert served.memory_mapped
+    rows = served.schema.encode_frame(frame)
+    assert np.array_equal(served.predict(rows), model.predict(frame))
+
+
+def test_decoded_rows_preprocess_like_compiled(model, served, frame):
+    # Trees split on float32 features, so that is the precision that must agree
+    rows = served.schema.encode_frame(frame)
+    expected = served.compiled.transform_encoded(rows)
+    assert np.array_equal(model[:-1].transform(served.schema.decode(rows)).astype(np.float32), expected)
+    assert np.array_equal(model[:-1].transform(frame).astype(np.float32), expected)
+
+
+def test_pipeline_path_matches_compiled_path(model, artifact, served, frame):
+    pipeline_served = load_serving_model(*artifact_paths(artifact), fast_inference=False)
+    assert pipeline_served.compiled is None
+    rows = served.schema.encode_frame(frame)
+    assert np.array_equal(pipeline_served.predict(rows), served.predict(rows))
+    assert np.array_equal(pipeline_served.predict_per_tree(rows)[1], served.predict_per_tree(rows)[1])
+
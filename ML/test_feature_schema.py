@@ -0,0 +1,114 @@
+"""Feature schema encoding, category normalization and persistence"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_schema import EXACT, MISSING, NORMALIZED, UNKNOWN, UNKNOWN_CODE, FeatureSchema, SchemaError
+from features import normalize_category
+
+RECORD = {
+    "Weight (kg)": 1.2,
+    "Distance (km)": 300,
+    "Category": "Electronics",
+    "Subcategory": "Smartphone",
+    "Packaging Used": "Cardboard"
+}
+
+
+def code(schema, column, row):
+    return row[schema.index[column]]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("Cardboard box", "cardboard box"),
+    ("  LED   Bulbs ", "led bulb"),
+    ("Personal-Care", "personal care"),
+    ("Glass", "glass"),
+    ("Bananas", "banana")
+])
+def test_normalize_category(value, expected):
+    assert normalize_category(value) == expected
+
+
+def test_encode_resolves_spellings_and_aliases(served):
+    schema = served.schema
+    canonical = schema.encode(RECORD)
+    variant = schema.encode({
+        **RECORD, "Category": "electronics", "Subcategory": "Smartphones", "Packaging Used": "Cardboard box"
+    })
+    assert np.array_equal(variant, canonical)
+    assert code(schema, "Packaging Used", schema.encode({**RECORD, "Packaging Used": "plastic bag"})) == \
+        schema.categories["Packaging Used"].index("Plastic")
+
+
+def test_unknown_and_missing_categories(served):
+    schema = served.schema
+    row = schema.encode({**RECORD, "Packaging Used": "Styrofoam", "Subcategory": None})
+    assert code(schema, "Packaging Used", row) == UNKNOWN_CODE
+    assert code(schema, "Subcategory", row) == UNKNOWN_CODE
+    # The dataset has products without packaging, so a missing packaging is a known category
+    row = schema.encode({**RECORD, "Packaging Used": None})
+    assert code(schema, "Packaging Used", row) == schema.categories["Packaging Used"].index(None)
+
+
+def test_category_outcomes(served):
+    schema = served.schema
+    record = {"Weight (kg)": 1, "Distance (km)": 1, "Category": "Electronics",
+              "Subcategory": "Laptops", "Packaging Used": "Styrofoam"}
+    assert dict(schema.category_outcomes(record, schema.encode(record))) == {
+        "Category": EXACT, "Subcategory": NORMALIZED, "Packaging Used": UNKNOWN
+    }
+    record = {"Weight (kg)": 1, "Distance (km)": 1}
+    # Category defaults to unknown; packaging defaults to the known missing-value category
+    outcomes = dict(schema.category_outcomes(record, schema.encode(record)))
+    assert outcomes["Category"] == MISSING
+    assert outcomes["Packaging Used"] == EXACT
+
+
+def test_encode_frame_matches_encode(served, dataset):
+    schema = served.schema
+    X = dataset[0].head(50).copy()
+    X.loc[X.index[:5], "Packaging Used"] = "Cardboard box"
+    X.loc[X.index[5:10], "Subcategory"] = "Tablet"
+    records = [{k: (None if pd.isna(v) else v) for k, v in r.items()} for r in X.to_dict("records")]
+    assert np.array_equal(schema.encode_frame(X), np.vstack([schema.encode(r) for r in records]))
+
+
+def test_decode_keeps_missing_and_unknown_apart(served):
+    schema = served.schema
+    rows = np.vstack([
+        schema.encode({**RECORD, "Packaging Used": None}),
+        schema.encode({**RECORD, "Packaging Used": "Styrofoam"})
+    ])
+    packaging = schema.decode(rows)["Packaging Used"]
+    assert packaging.dtype == object
+    assert isinstance(packaging[0], float) and np.isnan(packaging[0])
+    assert packaging[1] is None
+
+
+def test_save_load_round_trip(served, tmp_path):
+    path = str(tmp_path / "schema.json")
+    served.schema.save(path)
+    loaded = FeatureSchema.load(path)
+    assert loaded.to_dict() == served.schema.to_dict()
+    assert loaded.fingerprint == served.schema.fingerprint
+    loaded.check_matches(served.schema)
+
+
+def test_check_matches_rejects_other_vocabulary(served):
+    data = served.schema.to_dict()
+    for column in data["columns"]:
+        if column["name"] == "Packaging Used":
+            column["categories"] = column["categories"][:-1]
+    other = FeatureSchema.from_dict(data)
+    assert other.fingerprint != served.schema.fingerprint
+    with pytest.raises(SchemaError):
+        other.check_matches(served.schema)
+
+
+def test_invalid_values_raise(served):
+    with pytest.raises(ValueError):
+        served.schema.encode({**RECORD, "Weight (kg)": "heavy"})
+    with pytest.raises(ValueError):
+        served.schema.encode({**RECORD, "Category": ["Electronics"]})
@@ -0,0 +1,93 @@
+"""Inference pool admission, priority scheduling and deadlines"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference_pool import BULK, INTERACTIVE, DeadlineExceededError, InferencePool, QueueFullError, TokenBucket
+
+
+def test_admission_is_bounded():
+    pool = InferencePool(max_queue_depth=2)
+    pool.admit(2)
+    with pytest.raises(QueueFullError):
+        pool.admit(1)
+    assert not pool.try_admit(1)
+    pool.release(2)
+    assert pool.try_admit(1)
+    pool.shutdown()
+
+
+def test_admission_is_bounded_per_class():
+    pool = InferencePool(max_queue_depth=2, class_queue_depths={BULK: 1})
+    pool.admit(2, INTERACTIVE)
+    with pytest.raises(QueueFullError):
+        pool.admit(1, INTERACTIVE)
+    pool.admit(1, BULK)
+    assert not pool.try_admit(1, BULK)
+    assert pool.rejected_by_class == {INTERACTIVE: 1, BULK: 0}
+    pool.release(2, INTERACTIVE)
+    assert pool.try_admit(1, INTERACTIVE)
+    pool.shutdown()
+
+
+def test_jobs_run_off_the_event_loop():
+    pool = InferencePool()
+
+    async def main():
+        return await pool.run(threading.get_ident)
+
+    assert asyncio.run(main()) != threading.get_ident()
+    assert pool.completed == 1
+    pool.shutdown()
+
+
+def test_interactive_jobs_run_before_waiting_bulk_jobs():
+    pool = InferencePool(max_workers=1)
+    order = []
+    gate = threading.Event()
+
+    def job(name):
+        if name == "blocker":
+            gate.wait(5)
+        order.append(name)
+
+    async def main():
+        blocker = asyncio.ensure_future(pool.run(job, "blocker", priority=BULK))
+        await asyncio.sleep(0.01)
+        bulk = [asyncio.ensure_future(pool.run(job, f"bulk-{i}", priority=BULK)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(pool.run(job, "interactive", priority=INTERACTIVE))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(blocker, interactive, *bulk)
+
+    asyncio.run(main())
+    pool.shutdown()
+    assert order == ["blocker", "interactive", "bulk-0", "bulk-1", "bulk-2"]
+
+
+def test_expired_jobs_are_not_run():
+    pool = InferencePool()
+    ran = []
+
+    async def main():
+        with pytest.raises(DeadlineExceededError):
+            await pool.run(ran.append, 1, deadline=time.monotonic() - 1)
+
+    asyncio.run(main())
+    pool.shutdown()
+    assert ran == [] and pool.expired == 1
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    wait = bucket.take()
+    assert 0 < wait <= 0.1
+    # Requests larger than the burst go through on a full bucket and leave it in debt
+    large = TokenBucket(rate=10, burst=2)
+    assert large.take(5) == 0
+    assert large.take() > 0.3
@@ -1,5 +1,6 @@
 import requests
 import json
+import struct
 
 def test_ml_server():
     """Test the ML server endpoints"""
@@ -59,6 +60,21 @@ def test_ml_server():
     except Exception as e:
         print(f"❌ Prediction test failed: {e}")
     
+    # Test prediction endpoint with a raw material composition string
+    composition_payload = {key: value for key, value in test_payload.items() if not key.startswith("Material_")}
+    composition_payload["Material Composition"] = "Plastic 70%, Aluminum 20%, Glass 10%"
+
+    try:
+        composition_response = requests.post(f"{base_url}/predict", json=composition_payload)
+        print(f"✅ Material composition test: {composition_response.status_code}")
+        if composition_response.status_code == 200:
+            composition_data = composition_response.json()
+            print(f"   Eco Score: {composition_data.get('eco_score')}")
+        else:
+            print(f"   Error: {composition_response.text}")
+    except Exception as e:
+        print(f"❌ Material composition test failed: {e}")
+
     # Test prediction endpoint with invalid data
     invalid_payload = {
         "Weight (kg)": "invalid",
@@ -90,6 +106,67 @@ def test_ml_server():
             print("   ⚠️  Unexpected success with missing fields")
     except Exception as e:
         print(f"❌ Missing fields test failed: {e}")
+    
+    # Test batch prediction endpoint with one good and one bad record
+    batch_payload = [test_payload, incomplete_payload]
+    
+    try:
+        batch_response = requests.post(f"{base_url}/predict/batch", json=batch_payload)
+        print(f"✅ Batch prediction test: {batch_response.status_code}")
+        if batch_response.status_code == 200:
+            batch_data = batch_response.json()
+            print(f"   Succeeded: {batch_data.get('succeeded')}/{batch_data.get('count')}")
+            for i, result in enumerate(batch_data.get('results', [])):
+                print(f"   [{i}] Status: {result.get('status')}")
+        else:
+            print(f"   Error: {batch_response.text}")
+    except Exception as e:
+        print(f"❌ Batch prediction test failed: {e}")
+    
+    # Test streaming endpoint with newline-delimited JSON
+    stream_body = "\n".join(json.dumps(record) for record in [test_payload, incomplete_payload, composition_payload])
+    
+    try:
+        stream_response = requests.post(
+            f"{base_url}/predict/stream",
+            data=stream_body,
+            headers={"Content-Type": "application/x-ndjson"}
+        )
+        print(f"✅ Stream prediction test: {stream_response.status_code}")
+        if stream_response.status_code == 200:
+            for i, line in enumerate(stream_response.text.splitlines()):
+                print(f"   [{i}] Status: {json.loads(line).get('status')}")
+        else:
+            print(f"   Error: {stream_response.text}")
+    except Exception as e:
+        print(f"❌ Stream prediction test failed: {e}")
+
+    # Test the packed binary protocol: rows encoded with the served schema
+    try:
+        schema_data = requests.get(f"{base_url}/schema").json()
+        row = []
+        for column in schema_data["columns"]:
+            value = test_payload.get(column["name"], column["default"])
+            if "categories" in column:
+                row.append(column["categories"].index(value) if value in column["categories"] else -1)
+            else:
+                row.append(float("nan") if value is None else float(value))
+        packed_response = requests.post(
+            f"{base_url}/predict/batch",
+            data=struct.pack(f"<{len(row)}d", *row),
+            headers={
+                "Content-Type": schema_data["packed"]["content_type"],
+                schema_data["packed"]["fingerprint_header"]: schema_data["fingerprint"]
+            }
+        )
+        print(f"✅ Packed prediction test: {packed_response.status_code}")
+        if packed_response.status_code == 200:
+            values = struct.unpack(f"<{len(packed_response.content) // 8}d", packed_response.content)
+            print(f"   {dict(zip(schema_data['packed']['result_columns'], values))}")
+        else:
+            print(f"   Error: {packed_response.text}")
+    except Exception as e:
+        print(f"❌ Packed prediction test failed: {e}")
 
 if __name__ == "__main__":
     test_ml_server() 
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""ML server endpoints, exercised through FastAPI's TestClient (see conftest.client)"""
+
+import json
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+import ml_server
+from features import ECO_FRIENDLY_SCORE, MATERIAL_PREFIX, NUMERIC_FEATURES
+from packed_rows import PACKED_CONTENT_TYPE, RESULT_COLUMNS, ROW_DTYPE, SCHEMA_HEADER, STATUS_CODES
+from retrain_model import build_model, save_artifact
+
+RECORD = {
+    "Weight (kg)": 1.2,
+    "Distance (km)": 300,
+    "Category": "Electronics",
+    "Subcategory": "Smartphone",
+    "Packaging Used": "Cardboard",
+    "Material Composition": "Plastic 40%, Aluminum 30%, Silicon 30%"
+}
+
+# A product like the dataset's highest eco scores
+GREEN_RECORD = {
+    "Weight (kg)": 1.0,
+    "Distance (km)": 200,
+    "Category": "Grocery",
+    "Subcategory": "Bananas",
+    "Material Composition": "Organic 100%",
+    "Recyclable": 1
+}
+
+ADMIN_TOKEN = "test-token"
+
+
+@pytest.fixture(autouse=True)
+def cold_cache(client):
+    ml_server.prediction_cache.clear()
+
+
+def expected_result(served, record):
+    prediction = served.predict(served.schema.encode(record)[np.newaxis])[0]
+    return {"carbon_footprint": round(float(prediction[0]), 2), "eco_score": round(float(prediction[1]), 2)}
+
+
+def packed_request(client, rows, fingerprint, endpoint="/predict/batch"):
+    return client.post(endpoint, content=np.asarray(rows, dtype=ROW_DTYPE).tobytes(),
+                       headers={"Content-Type": PACKED_CONTENT_TYPE, SCHEMA_HEADER: fingerprint})
+
+
+def unpack(response):
+    return np.frombuffer(response.content, dtype=ROW_DTYPE).reshape(-1, len(RESULT_COLUMNS))
+
+
+def test_predict(client, served):
+    response = client.post("/predict", json=RECORD)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["status"] == "success"
+    assert {k: result[k] for k in ("carbon_footprint", "eco_score")} == expected_result(served, RECORD)
+
+
+def test_predict_rejects_incomplete_records(client):
+    response = client.post("/predict", json={"Weight (kg)": 1.2})
+    assert response.status_code == 400
+    assert "Distance (km)" in response.json()["detail"]
+
+
+def test_predict_resolves_category_spellings(client):
+    canonical = client.post("/predict", json=RECORD).json()
+    ml_server.prediction_cache.clear()
+    variant = client.post("/predict", json={
+        **RECORD, "Category": "electronics", "Subcategory": "Smartphones", "Packaging Used": "Cardboard box"
+    }).json()
+    assert variant == canonical
+
+
+def test_unknown_categories_are_counted(client):
+    before = ml_server.category_values.value("Packaging Used", "unknown")
+    client.post("/predict", json={**RECORD, "Packaging Used": "Styrofoam"})
+    assert ml_server.category_values.value("Packaging Used", "unknown") == before + 1
+    assert client.get("/health").json()["categories"]["Packaging Used"]["unknown"] == before + 1
+
+
+def test_batch_reports_errors_per_record(client, served):
+    response = client.post("/predict/batch", json=[RECORD, {"Weight (kg)": 1.2}, {**RECORD, "Distance (km)": 10}])
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["success", "error", "success"]
+    assert results[2]["carbon_footprint"] == expected_result(served, {**RECORD, "Distance (km)": 10})["carbon_footprint"]
+
+
+def test_repeated_records_are_served_from_cache(client):
+    first = client.post("/predict", json=RECORD).json()
+    hits = ml_server.prediction_cache.hits
+    assert client.post("/predict", json=RECORD).json() == first
+    assert ml_server.prediction_cache.hits == hits + 1
+
+
+def test_fast_tier_is_not_answered_from_cache(client):
+    forest = client.post("/predict", json=RECORD).json()
+    fast = client.post("/predict?tier=fast", json=RECORD).json()
+    assert fast["tier"] == "fast"
+    assert "tier" not in forest
+    assert client.post("/predict/batch?tier=fast", json=[RECORD]).json()["results"][0]["tier"] == "fast"
+
+
+def test_uncertainty(client):
+    result = client.post("/predict?uncertainty=true", json=RECORD).json()
+    for field in ("carbon_footprint", "eco_score"):
+        spread = result["uncertainty"][field]
+        assert spread["std"] >= 0 and spread["lower"] <= spread["upper"]
+
+
+@pytest.mark.parametrize("query", ["", "?uncertainty=true"])
+def test_eco_friendly_flag_uses_the_model_scale(client, query):
+    green = client.post(f"/predict{query}", json=GREEN_RECORD).json()
+    assert green["eco_score"] >= ECO_FRIENDLY_SCORE
+    assert green["isEcoFriendly"] is True
+    result = client.post(f"/predict{query}", json=RECORD).json()
+    assert result["isEcoFriendly"] == (result["eco_score"] >= ECO_FRIENDLY_SCORE)
+
+
+def test_packed_rows_match_json(client, served):
+    records = [RECORD, {**RECORD, "Packaging Used": "Plastic"}]
+    rows = np.vstack([served.schema.encode(record) for record in records])
+    response = packed_request(client, rows, served.schema.fingerprint)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == PACKED_CONTENT_TYPE
+    packed = unpack(response)
+    assert (packed[:, 3] == STATUS_CODES["success"]).all()
+    for row, record in zip(packed, records):
+        expected = expected_result(served, record)
+        assert row[:2].tolist() == [expected["carbon_footprint"], expected["eco_score"]]
+
+
+def test_packed_rows_need_the_served_schema(client, served):
+    rows = served.schema.encode(RECORD)[np.newaxis]
+    assert packed_request(client, rows, "0" * 16).status_code == 409
+    bad = rows.copy()
+    bad[0, served.schema.categorical_positions[0]] = 99
+    assert packed_request(client, bad, served.schema.fingerprint).status_code == 400
+
+
+def test_schema_endpoint(client, served):
+    schema = client.get("/schema").json()
+    assert schema["fingerprint"] == served.schema.fingerprint
+    assert [column["name"] for column in schema["columns"]] == served.schema.columns
+    assert schema["aliases"]["Packaging Used"]["cardboard box"] == "Cardboard"
+
+
+def test_stream_returns_a_line_per_input_line(client):
+    body = "\n".join([json.dumps(RECORD), "{not json", json.dumps({"Weight (kg)": 1}), json.dumps(RECORD)]) + "\n"
+    response = client.post("/predict/stream", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [result["status"] for result in results] == ["success", "error", "error", "success"]
+    assert results[1]["error"] == "Line 2: Invalid JSON"
+    assert results[2]["error"].startswith("Line 3: Missing required fields")
+    assert results[0] == results[3]
+
+
+def test_stream_skips_overlong_lines(client, monkeypatch):
+    monkeypatch.setattr(ml_server, "STREAM_MAX_LINE_BYTES", 64)
+    body = json.dumps({**RECORD, "Product Name": "x" * 200}) + "\n" + json.dumps({"Weight (kg)": 1, "Distance (km)": 1})
+    results = [json.loads(line) for line in client.post("/predict/stream", content=body).text.splitlines()]
+    assert [result["status"] for result in results] == ["error", "success"]
+    assert "longer than 64 bytes" in results[0]["error"]
+
+
+@pytest.fixture(scope="module")
+def other_artifact(dataset, tmp_path_factory):
+    X, y, materials = dataset
+    numeric_features = NUMERIC_FEATURES + [f"{MATERIAL_PREFIX}{m}" for m in materials]
+    model = build_model(numeric_features, RandomForestRegressor(n_estimators=5, random_state=1)).fit(X, y)
+    directory, _ = save_artifact(model, {}, artifacts_dir=str(tmp_path_factory.mktemp("other_artifacts")))
+    return directory
+
+
+def test_reload_invalidates_cache(client, served, artifact, other_artifact, monkeypatch):
+    monkeypatch.setattr(ml_server, "ADMIN_TOKEN", ADMIN_TOKEN)
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    before = client.post("/predict", json=RECORD).json()
+    assert len(ml_server.prediction_cache) == 1
+    assert client.post("/admin/reload", json={"artifact": other_artifact}).status_code == 403
+    try:
+        response = client.post("/admin/reload", json={"artifact": other_artifact}, headers=headers)
+        assert response.json()["status"] == "reloaded"
+        assert ml_server.serving.version != served.version
+        assert len(ml_server.prediction_cache) == 0
+        after = client.post("/predict", json=RECORD).json()
+        expected = expected_result(ml_server.serving, RECORD)
+        assert after == {**expected, "isEcoFriendly": expected["eco_score"] >= ECO_FRIENDLY_SCORE, "status": "success"}
+        assert after != before
+    finally:
+        response = client.post("/admin/reload", json={"artifact": artifact}, headers=headers)
+        assert ml_server.serving.version == served.version
@@ -0,0 +1,48 @@
+"""Saving model artifacts and loading them together with their exports"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from feature_schema import SCHEMA_PATH, FeatureSchema, SchemaError
+from model_store import artifact_paths, load_serving_model
+from retrain_model import METRICS_FILE, save_artifact
+
+
+@pytest.fixture
+def stale_schema_artifact(artifact, served, tmp_path):
+    """The artifact with a schema from another model, as left midway through a publish"""
+    directory = str(tmp_path / "artifact")
+    shutil.copytree(artifact, directory)
+    data = served.schema.to_dict()
+    data["source_version"] = "0" * 16
+    data["columns"] = [column for column in data["columns"] if column["name"] != "Packaging Used"]
+    FeatureSchema.from_dict(data).save(str(tmp_path / "artifact" / SCHEMA_PATH))
+    return directory
+
+
+@pytest.mark.parametrize("fast_inference", [True, False])
+def test_schema_saved_for_another_model_is_ignored(stale_schema_artifact, served, fast_inference):
+    loaded = load_serving_model(*artifact_paths(stale_schema_artifact), fast_inference=fast_inference)
+    assert loaded.version == served.version
+    assert loaded.schema.to_dict() == served.schema.to_dict()
+
+
+def test_schema_saved_for_this_model_must_match(stale_schema_artifact, served):
+    path = artifact_paths(stale_schema_artifact)[2]
+    schema = FeatureSchema.load(path)
+    schema.source_version = served.version
+    schema.save(path)
+    with pytest.raises(SchemaError):
+        load_serving_model(*artifact_paths(stale_schema_artifact))
+
+
+def test_save_time_is_recorded_in_the_run_info(model, tmp_path):
+    timings = {"fit_seconds": 1.0}
+    directory, _ = save_artifact(model, {"timings": timings}, artifacts_dir=str(tmp_path))
+    with open(os.path.join(directory, METRICS_FILE)) as f:
+        saved = json.load(f)["timings"]
+    assert saved == timings
+    assert saved["save_seconds"] > 0
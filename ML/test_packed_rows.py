@@ -0,0 +1,43 @@
+"""Packed row protocol decoding and result packing"""
+
+import numpy as np
+import pytest
+
+from packed_rows import ROW_DTYPE, STATUS_CODES, decode_rows, pack_predictions, pack_results
+
+
+def test_decode_rows_round_trip(served):
+    rows = np.vstack([served.schema.encode({"Weight (kg)": w, "Distance (km)": 10}) for w in (1, 2, 3)])
+    decoded = decode_rows(rows.astype(ROW_DTYPE).tobytes(), served.schema)
+    assert np.array_equal(decoded, rows, equal_nan=True)
+
+
+def test_decode_rows_rejects_partial_rows(served):
+    body = served.schema.template.astype(ROW_DTYPE).tobytes()
+    with pytest.raises(ValueError):
+        decode_rows(body[:-8], served.schema)
+    with pytest.raises(ValueError):
+        decode_rows(b"", served.schema)
+
+
+@pytest.mark.parametrize("bad_code", [99.0, -2.0, 0.5])
+def test_decode_rows_rejects_invalid_codes(served, bad_code):
+    row = served.schema.template.copy()
+    row[served.schema.categorical_positions[0]] = bad_code
+    with pytest.raises(ValueError, match="invalid code"):
+        decode_rows(row.astype(ROW_DTYPE).tobytes(), served.schema)
+
+
+def test_pack_results_marks_errors():
+    packed = pack_results([
+        {"carbon_footprint": 1.5, "eco_score": 0.6, "isEcoFriendly": False, "status": "success"},
+        {"status": "error", "error": "Missing required fields"}
+    ])
+    assert packed[0].tolist() == [1.5, 0.6, 0.0, STATUS_CODES["success"]]
+    assert np.isnan(packed[1, :3]).all() and packed[1, 3] == STATUS_CODES["error"]
+
+
+def test_pack_predictions_rounds_like_json():
+    packed = pack_predictions(np.array([[12.346, 0.6789], [3.0, 0.5949]]))
+    assert packed[0].tolist() == [12.35, 0.68, 1.0, STATUS_CODES["success"]]
+    assert packed[1].tolist() == [3.0, 0.59, 0.0, STATUS_CODES["success"]]
@@ -0,0 +1,92 @@
+"""Prediction cache versioning, eviction and expiry, and single-flight coalescing"""
+
+import asyncio
+
+import numpy as np
+
+import prediction_cache
+from prediction_cache import PredictionCache, SingleFlight, row_key
+
+RESULT = {"carbon_footprint": 1.0, "eco_score": 0.6, "isEcoFriendly": False, "status": "success"}
+
+
+def test_row_key_depends_on_values():
+    row = np.array([1.0, 2.0, -1.0])
+    assert row_key(row) == row_key(row.copy())
+    assert row_key(row) != row_key(np.array([1.0, 2.0, 0.0]))
+
+
+def test_results_are_per_model_version():
+    cache = PredictionCache()
+    cache.set_model_version("a")
+    cache.put("key", RESULT, "a")
+    assert cache.get("key", "a") == RESULT
+    assert cache.get("key", "b") is None
+    # A result computed by a model that is no longer current is not stored
+    cache.put("other", RESULT, "b")
+    assert cache.get("other", "a") is None
+
+    cache.set_model_version("b")
+    assert len(cache) == 0
+    assert cache.get("key", "b") is None
+
+
+def test_get_returns_a_copy():
+    cache = PredictionCache()
+    cache.put("key", RESULT)
+    cache.get("key")["status"] = "changed"
+    assert cache.get("key") == RESULT
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now[0])
+    cache = PredictionCache(ttl_seconds=10)
+    cache.put("key", RESULT)
+    now[0] += 5
+    assert cache.get("key") == RESULT
+    now[0] += 10
+    assert cache.get("key") is None
+    assert cache.expirations == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(max_size=0)
+    cache.put("key", RESULT)
+    assert cache.get("key") is None
+
+
+def test_single_flight_shares_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return dict(RESULT)
+
+    async def request(flights):
+        flight = flights.get("key")
+        if flight is not None:
+            return await flights.join(flight)
+        return await flights.run("key", compute())
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(request(flights) for _ in range(10)))
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result == RESULT for result in results)
+    assert flights.stats() == {"in_flight": 0, "started": 1, "joined": 9}
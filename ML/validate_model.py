@@ -4,10 +4,15 @@ ML Model Validation Script
 This script validates the ML model and tests it with sample data.
 """
 
+import time
+
 import joblib
 import pandas as pd
 import numpy as np
 
+from fast_model import CompiledForest
+from features import ECO_FRIENDLY_SCORE
+
 def validate_model():
     """Validate the ML model"""
     print("🔍 Validating ML Model...")
@@ -39,6 +44,7 @@ def validate_model():
             "Material_Organic": 0,
             "Material_Copper": 0,
             "Material_Insulation Foam": 0,
+            "Material_Drum Metal": 0,
             "Material_Paper": 0,
             "Material_Cotton": 0
         }
@@ -75,7 +81,7 @@ def validate_model():
                     is_eco_friendly = bool(pred[2])
                     print(f"♻️ Eco Friendly: {is_eco_friendly}")
                 else:
-                    is_eco_friendly = eco_score >= 60
+                    is_eco_friendly = eco_score >= ECO_FRIENDLY_SCORE
                     print(f"♻️ Eco Friendly (calculated): {is_eco_friendly}")
             else:
                 print("⚠️ Prediction has fewer than 2 values")
@@ -103,6 +109,7 @@ def validate_model():
             "Material_Organic": 0,
             "Material_Copper": 0,
             "Material_Insulation Foam": 0,
+            "Material_Drum Metal": 0,
             "Material_Paper": 0,
             "Material_Cotton": 0
         }
@@ -129,6 +136,7 @@ def validate_model():
             "Material_Organic": 100,
             "Material_Copper": 0,
             "Material_Insulation Foam": 0,
+            "Material_Drum Metal": 0,
             "Material_Paper": 0,
             "Material_Cotton": 0
         }
@@ -137,6 +145,8 @@ def validate_model():
         pred_organic = model.predict(df_organic)[0]
         print(f"📊 Organic data prediction: {pred_organic}")
         
+        validate_compiled_model(model, [test_data, minimal_data, organic_data])
+        
         print("\n✅ Model validation completed successfully!")
         
     except Exception as e:
@@ -144,5 +154,34 @@ def validate_model():
         import traceback
         print(f"📋 Traceback: {traceback.format_exc()}")
 
+def latency_percentiles(fn, runs):
+    """Return p50 and p99 latency of fn in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.percentile(timings, [50, 99])
+
+def validate_compiled_model(model, samples, runs=200):
+    """Check the compiled fast inference engine against model.predict"""
+    print("\n⚡ Validating compiled fast inference engine...")
+    compiled = CompiledForest.from_pipeline(model)
+    print(f"✅ Compiled {len(compiled.roots)} trees ({len(compiled.threshold)} nodes)")
+    
+    expected = model.predict(pd.DataFrame(samples))
+    actual = compiled.predict(samples)
+    if np.array_equal(expected, actual):
+        print("✅ Compiled predictions are bit-identical to model.predict")
+    else:
+        print(f"❌ Compiled predictions differ (max abs diff {np.abs(expected - actual).max()})")
+    
+    record = samples[:1]
+    sklearn_p50, sklearn_p99 = latency_percentiles(lambda: model.predict(pd.DataFrame(record)), runs)
+    compiled_p50, compiled_p99 = latency_percentiles(lambda: compiled.predict(record), runs)
+    print(f"📊 scikit-learn single-row latency: p50 {sklearn_p50:.3f} ms, p99 {sklearn_p99:.3f} ms")
+    print(f"📊 Compiled single-row latency: p50 {compiled_p50:.3f} ms, p99 {compiled_p99:.3f} ms")
+    print(f"🚀 Speedup: p50 {sklearn_p50 / compiled_p50:.1f}x, p99 {sklearn_p99 / compiled_p99:.1f}x")
+
 if __name__ == "__main__":
     validate_model() 
\ No newline at end of file